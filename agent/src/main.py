@@ -5,21 +5,43 @@
 # result = Runner.run_sync(agent, "Write a haiku about recursion in programming.")
 # print(result.final_output)
 
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from agents import Agent, Runner, function_tool
 from agents.mcp.server import MCPServerSse, MCPServerSseParams
 
+from mcp_pool import MCPServerPool, PoolTimeout
+from memory import ConversationMemory, summarizer
+from streaming import send_frame, stream_run
+from tool_cache import CachingMCPServer, ToolCache, tool_cache_stats
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 SCHEDULER_URL = os.getenv("SCHEDULER_URL", "http://localhost:8000/mcp")
 
+# Open WebSocket sessions, new ones are refused beyond this
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 500))
+# MCP connections to the scheduler, each agent run holds one so it's also the number of concurrent runs
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", 16))
+# Seconds a message waits for a free connection before the client is told to retry, and seconds a run may take
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", 30))
+RUN_TIMEOUT = float(os.getenv("RUN_TIMEOUT", 120))
+# Turns of history sent with every run, older ones are summarized (or dropped with HISTORY_SUMMARIZE=false)
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", 10))
+HISTORY_SUMMARIZE = os.getenv("HISTORY_SUMMARIZE", "true").lower() in ("1", "true", "yes")
+# Reuse the results of read-only scheduler tools within a conversation, see `tool_cache.py`
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
 @function_tool
 def get_current_time():
     """
@@ -32,20 +54,28 @@ instructions = ""
 with open("src/instructions.md", "r") as f:
     instructions = f.read()
 
-scheduler_mcp = MCPServerSse(
-    params=MCPServerSseParams(
-         url=SCHEDULER_URL
-    ),
-    name="Scheduler MCP",
-)
+def scheduler_mcp() -> MCPServerSse:
+    return MCPServerSse(
+        params=MCPServerSseParams(
+             url=SCHEDULER_URL
+        ),
+        name="Scheduler MCP",
+        # The scheduler's tools don't change while it runs, don't list them again on every run
+        cache_tools_list=True,
+    )
 
-agent = Agent(name="Assistant", instructions=instructions, model="gpt-4o-mini", mcp_servers=[scheduler_mcp], tools=[get_current_time])
+scheduler_pool = MCPServerPool(scheduler_mcp, MCP_POOL_SIZE)
+
+# Every run uses a clone of the agent with the MCP connection it got from the pool
+agent = Agent(name="Assistant", instructions=instructions, model="gpt-4o-mini", mcp_servers=[], tools=[get_current_time])
+
+active_sessions = 0
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await scheduler_mcp.connect()
+    await scheduler_pool.connect()
     yield
-    await scheduler_mcp.cleanup()
+    await scheduler_pool.cleanup()
 
 app = FastAPI(
     title="MedApp Agent",
@@ -55,17 +85,71 @@ app = FastAPI(
 )
 
 
+@app.get("/metrics/tools")
+async def get_tool_metrics():
+    """Hits, misses and hit rate of the tool cache, per tool"""
+    return tool_cache_stats.report()
+
+BUSY_MESSAGE = "I'm attending many patients right now, please send your message again in a moment."
+TIMEOUT_MESSAGE = "Sorry, that took too long. Please try again."
+ERROR_MESSAGE = "Sorry, something went wrong. Please try again."
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-        await websocket.accept()
-        input_list = []
-
-        while True:
-            prompt = await websocket.receive_text()
-            input_list.append({ "role": "user", "content": prompt })
-            result = await Runner.run(agent, input_list)
-            input_list = result.to_input_list()
-            await websocket.send_text(result.final_output)
+async def websocket_endpoint(websocket: WebSocket, stream: bool = False):
+        """
+        Chat with the agent: send the patient's messages as text. Without `stream` each answer comes back as a
+        single text message once the run is over; with `?stream=true` it's streamed as JSON frames, see `streaming.py`.
+        """
+        global active_sessions
+        if active_sessions >= MAX_SESSIONS:
+            # Closing before accepting rejects the handshake with a 403, the client only sees 1013 (try again
+            # later) once the connection is open
+            await websocket.accept()
+            await websocket.close(code=1013)
+            return
+
+        async def send_error(message: str):
+            if stream:
+                await send_frame(websocket, "error", message=message)
+            else:
+                await websocket.send_text(message)
+
+        active_sessions += 1
+        memory = ConversationMemory(HISTORY_MAX_TURNS, summarizer if HISTORY_SUMMARIZE else None)
+        try:
+            await websocket.accept()
+            tool_cache = ToolCache()
+
+            while True:
+                prompt = await websocket.receive_text()
+                try:
+                    async with scheduler_pool.acquire(timeout=QUEUE_TIMEOUT) as scheduler:
+                        run_agent = agent.clone(mcp_servers=[CachingMCPServer(scheduler, tool_cache) if TOOL_CACHE_ENABLED else scheduler])
+                        async with asyncio.timeout(RUN_TIMEOUT):
+                            if stream:
+                                result = await stream_run(websocket, run_agent, memory.input(prompt))
+                            else:
+                                result = await Runner.run(run_agent, memory.input(prompt))
+                                await websocket.send_text(result.final_output)
+                except PoolTimeout:
+                    await send_error(BUSY_MESSAGE)
+                    continue
+                except TimeoutError:
+                    await send_error(TIMEOUT_MESSAGE)
+                    continue
+                except WebSocketDisconnect:
+                    raise
+                except Exception:
+                    # A failed run (model or scheduler error) ends the turn, not the conversation
+                    logger.exception("Agent run failed")
+                    await send_error(ERROR_MESSAGE)
+                    continue
+                memory.update(result.to_input_list())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            active_sessions -= 1
+            await memory.close()
 
 if __name__ == "__main__":
     import uvicorn
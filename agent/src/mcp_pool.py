@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional
+
+import anyio
+import httpx
+from agents.mcp import MCPServer
+from mcp import McpError
+
+logger = logging.getLogger(__name__)
+
+# Errors of the MCP connection itself, after which it's started again. Anything else (a timed out or cancelled
+# run, a closed WebSocket...) leaves the connection usable.
+CONNECTION_ERRORS = (McpError, httpx.TransportError, anyio.ClosedResourceError, anyio.BrokenResourceError, ConnectionError)
+
+class PoolTimeout(Exception):
+    """No MCP connection became free in time"""
+
+def is_connection_error(error: BaseException) -> bool:
+    """Whether the error, or one it was raised from (the SDK wraps tool call errors), is a connection error"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, CONNECTION_ERRORS):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+class MCPServerPool:
+    """
+    Up to `size` connected MCP servers, each one used by a single agent run at a time.
+    Runs wait for a free connection, which bounds the number of runs in flight. A server that can't reconnect
+    after a connection error is dropped, and replaced by a new one when a run needs it.
+    """
+
+    def __init__(self, factory: Callable[[], MCPServer], size: int):
+        self.factory = factory
+        self.size = size
+        self.servers: List[MCPServer] = []
+        self._idle: asyncio.Queue[MCPServer] = asyncio.Queue()
+
+    async def connect(self):
+        self.servers = [self.factory() for _ in range(self.size)]
+        await asyncio.gather(*(server.connect() for server in self.servers))
+        for server in self.servers:
+            self._idle.put_nowait(server)
+
+    async def cleanup(self):
+        await asyncio.gather(*(server.cleanup() for server in self.servers), return_exceptions=True)
+        self.servers = []
+
+    @property
+    def in_use(self) -> int:
+        return len(self.servers) - self._idle.qsize()
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None) -> AsyncIterator[MCPServer]:
+        """A free server, raises `PoolTimeout` if none is released (or replaced) within `timeout` seconds"""
+        try:
+            server = await asyncio.wait_for(self._get(), timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No free MCP connection after {timeout}s")
+        try:
+            yield server
+        except Exception as e:
+            if is_connection_error(e) and not await self._reconnect(server):
+                self._drop(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                self._idle.put_nowait(server)
+
+    async def _get(self) -> MCPServer:
+        """An idle server, or a new one in place of a dropped one"""
+        if not self._idle.empty() or len(self.servers) >= self.size:
+            return await self._idle.get()
+        server = self.factory()
+        self.servers.append(server)
+        try:
+            await server.connect()
+        except BaseException:
+            self._drop(server)
+            await server.cleanup()
+            raise
+        return server
+
+    async def _reconnect(self, server: MCPServer) -> bool:
+        try:
+            await server.cleanup()
+            await server.connect()
+            return True
+        except Exception:
+            logger.exception("Could not reconnect to MCP server %s, dropping it", server.name)
+            return False
+
+    def _drop(self, server: MCPServer):
+        self.servers.remove(server)
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from agents import Agent, Runner, TResponseInputItem
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation with the patient: "
+# Tool outputs can be long slot listings, only their start goes into the summary
+MAX_TOOL_OUTPUT_CHARS = 500
+
+summarizer = Agent(
+    name="Summarizer",
+    instructions=(
+        "Summarize the conversation between a medical receptionist and a patient in a few sentences. "
+        "Keep every fact needed to continue it: the patient's name and national ID, whether they are registered, "
+        "the specialization and dates they asked for, the slots offered (with their IDs) and the appointments booked."
+    ),
+    model="gpt-4o-mini",
+)
+
+def _render(item: TResponseInputItem) -> str:
+    """One line of transcript for the summarizer"""
+    if item.get("type") == "function_call":
+        return f"tool call: {item.get('name')}({item.get('arguments')})"
+    if item.get("type") == "function_call_output":
+        return f"tool result: {str(item.get('output'))[:MAX_TOOL_OUTPUT_CHARS]}"
+    content = item.get("content")
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return f"{item.get('role', item.get('type'))}: {content}"
+
+class ConversationMemory:
+    """
+    History of one conversation, bounded in turns (a user message and everything up to the next one), so each
+    run sends a bounded input whatever the length of the conversation.
+
+    When the history reaches `2 * max_turns` turns, all but the last `max_turns` are folded into a summary when a
+    `summarizer` agent is given, dropped otherwise. Cutting in chunks keeps the start of the input the same across
+    runs most of the time, and the summarizer runs in the background: until it's done the turns being summarized
+    are still sent as they are.
+    """
+
+    def __init__(self, max_turns: int, summarizer: Optional[Agent] = None):
+        self.max_turns = max_turns
+        self.summarizer = summarizer
+        self.items: List[TResponseInputItem] = []
+        self.summary: Optional[str] = None
+        self._summarizing: Optional[asyncio.Task] = None
+        # History items sent before the prompt by the last `input`
+        self._sent = 0
+
+    def input(self, prompt: str) -> List[TResponseInputItem]:
+        """The input of a run answering `prompt`"""
+        summary = [{"role": "system", "content": SUMMARY_PREFIX + self.summary}] if self.summary else []
+        history = [*summary, *self.items]
+        self._sent = len(history)
+        return [*history, {"role": "user", "content": prompt}]
+
+    def update(self, items: List[TResponseInputItem]):
+        """Keep the history of the run started with the last `input` (`RunResult.to_input_list()`)"""
+        self.items.extend(items[self._sent:])
+        if self._summarizing:
+            return
+        # Cut at a user message, so tool calls stay with their outputs
+        turn_starts = [index for index, item in enumerate(self.items) if item.get("role") == "user"]
+        if len(turn_starts) < 2 * self.max_turns:
+            return
+        cut = turn_starts[-self.max_turns]
+        if self.summarizer:
+            self._summarizing = asyncio.create_task(self._summarize(cut))
+        else:
+            del self.items[:cut]
+
+    async def _summarize(self, cut: int):
+        """Fold the first `cut` items into the summary"""
+        transcript = "\n".join(_render(item) for item in self.items[:cut])
+        if self.summary:
+            transcript = f"Earlier summary: {self.summary}\n\n{transcript}"
+        try:
+            result = await Runner.run(self.summarizer, transcript)
+            self.summary = result.final_output
+        except Exception:
+            # Keep the previous summary, the summarized turns are lost
+            logger.exception("Could not summarize the conversation")
+        finally:
+            # Only `update` adds items, at the end, so the first `cut` are still the summarized ones
+            del self.items[:cut]
+            self._summarizing = None
+
+    async def close(self):
+        """Cancel a summary in progress, the conversation is over"""
+        if self._summarizing:
+            self._summarizing.cancel()
+            await asyncio.gather(self._summarizing, return_exceptions=True)
@@ -0,0 +1,59 @@
+"""
+Streaming protocol of the `/ws?stream=true` WebSocket: every message is a JSON frame with a `type`.
+
+Sent by the agent, for each user message:
+- `{"type": "delta", "text": "..."}`: the next piece of the answer, as the model writes it
+- `{"type": "tool", "status": "started" | "finished", "name": "...", "message": "Looking up available slots…"}`:
+  progress of the tools the agent runs
+- `{"type": "done", "text": "..."}`: the whole answer, the turn is over
+- `{"type": "error", "message": "..."}`: the turn failed, `text` deltas already sent are void
+
+The client sends plain text messages, as in the non-streamed protocol.
+"""
+from typing import Optional
+
+from agents import Agent, Runner, RunResultStreaming, TResponseInputItem
+from fastapi import WebSocket
+from openai.types.responses import ResponseTextDeltaEvent
+
+TOOL_PROGRESS = {
+    "get_patient_by_national_id": "Looking up the patient…",
+    "get_time_slots_by_specialization": "Looking up available slots…",
+    "get_next_available_slots": "Looking for the next available slots…",
+    "get_availability_by_day": "Checking which days have availability…",
+    "hold_slot": "Holding the slot…",
+    "release_slot_hold": "Releasing the slot…",
+    "create_appointment": "Booking the appointment…",
+    "get_patient_appointments": "Looking up the patient's appointments…",
+    "get_current_time": "Checking the time…",
+}
+
+async def send_frame(websocket: WebSocket, type: str, **fields):
+    await websocket.send_json({"type": type, **fields})
+
+async def stream_run(websocket: WebSocket, agent: Agent, input: list[TResponseInputItem]) -> RunResultStreaming:
+    """Run the agent, forwarding text deltas and tool progress as they happen, and send the `done` frame"""
+    result = Runner.run_streamed(agent, input)
+    tool_names: dict[str, str] = {}
+    try:
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                await send_frame(websocket, "delta", text=event.data.delta)
+            elif event.type == "run_item_stream_event" and event.name == "tool_called":
+                name = getattr(event.item.raw_item, "name", None) or "tool"
+                if call_id := getattr(event.item.raw_item, "call_id", None):
+                    tool_names[call_id] = name
+                await send_frame(websocket, "tool", status="started", name=name, message=TOOL_PROGRESS.get(name, "Working on it…"))
+            elif event.type == "run_item_stream_event" and event.name == "tool_output":
+                name = _output_tool_name(event.item.raw_item, tool_names)
+                await send_frame(websocket, "tool", status="finished", name=name)
+    except BaseException:
+        # Stops the run in the background (e.g. on timeout or when the client went away)
+        result.cancel()
+        raise
+    await send_frame(websocket, "done", text=str(result.final_output))
+    return result
+
+def _output_tool_name(raw_item, tool_names: dict[str, str]) -> Optional[str]:
+    call_id = raw_item.get("call_id") if isinstance(raw_item, dict) else getattr(raw_item, "call_id", None)
+    return tool_names.get(call_id)
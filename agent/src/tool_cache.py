@@ -0,0 +1,137 @@
+"""
+Caching of the scheduler's tool results, per conversation.
+
+Read-only tools are memoized for a few seconds: the model often repeats the same lookup within a conversation,
+and every call is a round trip to the API. Concurrent identical calls share a single request, and writes
+invalidate the results they may have changed.
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any, Optional
+
+from agents.mcp import MCPServer
+
+# Read-only tools and how long their results are reused, in seconds
+READ_ONLY_TOOLS = {
+    "get_patient_by_national_id": 300,
+    "get_time_slots_by_specialization": 30,
+    "get_next_available_slots": 30,
+    "get_availability_by_day": 30,
+    "get_patient_appointments": 30,
+}
+# Tools that change data, and the read-only tools whose cached results they make stale
+INVALIDATED_BY = {
+    "create_appointment": {"get_time_slots_by_specialization", "get_next_available_slots", "get_availability_by_day", "get_patient_appointments"},
+    "hold_slot": {"get_time_slots_by_specialization", "get_next_available_slots"},
+    "release_slot_hold": {"get_time_slots_by_specialization", "get_next_available_slots"},
+}
+
+class ToolCacheStats:
+    """Hits, misses and merged calls per tool, across every conversation"""
+
+    def __init__(self):
+        self.counters: dict[str, dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "merged": 0, "invalidations": 0})
+
+    def incr(self, tool_name: str, counter: str):
+        self.counters[tool_name][counter] += 1
+
+    def report(self) -> dict[str, dict]:
+        report = {}
+        for tool_name, counters in self.counters.items():
+            calls = counters["hits"] + counters["misses"] + counters["merged"]
+            report[tool_name] = {**counters, "hit_rate": (counters["hits"] + counters["merged"]) / calls if calls else 0.0}
+        return report
+
+tool_cache_stats = ToolCacheStats()
+
+class ToolCache:
+    """Cached results and calls in flight of one conversation"""
+
+    def __init__(self, stats: ToolCacheStats = tool_cache_stats):
+        self.stats = stats
+        self.results: dict[tuple[str, str], tuple[float, Any]] = {}
+        self.in_flight: dict[tuple[str, str], asyncio.Future] = {}
+        # Bumped when a tool's results are invalidated, results of calls started before aren't stored
+        self.generations: dict[str, int] = defaultdict(int)
+
+    async def call(self, server: MCPServer, tool_name: str, arguments: Optional[dict]) -> Any:
+        if tool_name not in READ_ONLY_TOOLS:
+            try:
+                return await server.call_tool(tool_name, arguments)
+            finally:
+                # Invalidate even if the call failed, it may have been applied anyway
+                for dependent in INVALIDATED_BY.get(tool_name, ()):
+                    self.invalidate(dependent)
+
+        key = (tool_name, json.dumps(arguments or {}, sort_keys=True))
+        cached = self.results.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.stats.incr(tool_name, "hits")
+            return cached[1]
+        if key in self.in_flight:
+            self.stats.incr(tool_name, "merged")
+            return await asyncio.shield(self.in_flight[key])
+
+        self.stats.incr(tool_name, "misses")
+        generation = self.generations[tool_name]
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await server.call_tool(tool_name, arguments)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved so an exception nobody else waited for isn't reported as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+        future.set_result(result)
+        if not getattr(result, "isError", False) and self.generations[tool_name] == generation:
+            self.results[key] = (time.monotonic() + READ_ONLY_TOOLS[tool_name], result)
+        return result
+
+    def invalidate(self, tool_name: str):
+        self.generations[tool_name] += 1
+        for key in [key for key in self.results if key[0] == tool_name]:
+            del self.results[key]
+        self.stats.incr(tool_name, "invalidations")
+
+class CachingMCPServer(MCPServer):
+    """An MCP server whose tool calls go through a conversation's `ToolCache`, everything else is delegated"""
+
+    def __init__(self, server: MCPServer, cache: ToolCache):
+        self.server = server
+        self.cache = cache
+
+    @property
+    def name(self) -> str:
+        return self.server.name
+
+    async def connect(self):
+        await self.server.connect()
+
+    async def cleanup(self):
+        await self.server.cleanup()
+
+    async def list_tools(self, *args, **kwargs):
+        return await self.server.list_tools(*args, **kwargs)
+
+    async def call_tool(self, tool_name: str, arguments: Optional[dict]):
+        return await self.cache.call(self.server, tool_name, arguments)
+
+    async def list_prompts(self, *args, **kwargs):
+        return await self.server.list_prompts(*args, **kwargs)
+
+    async def get_prompt(self, *args, **kwargs):
+        return await self.server.get_prompt(*args, **kwargs)
+
+    def __getattr__(self, attribute: str):
+        # Settings of the wrapped server the SDK may read, e.g. `use_structured_content`
+        if attribute == "server":
+            raise AttributeError(attribute)
+        return getattr(self.server, attribute)
@@ -0,0 +1,16 @@
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+import main
+
+def test_sessions_beyond_the_limit_are_refused_with_1013(monkeypatch):
+    monkeypatch.setattr(main, "active_sessions", main.MAX_SESSIONS)
+    client = TestClient(main.app)
+
+    with client.websocket_connect("/ws") as websocket:
+        with pytest.raises(WebSocketDisconnect) as refused:
+            websocket.receive_text()
+
+    assert refused.value.code == 1013
+    assert main.active_sessions == main.MAX_SESSIONS
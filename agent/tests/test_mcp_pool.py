@@ -0,0 +1,101 @@
+import pytest
+from agents.exceptions import AgentsException
+from fastapi import WebSocketDisconnect
+from mcp import McpError
+from mcp.types import ErrorData
+
+from mcp_pool import MCPServerPool, PoolTimeout
+
+class FakeServer:
+    """Records how many times it's connected and cleaned up, `fail_connect` makes connecting fail"""
+
+    def __init__(self):
+        self.name = "fake"
+        self.connects = 0
+        self.cleanups = 0
+        self.fail_connect = False
+
+    async def connect(self):
+        self.connects += 1
+        if self.fail_connect:
+            raise ConnectionError("Connection refused")
+
+    async def cleanup(self):
+        self.cleanups += 1
+
+class Factory:
+    def __init__(self):
+        self.servers: list[FakeServer] = []
+
+    def __call__(self) -> FakeServer:
+        self.servers.append(FakeServer())
+        return self.servers[-1]
+
+async def connected_pool(size: int) -> tuple[MCPServerPool, Factory]:
+    factory = Factory()
+    pool = MCPServerPool(factory, size)
+    await pool.connect()
+    return pool, factory
+
+async def test_released_servers_are_reused():
+    pool, factory = await connected_pool(1)
+
+    async with pool.acquire() as server:
+        assert pool.in_use == 1
+    async with pool.acquire() as again:
+        pass
+
+    assert server is again is factory.servers[0]
+    assert pool.in_use == 0
+
+async def test_runs_wait_for_a_free_server_until_the_timeout():
+    pool, _ = await connected_pool(1)
+
+    async with pool.acquire():
+        with pytest.raises(PoolTimeout):
+            async with pool.acquire(timeout=0.01):
+                pass
+
+@pytest.mark.parametrize("error", [TimeoutError(), WebSocketDisconnect(), ValueError("bad answer")])
+async def test_other_errors_keep_the_connection(error):
+    pool, factory = await connected_pool(1)
+
+    with pytest.raises(type(error)):
+        async with pool.acquire():
+            raise error
+
+    assert (factory.servers[0].connects, factory.servers[0].cleanups) == (1, 0)
+    async with pool.acquire() as server:
+        assert server is factory.servers[0]
+
+async def test_connection_errors_reconnect_the_server():
+    pool, factory = await connected_pool(1)
+
+    with pytest.raises(AgentsException):
+        async with pool.acquire():
+            try:
+                raise McpError(ErrorData(code=-32001, message="Timed out"))
+            except McpError as e:
+                # How the SDK reports failed tool calls
+                raise AgentsException("Error invoking MCP tool") from e
+
+    assert (factory.servers[0].connects, factory.servers[0].cleanups) == (2, 1)
+    async with pool.acquire() as server:
+        assert server is factory.servers[0]
+
+async def test_servers_that_cannot_reconnect_are_replaced():
+    pool, factory = await connected_pool(2)
+    dead = factory.servers[0]
+
+    with pytest.raises(ConnectionError):
+        async with pool.acquire() as server:
+            assert server is dead
+            dead.fail_connect = True
+            raise ConnectionError("Connection reset")
+
+    assert pool.servers == [factory.servers[1]]
+    async with pool.acquire() as first, pool.acquire() as second:
+        assert {first, second} == {factory.servers[1], factory.servers[2]}
+        assert factory.servers[2].connects == 1
+    assert len(factory.servers) == 3
+    assert pool.in_use == 0
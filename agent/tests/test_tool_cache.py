@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import tool_cache
+from tool_cache import ToolCache, ToolCacheStats
+
+READ = "get_next_available_slots"
+WRITE = "create_appointment"
+
+class FakeServer:
+    """Answers tool calls with a call counter, read-only tools only return once `release` is set (it is by default)"""
+
+    def __init__(self):
+        self.calls: list[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.error: Exception | None = None
+
+    async def call_tool(self, tool_name: str, arguments: dict | None):
+        self.calls.append(tool_name)
+        if tool_name in tool_cache.READ_ONLY_TOOLS:
+            await self.release.wait()
+        if self.error:
+            raise self.error
+        return f"{tool_name} #{len(self.calls)}"
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool_cache.time, "monotonic", lambda: now[0])
+    return now
+
+async def test_concurrent_identical_calls_share_one_call():
+    server, cache = FakeServer(), ToolCache(ToolCacheStats())
+    server.release.clear()
+
+    first = asyncio.create_task(cache.call(server, READ, {"specialization": "cardiology"}))
+    second = asyncio.create_task(cache.call(server, READ, {"specialization": "cardiology"}))
+    await asyncio.sleep(0)
+    server.release.set()
+
+    assert await first == await second == f"{READ} #1"
+    assert server.calls == [READ]
+    assert cache.stats.counters[READ]["merged"] == 1
+
+async def test_results_expire(clock):
+    server, cache = FakeServer(), ToolCache(ToolCacheStats())
+
+    assert await cache.call(server, READ, None) == f"{READ} #1"
+    clock[0] += tool_cache.READ_ONLY_TOOLS[READ] - 1
+    assert await cache.call(server, READ, None) == f"{READ} #1"
+    clock[0] += 2
+    assert await cache.call(server, READ, None) == f"{READ} #2"
+
+async def test_a_write_during_a_read_keeps_its_result_out_of_the_cache():
+    server, cache = FakeServer(), ToolCache(ToolCacheStats())
+    server.release.clear()
+
+    read = asyncio.create_task(cache.call(server, READ, None))
+    await asyncio.sleep(0)
+    await cache.call(server, WRITE, {"slot_id": "1"})
+    server.release.set()
+    await read
+
+    assert cache.results == {}
+    assert await cache.call(server, READ, None) == f"{READ} #3"
+
+async def test_a_failed_call_is_not_shared_with_later_calls():
+    server, cache = FakeServer(), ToolCache(ToolCacheStats())
+    server.release.clear()
+    server.error = ConnectionError("Scheduler unreachable")
+
+    first = asyncio.create_task(cache.call(server, READ, None))
+    merged = asyncio.create_task(cache.call(server, READ, None))
+    await asyncio.sleep(0)
+    server.release.set()
+    for call in (first, merged):
+        with pytest.raises(ConnectionError):
+            await call
+
+    server.error = None
+    assert await cache.call(server, READ, None) == f"{READ} #2"
+    assert cache.in_flight == {}
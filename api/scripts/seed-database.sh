@@ -6,4 +6,4 @@ DB_NAME="medapp"
 docker compose exec mongodb mongosh --eval "db.getSiblingDB(\"$DB_NAME\").dropDatabase()"
 
 # Seed the database
-PYTHONPATH=src poetry run python -m src.scripts.seed_database
\ No newline at end of file
+PYTHONPATH=src poetry run python -m src.scripts.seed_database "$@"
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Availability package: computes free slots from the professionals' schedules
+"""
+from .interval_set import IntervalSet
+from .engine import AvailabilityEngine, virtual_slot_id
+from .slots import (
+    iter_specialization_slots,
+    find_specialization_slots,
+    unavailable_slot_counts,
+    find_next_specialization_slots,
+    iter_professional_slots,
+    find_professional_slots,
+    claim_slot,
+    claim_slots,
+    get_slots,
+    get_free_slot,
+)
+
+__all__ = [
+    "IntervalSet",
+    "AvailabilityEngine",
+    "virtual_slot_id",
+    "iter_specialization_slots",
+    "find_specialization_slots",
+    "unavailable_slot_counts",
+    "find_next_specialization_slots",
+    "iter_professional_slots",
+    "find_professional_slots",
+    "claim_slot",
+    "claim_slots",
+    "get_slots",
+    "get_free_slot",
+]
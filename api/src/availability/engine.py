@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import AbstractSet, AsyncIterator, Dict, Iterator, List, Optional
+
+from bson.objectid import ObjectId
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from models import AvailabilitySummary, Professional, Slot
+from models.datetime_utils import to_utc, utc_now
+from .interval_set import IntervalSet
+
+def virtual_slot_id(professional_id: ObjectId, start_time: datetime) -> ObjectId:
+    """
+    Deterministic ID of a computed slot: the start time in the 4-byte timestamp of the ObjectId,
+    followed by the last 8 bytes of the professional's ID (its process-unique random and counter).
+    The slot keeps this ID once it's booked and stored.
+    """
+    return ObjectId(int(to_utc(start_time).timestamp()).to_bytes(4, "big") + ObjectId(professional_id).binary[4:])
+
+class AvailabilityEngine:
+    """
+    Computes free slots on the fly from each professional's schedule minus the booked slots,
+    instead of storing every future slot. Only booked slots are persisted, when they're booked.
+    """
+
+    @staticmethod
+    async def _booked_intervals(db: AsyncDatabase, professional_ids: List[ObjectId], start: datetime, end: datetime) -> Dict[ObjectId, IntervalSet]:
+        """Busy intervals of each professional overlapping [start, end], in a single query"""
+        booked: Dict[ObjectId, list] = {professional_id: [] for professional_id in professional_ids}
+        async for slot in Slot.iter_by_query(db, {
+            "professional_id": {"$in": professional_ids},
+            "is_booked": True,
+            # Slots are shorter than a day, any slot overlapping the window starts at most a day before it
+            **Slot.start_time_filter(gte=start - timedelta(days=1), lte=end),
+        }, projection={"start_time": 1, "end_time": 1, "professional_id": 1}):
+            booked[slot.professional_id].append((slot.start_time, slot.end_time))
+        return {professional_id: IntervalSet(intervals) for professional_id, intervals in booked.items()}
+
+    @staticmethod
+    def _free_slots(
+        professional: Professional,
+        busy: IntervalSet,
+        start: datetime,
+        end: datetime,
+        after: Optional[tuple[datetime, ObjectId]],
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> Iterator[tuple[datetime, ObjectId, Slot]]:
+        """Free slots of a professional starting in [start, end], as (start_time, id, slot) sorted by start time"""
+        # Schedules are in local time, a UTC day can hold slots of the local days around it
+        local_days = (start.date() - timedelta(days=1), end.date() + timedelta(days=1))
+        for start_time, end_time in busy.subtract_from(professional.schedule.expand(*local_days)):
+            if start_time < start or start_time > end:
+                continue
+            slot_id = virtual_slot_id(professional.id, start_time)
+            if after and (start_time, slot_id) <= after:
+                continue
+            if exclude and slot_id in exclude:
+                continue
+            yield start_time, slot_id, Slot.model_construct(
+                id=slot_id,
+                start_time=start_time,
+                end_time=end_time,
+                professional_id=professional.id,
+                specialization=professional.specialization,
+                is_booked=False,
+            )
+
+    @classmethod
+    async def iter_available(
+        cls,
+        db: AsyncDatabase,
+        professionals: List[Professional],
+        start: datetime,
+        end: datetime,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        per_professional: Optional[int] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> AsyncIterator[tuple[Slot, Professional]]:
+        """
+        Iterate over the free slots of the professionals starting in [start, end] with their professional,
+        sorted by (start_time, id) like the stored slots. Each professional's slots are generated lazily
+        and merged, so it stops computing as soon as `limit` slots are found.
+        `per_professional` caps the number of slots of each professional, `exclude` are IDs of slots to leave out.
+        """
+        start, end = to_utc(start), to_utc(end)
+        if after:
+            after = (to_utc(after[0]), ObjectId(after[1]))
+            start = max(start, after[0])
+        professionals = [professional for professional in professionals if professional.schedule]
+        if not professionals or start > end:
+            return
+
+        busy = await cls._booked_intervals(db, [professional.id for professional in professionals], start, end)
+        by_id = {professional.id: professional for professional in professionals}
+        merged = heapq.merge(*[
+            itertools.islice(cls._free_slots(professional, busy[professional.id], start, end, after, exclude), per_professional)
+            for professional in professionals
+        ], key=lambda free_slot: (free_slot[0], free_slot[1]))
+
+        for count, (_, _, slot) in enumerate(merged):
+            if limit and count >= limit:
+                return
+            yield slot, by_id[slot.professional_id]
+
+    @classmethod
+    async def find_available(
+        cls,
+        db: AsyncDatabase,
+        professionals: List[Professional],
+        start: datetime,
+        end: datetime,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        per_professional: Optional[int] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> List[tuple[Slot, Professional]]:
+        return [result async for result in cls.iter_available(db, professionals, start, end, limit, after, per_professional, exclude)]
+
+    @classmethod
+    async def compute_slot(cls, db: AsyncDatabase, slot_id: str) -> Optional[Slot]:
+        """
+        The future slot of a professional's schedule with this virtual ID, unbooked, or None if there is none.
+        It doesn't check whether the slot was booked, see the stored slots for that.
+        """
+        return (await cls.compute_slots(db, [ObjectId(slot_id)])).get(ObjectId(slot_id))
+
+    @classmethod
+    async def compute_slots(cls, db: AsyncDatabase, slot_ids: List[ObjectId]) -> Dict[ObjectId, Slot]:
+        """
+        The future slots of the professionals' schedules with these virtual IDs by ID, like `compute_slot`.
+        Each professional is resolved, and its schedule expanded, once for the whole batch.
+        """
+        ids_by_suffix = await Professional.get_cached_ids_by_suffix(db)
+        now = utc_now()
+        slot_ids_by_professional: Dict[ObjectId, List[ObjectId]] = defaultdict(list)
+        for slot_id in slot_ids:
+            if (professional_id := ids_by_suffix.get(slot_id.binary[4:])) and slot_id.generation_time > now:
+                slot_ids_by_professional[professional_id].append(slot_id)
+        professionals = await asyncio.gather(*[Professional.get_cached_by_id(db, id) for id in slot_ids_by_professional])
+
+        slots = {}
+        for professional, professional_slot_ids in zip(professionals, slot_ids_by_professional.values()):
+            if not professional or not professional.schedule:
+                continue
+            days = [slot_id.generation_time.date() for slot_id in professional_slot_ids]
+            slot_times = dict(professional.schedule.expand(min(days) - timedelta(days=1), max(days) + timedelta(days=1)))
+            for slot_id in professional_slot_ids:
+                start_time = slot_id.generation_time
+                if start_time in slot_times:
+                    slots[slot_id] = Slot(
+                        id=slot_id,
+                        start_time=start_time,
+                        end_time=slot_times[start_time],
+                        professional_id=professional.id,
+                        specialization=professional.specialization,
+                        is_booked=False,
+                    )
+        return slots
+
+    @staticmethod
+    async def _stored_in_transaction(db: AsyncDatabase, slots: List[Slot], session: Optional[AsyncClientSession]) -> set:
+        """
+        IDs of the slots already stored, read in the transaction of `session` (empty set without one).
+        A duplicate key error aborts a transaction, the inserts leave these out instead: a slot stored by a
+        transaction committed since the snapshot makes the insert fail with a write conflict, which is retried.
+        """
+        if session is None:
+            return set()
+        cursor = db[Slot.get_collection_name()].find({"_id": {"$in": [ObjectId(slot.id) for slot in slots]}}, {"_id": 1}, session=session)
+        return {document["_id"] async for document in cursor}
+
+    @classmethod
+    async def claim(cls, db: AsyncDatabase, slot_id: str, session: Optional[AsyncClientSession] = None) -> Optional[Slot]:
+        """
+        Book a computed slot by storing it, booked, under its virtual ID.
+        Returns None if the ID isn't a free future slot of a professional's schedule.
+        The stored slot's unique `_id` (and professional/start time) make concurrent bookings fail.
+        """
+        slot = await cls.compute_slot(db, slot_id)
+        if not slot or await cls._stored_in_transaction(db, [slot], session):
+            return None
+
+        slot.is_booked = True
+        try:
+            await db[Slot.get_collection_name()].insert_one(slot.to_mongo(), session=session)
+        except DuplicateKeyError:
+            return None
+        await AvailabilitySummary.adjust(db, [slot], free=-1, total=0, session=session)
+        await slot.invalidate_availability()
+        return slot
+
+    @classmethod
+    async def claim_many(cls, db: AsyncDatabase, slots: List[Slot], session: Optional[AsyncClientSession] = None) -> List[Slot]:
+        """
+        Book computed slots (see `compute_slot`) by storing them, booked, in a single unordered insert.
+        Returns the slots that were claimed, the others were already stored by a concurrent booking.
+        """
+        stored = await cls._stored_in_transaction(db, slots, session)
+        slots = [slot.model_copy(update={"is_booked": True}) for slot in slots if slot.id not in stored]
+        if not slots:
+            return []
+        failed = set()
+        try:
+            await db[Slot.get_collection_name()].insert_many([slot.to_mongo() for slot in slots], ordered=False, session=session)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+            failed = {error["index"] for error in e.details["writeErrors"]}
+        claimed = [slot for index, slot in enumerate(slots) if index not in failed]
+        await AvailabilitySummary.adjust(db, claimed, free=-1, total=0, session=session)
+        await Slot.invalidate_availability_many(claimed)
+        return claimed
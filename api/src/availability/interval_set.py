@@ -0,0 +1,52 @@
+import bisect
+from datetime import datetime
+from typing import Iterable, Iterator, List, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+class IntervalSet:
+    """
+    A set of half-open [start, end) intervals, kept sorted and merged so that
+    overlap checks are a binary search.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._starts: List[datetime] = []
+        self._ends: List[datetime] = []
+        for start, end in sorted(intervals):
+            self._append(start, end)
+
+    def _append(self, start: datetime, end: datetime):
+        """Add an interval that doesn't start before any of the current ones"""
+        if self._ends and start <= self._ends[-1]:
+            self._ends[-1] = max(self._ends[-1], end)
+        else:
+            self._starts.append(start)
+            self._ends.append(end)
+
+    def add(self, start: datetime, end: datetime):
+        """Add an interval, merging it with the ones it overlaps or touches"""
+        i = bisect.bisect_left(self._ends, start)
+        j = bisect.bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) shares any instant with the set"""
+        i = bisect.bisect_right(self._ends, start)
+        return i < len(self._starts) and self._starts[i] < end
+
+    def subtract_from(self, intervals: Iterable[Interval]) -> Iterator[Interval]:
+        """Yield the intervals that don't overlap the set"""
+        for start, end in intervals:
+            if not self.overlaps(start, end):
+                yield start, end
+
+    def __iter__(self) -> Iterator[Interval]:
+        return iter(zip(self._starts, self._ends))
+
+    def __len__(self) -> int:
+        return len(self._starts)
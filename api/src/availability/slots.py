@@ -0,0 +1,165 @@
+"""
+Entry points to find and claim free slots, whichever the `SLOT_MODE`:
+stored slots ("materialized") or slots computed from the schedules ("lazy").
+"""
+from collections import Counter
+from datetime import date, datetime, time, timedelta, UTC
+from typing import AsyncIterator, Dict, List, Optional
+
+from bson.objectid import ObjectId
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+
+from constants import SLOT_MODE, LAZY_SLOTS_HORIZON_DAYS
+from models import MedicalSpecialization, Professional, Slot, SlotHold
+from models.datetime_utils import to_utc, utc_now
+from .engine import AvailabilityEngine
+
+LAZY = SLOT_MODE == "lazy"
+
+def _lazy_end(start: datetime, end: Optional[datetime]) -> datetime:
+    return end or (to_utc(start) + timedelta(days=LAZY_SLOTS_HORIZON_DAYS))
+
+async def iter_specialization_slots(
+    db: AsyncDatabase,
+    specialization: MedicalSpecialization,
+    start: datetime,
+    end: datetime,
+    limit: Optional[int] = None,
+    after: Optional[tuple[datetime, ObjectId]] = None,
+) -> AsyncIterator[tuple[Slot, Professional]]:
+    """Free slots of a specialization starting in [start, end] with their professional, sorted by start time, held slots excluded"""
+    held = await SlotHold.held_slot_ids(db, start, end, specialization=specialization)
+    if LAZY:
+        professionals = await Professional.get_cached_by_specialization(db, specialization)
+        results = AvailabilityEngine.iter_available(db, professionals, start, end, limit, after, exclude=held)
+    else:
+        results = Slot.iter_available_by_specialization(db, specialization, start, end, limit, after, held)
+    async for result in results:
+        yield result
+
+async def find_specialization_slots(
+    db: AsyncDatabase,
+    specialization: MedicalSpecialization,
+    start: datetime,
+    end: datetime,
+    limit: Optional[int] = None,
+    after: Optional[tuple[datetime, ObjectId]] = None,
+    exclude_held: bool = True,
+) -> List[tuple[Slot, Professional]]:
+    """
+    Free slots of a specialization starting in [start, end] with their professional, sorted by start time.
+    Pass `exclude_held` False to keep the held slots, e.g. to cache the results and filter the holds on each read.
+    """
+    held = await SlotHold.held_slot_ids(db, start, end, specialization=specialization) if exclude_held else None
+    if LAZY:
+        professionals = await Professional.get_cached_by_specialization(db, specialization)
+        return await AvailabilityEngine.find_available(db, professionals, start, end, limit, after, exclude=held)
+    return await Slot.find_available_by_specialization(db, specialization, start, end, limit, after, held)
+
+async def unavailable_slot_counts(db: AsyncDatabase, specialization: MedicalSpecialization, start: date, end: date) -> Counter:
+    """
+    Slots of a specialization from day `start` to `end` that the availability summary counts as free but aren't
+    offered, per (professional ID, UTC day): the held slots and today's free slots that already started.
+    """
+    now = utc_now()
+    first, last = datetime.combine(start, time.min, UTC), datetime.combine(end + timedelta(days=1), time.min, UTC)
+    counts = await SlotHold.count_by_day(db, specialization, max(now, first), last)
+    today = datetime.combine(now.date(), time.min, UTC)
+    if first <= today < last:
+        # Held or not: holds were only counted from now on
+        for slot, _ in await find_specialization_slots(db, specialization, today, now, exclude_held=False):
+            if to_utc(slot.start_time) < now:
+                counts[(ObjectId(slot.professional_id), today.date().isoformat())] += 1
+    return counts
+
+async def find_next_specialization_slots(
+    db: AsyncDatabase,
+    specialization: MedicalSpecialization,
+    start: datetime,
+    count: int,
+    per_professional: Optional[int] = None,
+    end: Optional[datetime] = None,
+) -> List[tuple[Slot, Professional]]:
+    """
+    The earliest `count` free slots of a specialization starting at or after `start` (and before `end`) with their
+    professional, with at most `per_professional` slots of each professional. Every path stops reading once it
+    has enough slots, so it costs the same whatever the number of free slots after `start`. Held slots are excluded.
+    """
+    held = await SlotHold.held_slot_ids(db, start, end, specialization=specialization)
+    if LAZY:
+        professionals = await Professional.get_cached_by_specialization(db, specialization)
+        return await AvailabilityEngine.find_available(db, professionals, start, _lazy_end(start, end), count, per_professional=per_professional, exclude=held)
+    if not per_professional or per_professional >= count:
+        # The cap can't be reached: a single index scan of the specialization's free slots
+        return await Slot.find_available_by_specialization(db, specialization, start, end, limit=count, exclude=held)
+    professionals = await Professional.get_cached_by_specialization(db, specialization)
+    return await Slot.find_next_available(db, professionals, start, count, per_professional, end, held)
+
+async def iter_professional_slots(
+    db: AsyncDatabase,
+    professional: Professional,
+    start: datetime,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    after: Optional[tuple[datetime, ObjectId]] = None,
+) -> AsyncIterator[Slot]:
+    """Free slots of a professional starting in [start, end], sorted by start time, held slots excluded"""
+    held = await SlotHold.held_slot_ids(db, start, end, professional_ids=[ObjectId(professional.id)])
+    if LAZY:
+        async for slot, _ in AvailabilityEngine.iter_available(db, [professional], start, _lazy_end(start, end), limit, after, exclude=held):
+            yield slot
+    else:
+        async for slot in Slot.iter_available(db, [ObjectId(professional.id)], start, end, limit, after, held):
+            yield slot
+
+async def find_professional_slots(
+    db: AsyncDatabase,
+    professional: Professional,
+    start: datetime,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    after: Optional[tuple[datetime, ObjectId]] = None,
+) -> List[Slot]:
+    held = await SlotHold.held_slot_ids(db, start, end, professional_ids=[ObjectId(professional.id)])
+    if LAZY:
+        return [slot for slot, _ in await AvailabilityEngine.find_available(db, [professional], start, _lazy_end(start, end), limit, after, exclude=held)]
+    return await Slot.find_available(db, [ObjectId(professional.id)], start, end, limit, after, held)
+
+async def claim_slot(db: AsyncDatabase, slot_id: str, session: Optional[AsyncClientSession] = None) -> Optional[Slot]:
+    """
+    Atomically book a free future slot, None if it can't be booked.
+    In lazy mode a slot that was never stored is stored (booked) at this point.
+    """
+    slot = await Slot.claim(db, slot_id, session=session)
+    if not slot and LAZY:
+        slot = await AvailabilityEngine.claim(db, slot_id, session=session)
+    return slot
+
+async def claim_slots(db: AsyncDatabase, slots: List[Slot], session: Optional[AsyncClientSession] = None) -> List[Slot]:
+    """
+    Atomically book free future slots (see `get_slots`) in bulk, returns the ones that were booked.
+    In lazy mode computed slots are stored (booked) at this point.
+    """
+    claimed = await Slot.claim_many(db, slots, session=session)
+    if LAZY and len(claimed) < len(slots):
+        claimed_ids = {slot.id for slot in claimed}
+        # Computed slots were never stored, the conditional updates didn't match them
+        claimed += await AvailabilityEngine.claim_many(db, [slot for slot in slots if slot.id not in claimed_ids], session=session)
+    return claimed
+
+async def get_slots(db: AsyncDatabase, slot_ids: List[ObjectId]) -> Dict[ObjectId, Slot]:
+    """Slots by ID with a single `$in` query, plus (in lazy mode) the computed ones that were never stored"""
+    slots = {slot.id: slot for slot in await Slot.get_many_by_query(db, {"_id": {"$in": slot_ids}})}
+    if LAZY:
+        slots.update(await AvailabilityEngine.compute_slots(db, [slot_id for slot_id in slot_ids if slot_id not in slots]))
+    return slots
+
+async def get_free_slot(db: AsyncDatabase, slot_id: str) -> Optional[Slot]:
+    """A free future slot by ID, stored or (in lazy mode) computed, None if it doesn't exist or can't be booked"""
+    slot = await Slot.get_by_id(db, slot_id)
+    if not slot and LAZY:
+        return await AvailabilityEngine.compute_slot(db, slot_id)
+    if not slot or slot.is_booked or slot.start_time <= utc_now():
+        return None
+    return slot
@@ -0,0 +1,99 @@
+"""
+Booking throughput of `POST /appointments/batch` against looping over `POST /appointments`, e.g. to rebook
+a cancelled day. Every run books its own free slots, so each one starts from the same state.
+
+It seeds the bench database and starts the API with uvicorn on it, like the load test.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.batch_booking [--bookings 2000] [--batch-size 200] [--concurrency 1,8]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+import httpx
+
+from ..models import Appointment
+from ..scripts.seed_database import PATIENT_KIND, SLOT_KIND, seed_object_id
+from .common import add_dataset_arguments, api_server, argument_parser, bench_db, dataset_epoch, report, seed_dataset, wait_until_healthy
+
+async def book_one_by_one(client: httpx.AsyncClient, bookings: List[dict], concurrency: int) -> List[int]:
+    """POST /appointments once per booking, `concurrency` requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def book(booking: dict) -> int:
+        async with semaphore:
+            return (await client.post("/appointments", json=booking)).status_code
+
+    return await asyncio.gather(*[book(booking) for booking in bookings])
+
+async def book_in_batches(client: httpx.AsyncClient, bookings: List[dict], batch_size: int) -> List[int]:
+    """POST /appointments/batch with `batch_size` bookings per request, one request at a time"""
+    statuses = []
+    for start in range(0, len(bookings), batch_size):
+        response = await client.post("/appointments/batch", json={"appointments": bookings[start:start + batch_size]})
+        response.raise_for_status()
+        statuses += [item["status_code"] for item in response.json()]
+    return statuses
+
+async def measure(name: str, book, bookings: List[dict], requests: int) -> dict:
+    started = time.perf_counter()
+    statuses = await book(bookings)
+    elapsed = time.perf_counter() - started
+    booked = statuses.count(200)
+    print(f"{name}: {booked}/{len(bookings)} booked in {elapsed:.2f}s")
+    return {
+        "requests": requests,
+        "booked": booked,
+        "failed": len(statuses) - booked,
+        "elapsed_s": elapsed,
+        "bookings_per_s": len(bookings) / elapsed,
+    }
+
+async def run(args: argparse.Namespace) -> dict:
+    start_date, epoch = dataset_epoch()
+    rng = random.Random(args.seed)
+
+    async with bench_db() as db:
+        await seed_dataset(db, args, epoch, start_date)
+        runs = [("single", concurrency) for concurrency in args.concurrency] + [("batch", args.batch_size)]
+        if args.bookings * len(runs) > args.slots:
+            raise SystemExit(f"Not enough slots: {len(runs)} runs of {args.bookings} bookings need {args.bookings * len(runs)}")
+        # Disjoint free slots for each run
+        slot_indexes = rng.sample(range(args.slots), args.bookings * len(runs))
+
+        with api_server(args.port, args.workers) as url:
+            async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+                await wait_until_healthy(client)
+                results = {"config": {name: value for name, value in vars(args).items() if name != "output"}, "runs": {}}
+                for number, (mode, parameter) in enumerate(runs):
+                    bookings = [
+                        {
+                            "patient_id": str(seed_object_id(epoch, PATIENT_KIND, rng.randrange(args.patients))),
+                            "slot_id": str(seed_object_id(epoch, SLOT_KIND, index)),
+                        }
+                        for index in slot_indexes[number * args.bookings:(number + 1) * args.bookings]
+                    ]
+                    if mode == "single":
+                        name = f"single_concurrency_{parameter}"
+                        results["runs"][name] = await measure(name, lambda b: book_one_by_one(client, b, parameter), bookings, len(bookings))
+                    else:
+                        name = f"batch_size_{parameter}"
+                        results["runs"][name] = await measure(name, lambda b: book_in_batches(client, b, parameter), bookings, -(-len(bookings) // parameter))
+
+        fastest_single = max(run["bookings_per_s"] for name, run in results["runs"].items() if name.startswith("single"))
+        results["batch_speedup"] = results["runs"][f"batch_size_{args.batch_size}"]["bookings_per_s"] / fastest_single
+        results["appointments"] = await db[Appointment.get_collection_name()].count_documents({})
+        report("Batch booking", results, args.output)
+        return results
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__)
+    add_dataset_arguments(parser)
+    parser.add_argument("--bookings", type=int, default=2000, help="Bookings per run")
+    parser.add_argument("--batch-size", type=int, default=200, help="Bookings per batch request")
+    parser.add_argument("--concurrency", type=lambda value: [int(part) for part in value.split(",")], default="1,8",
+                        help="Requests in flight when looping over the single endpoint, one run per value")
+    asyncio.run(run(parser.parse_args()))
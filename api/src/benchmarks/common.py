@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime, timedelta, UTC
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+import httpx
+from pymongo.asynchronous.database import AsyncDatabase
+
+from ..config.database import Database
+from ..models import Patient, Professional, Slot, Appointment
+from ..scripts.seed_database import generate_patients, generate_professionals, generate_slots_and_appointments
+
+BENCH_DB_NAME = "medapp_bench"
+SEED = 12345
+SRC_DIR = Path(__file__).resolve().parents[1]
+STARTUP_TIMEOUT = 30
+# Days the slots of the API benchmarks' dataset are spread over, from tomorrow
+HORIZON_DAYS = 30
+
+def get_bench_db():
+    """Benchmarks run on their own database so they never touch real data"""
+    if Database.client is None:
+        raise Exception("Database not connected")
+    return Database.client[BENCH_DB_NAME]
+
+@asynccontextmanager
+async def bench_db() -> AsyncIterator[AsyncDatabase]:
+    """Connected to the bench database for the duration of the block"""
+    await Database.connect_db()
+    try:
+        yield get_bench_db()
+    finally:
+        await Database.close_db()
+
+def argument_parser(description: str, skip_seed: bool = False) -> argparse.ArgumentParser:
+    """Parser with the flags every benchmark takes: `--seed`, `--output` and, for the ones seeding a dataset, `--skip-seed`"""
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=SEED)
+    if skip_seed:
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse the collections seeded by a previous run")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    return parser
+
+def percentiles(samples: List[float]) -> dict:
+    """Summary of latency samples, in milliseconds"""
+    ordered = sorted(samples)
+    def at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+    }
+
+@contextmanager
+def timer(samples: List[float]) -> Iterator[None]:
+    """Append the elapsed wall time of the block to `samples`, in seconds"""
+    start = time.perf_counter()
+    yield
+    samples.append(time.perf_counter() - start)
+
+async def measure(query: Callable[..., Awaitable[list]], workload: Iterable[tuple]) -> dict:
+    """Latency percentiles of `query(*arguments)` for each arguments of the workload, and the rows they returned"""
+    samples: List[float] = []
+    returned = 0
+    for arguments in workload:
+        with timer(samples):
+            returned += len(await query(*arguments))
+    return {**percentiles(samples), "rows_returned": returned}
+
+def print_results(title: str, results: dict):
+    print(f"\n== {title}")
+    print(json.dumps(results, indent=2, default=str))
+
+def save_results(path: str, results: dict):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results saved to {path}")
+
+def report(title: str, results: dict, output: Optional[str]):
+    """Print the results and save them to `output` when given"""
+    print_results(title, results)
+    if output:
+        save_results(output, results)
+
+# API benchmarks: they seed a dataset with the seed script's generators and start the API on the bench database
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--professionals", type=int, default=200)
+    parser.add_argument("--slots", type=int, default=100_000)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started API")
+
+def dataset_epoch() -> tuple[date, int]:
+    """First day of the dataset's slots (tomorrow, so they're all bookable) and the epoch of its IDs"""
+    start_date = datetime.now(UTC).date() + timedelta(days=1)
+    return start_date, int(datetime.combine(start_date, datetime.min.time(), UTC).timestamp())
+
+async def seed_dataset(db, args: argparse.Namespace, epoch: int, start_date: date):
+    """`args.patients` patients and `args.professionals` professionals sharing `args.slots` free slots"""
+    models = [Patient, Professional, Slot, Appointment]
+    for model in models:
+        await db[model.get_collection_name()].drop()
+        await model.ensure_indexes(db)
+
+    print(f"Seeding {args.patients} patients, {args.professionals} professionals and {args.slots} slots...")
+    await db[Patient.get_collection_name()].insert_many(generate_patients(args.seed, epoch, 0, args.patients), ordered=False)
+    professionals = generate_professionals(args.seed, epoch, args.professionals)
+    await db[Professional.get_collection_name()].insert_many(professionals, ordered=False)
+    slots, _ = generate_slots_and_appointments(
+        args.seed, epoch,
+        [(index, professional["_id"], professional["specialization"]) for index, professional in enumerate(professionals)],
+        args.slots, args.professionals, start_date, HORIZON_DAYS, 0, args.patients,
+    )
+    await db[Slot.get_collection_name()].insert_many(slots, ordered=False)
+
+async def wait_until_healthy(client: httpx.AsyncClient):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise Exception(f"API not healthy after {STARTUP_TIMEOUT}s")
+
+@contextmanager
+def api_server(port: int, workers: int) -> Iterator[str]:
+    """Run the API with uvicorn on the bench database for the duration of the block, yields its URL"""
+    env = {**os.environ, "MONGO_DB_NAME": BENCH_DB_NAME, "PYTHONPATH": str(SRC_DIR)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=SRC_DIR, env=env,
+    )
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.terminate()
+        server.wait()
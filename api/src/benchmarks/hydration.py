@@ -0,0 +1,109 @@
+"""
+Micro-benchmarks of model hydration, in documents per second: validated (`cls(**document)`) vs trusted
+(`from_trusted`) for each model, plus the response builders. CPU only, it doesn't need a database.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.hydration [--documents 20000] [--output results.json]
+"""
+import json
+import random
+import time
+from datetime import timedelta
+from typing import Callable, List
+
+from bson.objectid import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from ..models import Patient, Professional, MedicalSpecialization, Slot, Appointment
+from ..models.datetime_utils import utc_now
+from ..responses import SlotResponse, PatientResponse, Page, json_response
+from .common import argument_parser, report
+
+PAGE_SIZE = 100
+
+def raw_documents(count: int, rng: random.Random) -> dict[str, List[dict]]:
+    """Documents shaped like the ones the database returns"""
+    now = utc_now().replace(microsecond=0)
+    timestamp = int(now.timestamp())
+    professionals = [{
+        "_id": ObjectId(), "created_at": timestamp, "updated_at": timestamp,
+        "name": f"Professional {i}", "specialization": rng.choice(list(MedicalSpecialization)).value,
+    } for i in range(count)]
+    slots = []
+    for i in range(count):
+        professional = rng.choice(professionals)
+        start_time = now + timedelta(minutes=30 * rng.randrange(48 * 30))
+        slots.append({
+            "_id": ObjectId(), "created_at": timestamp, "updated_at": timestamp,
+            "start_time": start_time, "end_time": start_time + timedelta(minutes=30),
+            "professional_id": professional["_id"], "specialization": professional["specialization"], "is_booked": False,
+        })
+    patients = [{
+        "_id": ObjectId(), "created_at": timestamp, "updated_at": timestamp,
+        "name": f"Patient {i}", "national_id": str(100000000 + i), "phone_number": "+1234567890", "email": f"patient{i}@example.com",
+    } for i in range(count)]
+    appointments = []
+    by_id = {professional["_id"]: professional for professional in professionals}
+    for slot in slots:
+        patient, professional = rng.choice(patients), by_id[slot["professional_id"]]
+        appointments.append({
+            "_id": ObjectId(), "created_at": timestamp, "updated_at": timestamp,
+            "patient_id": patient["_id"], "slot_id": slot["_id"],
+            "patient": {"id": patient["_id"], "name": patient["name"], "national_id": patient["national_id"]},
+            "slot": {"id": slot["_id"], "start_time": slot["start_time"], "end_time": slot["end_time"]},
+            "professional": {"id": professional["_id"], "name": professional["name"], "specialization": professional["specialization"]},
+        })
+    return {"Professional": professionals, "Slot": slots, "Patient": patients, "Appointment": appointments}
+
+def documents_per_second(function: Callable, items: list, repeat: int = 3) -> float:
+    """Best of `repeat` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+def run(count: int, seed_value: int, output: str | None):
+    rng = random.Random(seed_value)
+    documents = raw_documents(count, rng)
+    results: dict = {"documents": count, "models": {}, "responses": {}}
+
+    for model in (Professional, Slot, Patient, Appointment):
+        items = documents[model.__name__]
+        validated = documents_per_second(lambda document: model(**document), items)
+        trusted = documents_per_second(model.from_trusted, items)
+        results["models"][model.__name__] = {
+            "validated_docs_per_s": round(validated),
+            "trusted_docs_per_s": round(trusted),
+            "speedup": round(trusted / validated, 2),
+        }
+
+    professionals = {document["_id"]: Professional.from_trusted(document) for document in documents["Professional"]}
+    slots = [Slot.from_trusted(document) for document in documents["Slot"]]
+    patients = [Patient.from_trusted(document) for document in documents["Patient"]]
+    results["responses"]["SlotResponse.create"] = round(documents_per_second(lambda slot: SlotResponse.create(slot, professionals[slot.professional_id]), slots))
+    results["responses"]["PatientResponse.create"] = round(documents_per_second(PatientResponse.create, patients))
+    results["responses"]["SlotResponse.model_dump_json"] = round(documents_per_second(
+        lambda response: response.model_dump_json(),
+        [SlotResponse.create(slot, professionals[slot.professional_id]) for slot in slots],
+    ))
+
+    # A listing page: the FastAPI response_model path (dump, validate again, jsonable_encoder, json.dumps) vs pydantic-core in one pass
+    pages = [
+        Page[SlotResponse].model_construct(items=SlotResponse.create_many((slot, professionals[slot.professional_id]) for slot in slots[i:i + PAGE_SIZE]))
+        for i in range(0, len(slots), PAGE_SIZE)
+    ]
+    results["responses"]["page_fastapi_encoder"] = round(documents_per_second(
+        lambda page: json.dumps(jsonable_encoder(Page[SlotResponse].model_validate(page.model_dump())), ensure_ascii=False, separators=(",", ":")), pages,
+    ) * PAGE_SIZE)
+    results["responses"]["page_json_response"] = round(documents_per_second(json_response, pages) * PAGE_SIZE)
+
+    report("Hydration throughput (documents per second)", results, output)
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__)
+    parser.add_argument("--documents", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.documents, args.seed, args.output)
@@ -0,0 +1,109 @@
+"""
+Compares materialized slots (every future slot stored) with lazy slots (computed from the schedules,
+only booked slots stored): storage and index size of the `slots` collection and the latency of the
+specialization slot search.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.lazy_slots [--professionals 300] [--days 90] [--booked 0.1] [--queries 100]
+"""
+import asyncio
+import random
+from datetime import time, timedelta
+
+from ..availability.engine import AvailabilityEngine, virtual_slot_id
+from ..models import Professional, Slot, MedicalSpecialization, Schedule, WeeklyHours
+from ..models.datetime_utils import utc_now
+from .common import argument_parser, bench_db, measure, report
+
+PAGE_SIZE = 20
+
+def random_schedule(rng: random.Random) -> Schedule:
+    """Mornings and/or afternoons on 3 to 5 weekdays"""
+    weekly_hours = []
+    for weekday in sorted(rng.sample(range(5), rng.randint(3, 5))):
+        if rng.random() < 0.7:
+            weekly_hours.append(WeeklyHours(weekday=weekday, start=time(8), end=time(12)))
+        if rng.random() < 0.7:
+            weekly_hours.append(WeeklyHours(weekday=weekday, start=time(14), end=time(18)))
+    return Schedule(slot_minutes=rng.choice([15, 20, 30]), weekly_hours=weekly_hours)
+
+async def storage_stats(db) -> dict:
+    stats = await db.command("collStats", Slot.get_collection_name())
+    return {"documents": stats["count"], "size_bytes": stats["size"], "total_index_size_bytes": stats["totalIndexSize"]}
+
+async def seed(db, num_professionals: int, days: int, booked_ratio: float, rng: random.Random, materialized: bool) -> list[Professional]:
+    """Materialized: every slot of the horizon is stored. Lazy: only the booked ones, under their virtual ID"""
+    for model in (Professional, Slot):
+        await db[model.get_collection_name()].drop()
+        await model.ensure_indexes(db)
+
+    professionals = [
+        Professional(name=f"Professional {i}", specialization=rng.choice(list(MedicalSpecialization)), schedule=random_schedule(rng))
+        for i in range(num_professionals)
+    ]
+    await Professional.insert_many(db, professionals)
+
+    today = utc_now().date()
+    end = today + timedelta(days=days - 1)
+    for professional in professionals:
+        if materialized:
+            await Slot.generate_from_schedule(db, professional, today, end)
+        booked = [
+            (start_time, end_time) for start_time, end_time in professional.schedule.expand(today, end)
+            if rng.random() < booked_ratio
+        ]
+        if not booked:
+            continue
+        if materialized:
+            await db[Slot.get_collection_name()].update_many(
+                {"professional_id": professional.id, "start_time": {"$in": [start_time for start_time, _ in booked]}},
+                {"$set": {"is_booked": True}},
+            )
+        else:
+            await Slot.insert_many(db, [
+                Slot(id=virtual_slot_id(professional.id, start_time), start_time=start_time, end_time=end_time,
+                     professional_id=professional.id, specialization=professional.specialization, is_booked=True)
+                for start_time, end_time in booked
+            ])
+    return professionals
+
+def search_first_page(db, professionals: list[Professional], lazy: bool):
+    """The first page of the specialization slot search, computed from the schedules or read from the stored slots"""
+    by_specialization: dict[MedicalSpecialization, list[Professional]] = {}
+    for professional in professionals:
+        by_specialization.setdefault(professional.specialization, []).append(professional)
+
+    async def search(specialization: MedicalSpecialization, start, end) -> list:
+        if lazy:
+            return await AvailabilityEngine.find_available(db, by_specialization.get(specialization, []), start, end, limit=PAGE_SIZE)
+        return await Slot.find_available_by_specialization(db, specialization, start, end, limit=PAGE_SIZE)
+    return search
+
+async def run(num_professionals: int, days: int, booked_ratio: float, queries: int, seed_value: int, output: str | None):
+    async with bench_db() as db:
+        now = utc_now()
+        workload_rng = random.Random(seed_value)
+        workload = [
+            (workload_rng.choice(list(MedicalSpecialization)), start, start + timedelta(days=30))
+            for start in (now + timedelta(days=workload_rng.randrange(max(1, days - 30))) for _ in range(queries))
+        ]
+
+        results = {"professionals": num_professionals, "days": days, "booked_ratio": booked_ratio, "queries": queries}
+        for mode in ("materialized", "lazy"):
+            print(f"Seeding the {mode} dataset...")
+            professionals = await seed(db, num_professionals, days, booked_ratio, random.Random(seed_value), materialized=mode == "materialized")
+            results[mode] = {
+                **await storage_stats(db),
+                "search_first_page": await measure(search_first_page(db, professionals, lazy=mode == "lazy"), workload),
+            }
+
+        report("Materialized vs lazy slots", results, output)
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__)
+    parser.add_argument("--professionals", type=int, default=300)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--booked", type=float, default=0.1, help="Ratio of booked slots")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.professionals, args.days, args.booked, args.queries, args.seed, args.output))
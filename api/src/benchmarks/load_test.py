@@ -0,0 +1,148 @@
+"""
+End-to-end load test of the API: a mix of specialization slot searches, patient lookups and concurrent
+bookings, fired by a fixed number of virtual users. Reports latency percentiles and throughput per
+operation, and checks the bench database for double bookings afterwards.
+
+By default it seeds the bench database and starts the API with uvicorn on it. Use `--url` to target an
+API that is already running instead (it must be using the bench database, see MONGO_DB_NAME).
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.load_test [--duration 30] [--users 50] [--mix slots=70,patient=20,book=10]
+        [--hot-slots 50] [--workers 1] [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from typing import List
+
+import httpx
+
+from ..models import MedicalSpecialization, Slot, Appointment
+from ..scripts.seed_database import PATIENT_KIND, SLOT_KIND, seed_object_id
+from .common import (
+    add_dataset_arguments, api_server, argument_parser, bench_db, dataset_epoch, percentiles, print_results, report,
+    seed_dataset, wait_until_healthy,
+)
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in ("slots", "patient", "book"):
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}")
+        weights[name] = int(weight)
+    return weights
+
+async def virtual_user(client: httpx.AsyncClient, args: argparse.Namespace, epoch: int, rng: random.Random, slot_ids: List[str],
+                       deadline: float, latencies: dict[str, List[float]], statuses: dict[str, Counter]):
+    operations, weights = zip(*args.mix.items())
+    specializations = list(MedicalSpecialization)
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        if operation == "slots":
+            request = client.get(f"/slots/specialization/{rng.choice(specializations).value}")
+        elif operation == "patient":
+            request = client.get(f"/patients/{100_000_000 + rng.randrange(args.patients)}")
+        else:
+            request = client.post("/appointments", json={"patient_id": str(seed_object_id(epoch, PATIENT_KIND, rng.randrange(args.patients))), "slot_id": rng.choice(slot_ids)})
+        start = time.perf_counter()
+        try:
+            response = await request
+            status = response.status_code
+        except httpx.TransportError as e:
+            status = type(e).__name__
+        latencies[operation].append(time.perf_counter() - start)
+        statuses[operation][status] += 1
+
+async def count_double_bookings(db) -> dict:
+    """Slots with more than one appointment, and appointments whose slot isn't booked"""
+    duplicated = await (await db[Appointment.get_collection_name()].aggregate([
+        {"$group": {"_id": "$slot_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$count": "slots"},
+    ])).to_list()
+    unbooked = await (await db[Appointment.get_collection_name()].aggregate([
+        {"$lookup": {"from": Slot.get_collection_name(), "localField": "slot_id", "foreignField": "_id", "as": "slot"}},
+        {"$match": {"slot.is_booked": {"$ne": True}}},
+        {"$count": "appointments"},
+    ])).to_list()
+    return {
+        "double_booked_slots": duplicated[0]["slots"] if duplicated else 0,
+        "appointments_on_unbooked_slots": unbooked[0]["appointments"] if unbooked else 0,
+        "appointments": await db[Appointment.get_collection_name()].count_documents({}),
+    }
+
+def compare(results: dict, baseline: dict) -> dict:
+    """Relative change of throughput and p95 per operation, positive is better"""
+    changes = {"throughput_rps": (results["throughput_rps"] - baseline["throughput_rps"]) / baseline["throughput_rps"]}
+    for operation, summary in results["operations"].items():
+        previous = baseline["operations"].get(operation)
+        if previous:
+            changes[f"{operation}_p95"] = (previous["p95_ms"] - summary["p95_ms"]) / previous["p95_ms"]
+    return {name: f"{change:+.1%}" for name, change in changes.items()}
+
+def no_double_bookings(results: dict) -> bool:
+    return results["bookings"]["double_booked_slots"] == 0 and results["bookings"]["appointments_on_unbooked_slots"] == 0
+
+async def run(args: argparse.Namespace) -> dict:
+    start_date, epoch = dataset_epoch()
+    rng = random.Random(args.seed)
+
+    async with bench_db() as db:
+        if not args.skip_seed:
+            await seed_dataset(db, args, epoch, start_date)
+        slot_indexes = rng.sample(range(args.slots), min(args.hot_slots, args.slots)) if args.hot_slots else range(args.slots)
+        slot_ids = [str(seed_object_id(epoch, SLOT_KIND, index)) for index in slot_indexes]
+
+        with nullcontext(args.url) if args.url else api_server(args.port, args.workers) as url:
+            limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+            async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+                await wait_until_healthy(client)
+                print(f"Running {args.users} users for {args.duration}s against {url} ({args.workers} worker(s))...")
+                latencies: dict[str, List[float]] = defaultdict(list)
+                statuses: dict[str, Counter] = defaultdict(Counter)
+                started = time.perf_counter()
+                deadline = started + args.duration
+                await asyncio.gather(*[
+                    virtual_user(client, args, epoch, random.Random(args.seed * 1_000_003 + user), slot_ids, deadline, latencies, statuses)
+                    for user in range(args.users)
+                ])
+                elapsed = time.perf_counter() - started
+
+        total = sum(len(samples) for samples in latencies.values())
+        results = {
+            "config": {name: value for name, value in vars(args).items() if name not in ("baseline", "output")},
+            "elapsed_s": elapsed,
+            "requests": total,
+            "throughput_rps": total / elapsed,
+            "operations": {
+                operation: {**percentiles(samples), "rps": len(samples) / elapsed, "statuses": {str(k): v for k, v in statuses[operation].items()}}
+                for operation, samples in latencies.items()
+            },
+            "bookings": await count_double_bookings(db),
+        }
+        report("Load test", results, args.output)
+        if args.baseline:
+            with open(args.baseline) as f:
+                print_results(f"Compared with {args.baseline}", compare(results, json.load(f)))
+        return results
+
+def add_arguments(parser: argparse.ArgumentParser):
+    add_dataset_arguments(parser)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users, each one waits for its response before sending the next request")
+    parser.add_argument("--mix", type=parse_mix, default="slots=70,patient=20,book=10", help="Relative weights of the operations")
+    parser.add_argument("--hot-slots", type=int, default=50, help="Bookings target this many slots so they collide, 0 for any slot")
+    parser.add_argument("--url", help="Target a running API instead of starting one")
+    parser.add_argument("--baseline", help="Results JSON of a previous run to compare with")
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__, skip_seed=True)
+    add_arguments(parser)
+    results = asyncio.run(run(parser.parse_args()))
+    sys.exit(0 if no_double_bookings(results) else 1)
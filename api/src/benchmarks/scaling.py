@@ -0,0 +1,47 @@
+"""
+Throughput of the API as the number of uvicorn workers grows: runs the load test once per worker count, on
+freshly seeded data, and reports throughput, p95 latency and speedup over the first run.
+
+The load generator is a single process: once its own CPU saturates the speedup stops growing whatever the
+number of workers, check its CPU usage before reading the results.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.scaling [--worker-counts 1,2,4,8] [--duration 30] [--users 200] [--output results.json]
+"""
+import argparse
+import asyncio
+import copy
+import os
+import sys
+
+from .common import argument_parser, report
+from .load_test import add_arguments, no_double_bookings, run as run_load_test
+
+async def run(args: argparse.Namespace) -> dict:
+    runs = []
+    for workers in args.worker_counts:
+        run_args = copy.copy(args)
+        run_args.workers, run_args.output, run_args.baseline = workers, None, None
+        runs.append((workers, await run_load_test(run_args)))
+
+    baseline = runs[0][1]["throughput_rps"]
+    results = {
+        "cpu_count": os.cpu_count(),
+        "runs": [{
+            "workers": workers,
+            "throughput_rps": result["throughput_rps"],
+            "speedup": result["throughput_rps"] / baseline,
+            "p95_ms": {operation: summary["p95_ms"] for operation, summary in result["operations"].items()},
+            "double_bookings": not no_double_bookings(result),
+        } for workers, result in runs],
+    }
+    report("Scaling", results, args.output)
+    return results
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__, skip_seed=True)
+    add_arguments(parser)
+    parser.add_argument("--worker-counts", type=lambda value: [int(count) for count in value.split(",")], default=[1, 2, 4, 8])
+    parser.set_defaults(users=200)
+    results = asyncio.run(run(parser.parse_args()))
+    sys.exit(0 if not any(run["double_bookings"] for run in results["runs"]) else 1)
@@ -0,0 +1,85 @@
+"""
+Compares the specialization slot search implementations:
+- two queries: load the specialization's professionals, then their slots with `$in`, joined in Python
+- aggregation: one indexed match on the denormalized slot `specialization` plus a `$lookup` of the professional
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.slot_search [--professionals 2000] [--slots 500000] [--queries 100]
+"""
+import asyncio
+import random
+from datetime import timedelta
+
+from bson.objectid import ObjectId
+
+from ..models import Professional, Slot, MedicalSpecialization
+from ..models.datetime_utils import utc_now
+from ..responses import SlotResponse
+from .common import argument_parser, bench_db, measure, report
+
+HORIZON_DAYS = 90
+INSERT_BATCH_SIZE = 10_000
+
+async def seed(db, num_professionals: int, num_slots: int, rng: random.Random):
+    for model in (Professional, Slot):
+        await db[model.get_collection_name()].drop()
+        await model.ensure_indexes(db)
+
+    professionals = [
+        Professional(name=f"Professional {i}", specialization=rng.choice(list(MedicalSpecialization)))
+        for i in range(num_professionals)
+    ]
+    await Professional.insert_many(db, professionals)
+
+    print(f"Seeding {num_slots} slots for {num_professionals} professionals...")
+    now = utc_now().replace(minute=0, second=0, microsecond=0)
+    for offset in range(0, num_slots, INSERT_BATCH_SIZE):
+        batch = []
+        for _ in range(min(INSERT_BATCH_SIZE, num_slots - offset)):
+            professional = rng.choice(professionals)
+            start_time = now + timedelta(minutes=30 * rng.randrange(HORIZON_DAYS * 48))
+            batch.append(Slot(
+                start_time=start_time,
+                end_time=start_time + timedelta(minutes=30),
+                professional_id=professional.id,
+                specialization=professional.specialization,
+                is_booked=rng.random() < 0.3,
+            ))
+        await Slot.insert_many(db, batch)
+
+async def two_queries(db, specialization: MedicalSpecialization, start, end) -> list[SlotResponse]:
+    """The implementation `get_time_slots_by_specialization` used before the aggregation"""
+    professionals = await Professional.get_many_by_query(db, {"specialization": specialization.value})
+    professionals_dict = {str(professional.id): professional for professional in professionals}
+    slots = await Slot.find_available(db, [ObjectId(professional.id) for professional in professionals], start, end)
+    return [SlotResponse.create(slot, professionals_dict[str(slot.professional_id)]) for slot in slots]
+
+async def aggregation(db, specialization: MedicalSpecialization, start, end) -> list[SlotResponse]:
+    results = await Slot.find_available_by_specialization(db, specialization, start, end)
+    return [SlotResponse.create(slot, professional) for slot, professional in results]
+
+async def run(num_professionals: int, num_slots: int, queries: int, seed_value: int, skip_seed: bool, output: str | None):
+    rng = random.Random(seed_value)
+    async with bench_db() as db:
+        if not skip_seed:
+            await seed(db, num_professionals, num_slots, rng)
+
+        now = utc_now()
+        workload = [(db, rng.choice(list(MedicalSpecialization)), now, now + timedelta(days=30)) for _ in range(queries)]
+
+        results = {
+            "professionals": num_professionals,
+            "slots": num_slots,
+            "queries": queries,
+            "two_queries": await measure(two_queries, workload),
+            "aggregation": await measure(aggregation, workload),
+        }
+        report("Specialization slot search: two queries vs aggregation", results, output)
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__, skip_seed=True)
+    parser.add_argument("--professionals", type=int, default=2000)
+    parser.add_argument("--slots", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.professionals, args.slots, args.queries, args.seed, args.skip_seed, args.output))
@@ -0,0 +1,107 @@
+"""
+Compares slot range scans with times stored as ISO strings (legacy) vs native BSON dates.
+
+Seeds two collections with the same slots, indexed like `Slot`, then runs the availability query
+of `get_time_slots_by_specialization` against both and reports latency and storage/index size.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.benchmarks.slot_times [--slots 1000000] [--queries 200] [--output results.json]
+"""
+import asyncio
+import random
+from datetime import timedelta
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+from ..models.datetime_utils import utc_now
+from .common import argument_parser, bench_db, measure, report
+
+ISO_COLLECTION = "bench_slots_iso"
+DATE_COLLECTION = "bench_slots_date"
+NUM_PROFESSIONALS = 500
+PROFESSIONALS_PER_SPECIALIZATION = 25
+HORIZON_DAYS = 180
+INSERT_BATCH_SIZE = 10_000
+
+INDEX = IndexModel(
+    [("professional_id", ASCENDING), ("start_time", ASCENDING)],
+    name="available_by_professional_start_time",
+    partialFilterExpression={"is_booked": False},
+)
+
+async def seed(db, count: int, rng: random.Random, professional_ids: list[ObjectId]):
+    now = utc_now().replace(minute=0, second=0, microsecond=0)
+    for collection_name in (ISO_COLLECTION, DATE_COLLECTION):
+        await db[collection_name].drop()
+        await db[collection_name].create_indexes([INDEX])
+
+    print(f"Seeding {count} slots in each collection...")
+    for offset in range(0, count, INSERT_BATCH_SIZE):
+        iso_batch, date_batch = [], []
+        for _ in range(min(INSERT_BATCH_SIZE, count - offset)):
+            start_time = now + timedelta(minutes=30 * rng.randrange(HORIZON_DAYS * 48))
+            end_time = start_time + timedelta(minutes=30)
+            document = {
+                "professional_id": rng.choice(professional_ids),
+                "is_booked": rng.random() < 0.3,
+            }
+            iso_batch.append({**document, "start_time": start_time.replace(tzinfo=None).isoformat(), "end_time": end_time.replace(tzinfo=None).isoformat()})
+            date_batch.append({**document, "start_time": start_time, "end_time": end_time})
+        await db[ISO_COLLECTION].insert_many(iso_batch, ordered=False)
+        await db[DATE_COLLECTION].insert_many(date_batch, ordered=False)
+
+async def storage_stats(db, collection_name: str) -> dict:
+    stats = await db.command("collStats", collection_name)
+    return {
+        "size_bytes": stats["size"],
+        "avg_obj_size_bytes": stats.get("avgObjSize"),
+        "index_size_bytes": stats["indexSizes"][INDEX.document["name"]],
+    }
+
+def range_scan(db, collection_name: str, to_value):
+    """The availability query on one of the collections, `to_value` converts the bounds to its time representation"""
+    async def query(professional_ids: list[ObjectId], start, end) -> list[dict]:
+        return await db[collection_name].find({
+            "professional_id": {"$in": professional_ids},
+            "is_booked": False,
+            "start_time": {"$gte": to_value(start), "$lte": to_value(end)},
+        }).sort("start_time", 1).to_list(length=None)
+    return query
+
+async def run(slots: int, queries: int, seed_value: int, skip_seed: bool, output: str | None):
+    rng = random.Random(seed_value)
+    professional_ids = [ObjectId() for _ in range(NUM_PROFESSIONALS)]
+
+    async with bench_db() as db:
+        if not skip_seed:
+            await seed(db, slots, rng, professional_ids)
+        else:
+            professional_ids = await db[DATE_COLLECTION].distinct("professional_id")
+
+        now = utc_now()
+        workload = []
+        for _ in range(queries):
+            start = now + timedelta(days=rng.randrange(HORIZON_DAYS - 30))
+            workload.append((rng.sample(professional_ids, PROFESSIONALS_PER_SPECIALIZATION), start, start + timedelta(days=30)))
+
+        results = {
+            "slots": slots,
+            "queries": queries,
+            "iso_strings": {
+                **await storage_stats(db, ISO_COLLECTION),
+                "range_scan": await measure(range_scan(db, ISO_COLLECTION, lambda value: value.replace(tzinfo=None).isoformat()), workload),
+            },
+            "native_dates": {
+                **await storage_stats(db, DATE_COLLECTION),
+                "range_scan": await measure(range_scan(db, DATE_COLLECTION, lambda value: value), workload),
+            },
+        }
+        report("Slot time storage: ISO strings vs native dates", results, output)
+
+if __name__ == "__main__":
+    parser = argument_parser(__doc__, skip_seed=True)
+    parser.add_argument("--slots", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.slots, args.queries, args.seed, args.skip_seed, args.output))
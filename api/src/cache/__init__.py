@@ -0,0 +1,28 @@
+"""
+Cache package
+"""
+from constants import (
+    AVAILABILITY_CACHE_ENABLED,
+    AVAILABILITY_CACHE_BACKEND,
+    AVAILABILITY_CACHE_REDIS_URL,
+    AVAILABILITY_CACHE_SIZE,
+    AVAILABILITY_CACHE_TTL,
+)
+from .ttl_cache import TTLCache
+from .backends import CacheBackend, InMemoryBackend, RedisBackend
+from .availability import AvailabilityCache
+
+def create_backend(kind: str, name: str, max_size: int, ttl: float) -> CacheBackend:
+    if kind == "redis":
+        return RedisBackend(AVAILABILITY_CACHE_REDIS_URL)
+    if kind == "memory":
+        return InMemoryBackend(name, max_size, ttl)
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+availability_cache = AvailabilityCache(
+    create_backend(AVAILABILITY_CACHE_BACKEND, "availability", AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_TTL),
+    AVAILABILITY_CACHE_TTL,
+    enabled=AVAILABILITY_CACHE_ENABLED,
+)
+
+__all__ = ["TTLCache", "CacheBackend", "InMemoryBackend", "RedisBackend", "AvailabilityCache", "availability_cache"]
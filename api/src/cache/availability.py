@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, UTC
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+from .backends import CacheBackend
+
+# Most days a page reads at once, the first read is a single day and each next one doubles up to this
+MAX_DAYS_PER_READ = 8
+# Seconds the version counters outlive the entries stored under them
+VERSION_TTL_MARGIN = 60
+
+class AvailabilityCache:
+    """
+    Cache of the free slots of a specialization, one entry per (specialization, UTC day).
+
+    Each entry is versioned: writes (bookings, new slots...) bump the version of the days they touch,
+    which makes the cached entry unreachable. Entries are stored under the version read *before*
+    loading them from the database, so a load racing with a booking can never be served afterwards.
+    Versions expire VERSION_TTL_MARGIN seconds after the last bump or entry stored under them: a version
+    only counts from 0 again once every entry stored under its previous values has expired.
+
+    Rows can be any object with `start_time` and `id` attributes, they're returned sorted by both.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.version_ttl = ttl + VERSION_TTL_MARGIN
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _version_key(specialization: str, day: date) -> str:
+        return f"availability:{specialization}:{day.isoformat()}:version"
+
+    @staticmethod
+    def _data_key(specialization: str, day: date, version: int) -> str:
+        return f"availability:{specialization}:{day.isoformat()}:v{version}"
+
+    @staticmethod
+    def _days(start: datetime, end: datetime) -> List[date]:
+        first, last = to_day(start), to_day(end)
+        return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+    async def get_slots(
+        self,
+        specialization: str,
+        start: datetime,
+        end: datetime,
+        loader: Callable[[datetime, datetime], Awaitable[List[Any]]],
+        row_type: Any,
+        limit: Optional[int] = None,
+        keep: Optional[Callable[[Any], bool]] = None,
+    ) -> List[Any]:
+        """
+        Get the first `limit` rows starting in [start, end] (timezone-aware datetimes) that pass `keep`.
+        Days are read in order, 1, 2, 4... up to MAX_DAYS_PER_READ at a time, until `limit` rows are found: a page
+        only reads and loads the days it needs. The days of a read that aren't cached are loaded with a single
+        `loader(range_start, range_end)` call. Rows are stored as `row_type` by backends that serialize them.
+        """
+        days = self._days(start, end)
+        rows = []
+        index, count = 0, 1
+        while index < len(days):
+            for row in await self._get_days(specialization, days[index:index + count], loader, row_type):
+                if start <= row.start_time <= end and (keep is None or keep(row)):
+                    rows.append(row)
+            if limit is not None and len(rows) >= limit:
+                return rows[:limit]
+            index += count
+            count = min(count * 2, MAX_DAYS_PER_READ)
+        return rows
+
+    async def _get_days(
+        self,
+        specialization: str,
+        days: List[date],
+        loader: Callable[[datetime, datetime], Awaitable[List[Any]]],
+        row_type: Any,
+    ) -> List[Any]:
+        """Every row of the consecutive days, from the cache or loaded"""
+        day_type = List[row_type]
+        versions = await self.backend.get_counters([self._version_key(specialization, day) for day in days])
+        cached = await self.backend.get_many(
+            [self._data_key(specialization, day, version) for day, version in zip(days, versions)],
+            day_type,
+        )
+
+        missing = [i for i, rows in enumerate(cached) if rows is None]
+        self.hits += len(days) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            range_start = datetime.combine(days[missing[0]], time.min, UTC)
+            range_end = datetime.combine(days[missing[-1]], time.max, UTC)
+            loaded = defaultdict(list)
+            for row in await loader(range_start, range_end):
+                loaded[to_day(row.start_time)].append(row)
+
+            for i in missing:
+                cached[i] = loaded[days[i]]
+                await self.backend.set(self._data_key(specialization, days[i], versions[i]), cached[i], self.ttl, day_type)
+            await self.backend.expire(
+                [self._version_key(specialization, days[i]) for i in missing if versions[i]], self.version_ttl,
+            )
+
+        return [row for rows in cached for row in rows]
+
+    async def invalidate(self, specialization: Optional[str], times: Iterable[datetime]):
+        """Drop the cached days of a specialization that contain any of the given times"""
+        if not self.enabled or not specialization:
+            return
+        for day in {to_day(value) for value in times}:
+            self.invalidations += 1
+            await self.backend.incr(self._version_key(specialization, day), self.version_ttl)
+
+    async def close(self):
+        if close := getattr(self.backend, "close", None):
+            await close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": "availability",
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "day_hits": self.hits,
+            "day_misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+def to_day(value: datetime) -> date:
+    """UTC day of a datetime, naive datetimes are assumed to be in UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(UTC).date()
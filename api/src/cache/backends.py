@@ -0,0 +1,120 @@
+import time
+from functools import lru_cache
+from typing import Any, List, Optional, Protocol
+
+from pydantic import TypeAdapter
+
+from .ttl_cache import TTLCache
+
+@lru_cache(maxsize=None)
+def _adapter(type_: Any) -> TypeAdapter:
+    return TypeAdapter(type_)
+
+class CacheBackend(Protocol):
+    """
+    Storage for shared caches. Values expire after the `ttl` given when they're set, counters `ttl` seconds
+    after they were last incremented or expired (`expire`), then count from 0 again. `type_` is the type of the values (e.g. `List[SlotResponse]`),
+    backends storing them outside the process serialize them with it.
+    """
+
+    async def get_many(self, keys: List[str], type_: Any) -> List[Optional[Any]]:
+        """Get the values of the keys, None for the missing or expired ones"""
+        ...
+
+    async def set(self, key: str, value: Any, ttl: float, type_: Any):
+        ...
+
+    async def incr(self, key: str, ttl: float) -> int:
+        """Increment a counter, expiring `ttl` seconds from now, and return its new value"""
+        ...
+
+    async def expire(self, keys: List[str], ttl: float):
+        """Make the existing counters among `keys` expire `ttl` seconds from now"""
+        ...
+
+    async def get_counters(self, keys: List[str]) -> List[int]:
+        """Get the value of counters, 0 for the missing or expired ones"""
+        ...
+
+class InMemoryBackend:
+    """Per-process backend, values are stored as is so reads don't pay any deserialization"""
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self._values: TTLCache[str, Any] = TTLCache(name, max_size, ttl)
+        # key -> (expiry, value), expired counters are dropped at most once per `ttl`
+        self._counters: dict[str, tuple[float, int]] = {}
+        self._next_purge = time.monotonic() + ttl
+        self._ttl = ttl
+
+    async def get_many(self, keys: List[str], type_: Any) -> List[Optional[Any]]:
+        return [self._values.get(key) for key in keys]
+
+    async def set(self, key: str, value: Any, ttl: float, type_: Any):
+        self._values.set(key, value)
+
+    def _counter(self, key: str, now: float) -> int:
+        expiry, value = self._counters.get(key, (now, 0))
+        return value if expiry > now else 0
+
+    async def incr(self, key: str, ttl: float) -> int:
+        now = time.monotonic()
+        if now >= self._next_purge:
+            self._counters = {key: counter for key, counter in self._counters.items() if counter[0] > now}
+            self._next_purge = now + self._ttl
+        value = self._counter(key, now) + 1
+        self._counters[key] = (now + ttl, value)
+        return value
+
+    async def expire(self, keys: List[str], ttl: float):
+        now = time.monotonic()
+        for key in keys:
+            if value := self._counter(key, now):
+                self._counters[key] = (now + ttl, value)
+
+    async def get_counters(self, keys: List[str]) -> List[int]:
+        now = time.monotonic()
+        return [self._counter(key, now) for key in keys]
+
+class RedisBackend:
+    """
+    Backend shared by every API worker. Values are stored as JSON, serialized and validated by pydantic-core
+    like the JSON responses.
+    Requires the `redis` extra.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError("The Redis cache backend requires the `redis` extra: poetry install --extras redis") from e
+        self._client = redis.from_url(url)
+
+    async def get_many(self, keys: List[str], type_: Any) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        adapter = _adapter(type_)
+        return [adapter.validate_json(value) if value is not None else None for value in await self._client.mget(keys)]
+
+    async def set(self, key: str, value: Any, ttl: float, type_: Any):
+        await self._client.set(key, _adapter(type_).dump_json(value), px=int(ttl * 1000))
+
+    async def incr(self, key: str, ttl: float) -> int:
+        async with self._client.pipeline() as pipeline:
+            value, _ = await pipeline.incr(key).pexpire(key, int(ttl * 1000)).execute()
+        return value
+
+    async def expire(self, keys: List[str], ttl: float):
+        if not keys:
+            return
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.pexpire(key, int(ttl * 1000))
+            await pipeline.execute()
+
+    async def get_counters(self, keys: List[str]) -> List[int]:
+        if not keys:
+            return []
+        return [int(value) if value is not None else 0 for value in await self._client.mget(keys)]
+
+    async def close(self):
+        await self._client.aclose()
@@ -1,6 +1,6 @@
 """
 Configuration package
 """
-from .database import Database
+from .database import Database, is_transient_transaction_error
 
-__all__ = ["Database"] 
+__all__ = ["Database", "is_transient_transaction_error"] 
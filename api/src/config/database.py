@@ -1,13 +1,80 @@
+import logging
+import time
+from datetime import UTC
 from pymongo import AsyncMongoClient
-from typing import Optional
-from constants import DB_NAME
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.errors import OperationFailure, PyMongoError
+from typing import Awaitable, Callable, Iterable, Optional, Type, TypeVar, TYPE_CHECKING
+from constants import (
+    DB_NAME,
+    USE_TRANSACTIONS,
+    MONGO_URI,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_READ_PREFERENCE,
+    MONGO_WRITE_CONCERN,
+    MONGO_JOURNAL,
+    MONGO_MONITORING,
+)
+from monitoring import CommandMetricsListener, PoolMetricsListener
+
+if TYPE_CHECKING:
+    from models.mongo_base import MongoBase
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def is_transient_transaction_error(error: BaseException) -> bool:
+    """Whether a transaction failed on a conflict worth retrying, e.g. a write conflict with a concurrent transaction"""
+    return isinstance(error, PyMongoError) and error.has_error_label("TransientTransactionError")
 
 class Database:
     client: Optional[AsyncMongoClient] = None
+    # See MEDAPP_USE_TRANSACTIONS
+    use_transactions: bool = USE_TRANSACTIONS
     
     @classmethod
     async def connect_db(cls):
-        cls.client = AsyncMongoClient("mongodb://localhost:27017")
+        """Create the client from the MONGO_* settings and warm up the pool"""
+        write_concern = {}
+        if MONGO_WRITE_CONCERN:
+            write_concern["w"] = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+        if MONGO_JOURNAL is not None:
+            write_concern["journal"] = MONGO_JOURNAL
+
+        cls.client = AsyncMongoClient(
+            MONGO_URI,
+            tz_aware=True,
+            tzinfo=UTC,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            readPreference=MONGO_READ_PREFERENCE,
+            event_listeners=[CommandMetricsListener(), PoolMetricsListener()] if MONGO_MONITORING else [],
+            **write_concern,
+        )
+        # Fail fast if the server is unreachable and open the first connection,
+        # the pool then fills up to `minPoolSize` in the background
+        await cls.ping()
+
+    @classmethod
+    async def ping(cls) -> float:
+        """Ping the server, returns the round trip time in seconds"""
+        if cls.client is None:
+            raise Exception("Database not connected")
+        start = time.perf_counter()
+        await cls.client.admin.command("ping")
+        return time.perf_counter() - start
         
     @classmethod
     async def close_db(cls):
@@ -18,4 +85,40 @@ class Database:
     def get_db(cls):
         if cls.client is None:
             raise Exception("Database not connected")
-        return cls.client[DB_NAME]
\ No newline at end of file
+        return cls.client[DB_NAME]
+
+    @classmethod
+    async def ensure_indexes(cls, models: Iterable[Type["MongoBase"]]):
+        """
+        Create the declared indexes of every model, safe to run on every startup.
+        An index that can't be built (e.g. a unique index over duplicated documents) is logged and skipped,
+        the other indexes of the model are still created.
+        """
+        db = cls.get_db()
+        for model in models:
+            try:
+                await model.ensure_indexes(db)
+            except OperationFailure:
+                # The indexes of a model are built together: retry them one by one to find the failing ones
+                collection = db[model.get_collection_name()]
+                for index in model.indexes:
+                    try:
+                        await collection.create_indexes([index])
+                    except OperationFailure as e:
+                        logger.error("Couldn't create the index %s of %s: %s", index.document["name"], model.get_collection_name(), e)
+
+    @classmethod
+    async def run_transaction(cls, callback: Callable[[Optional[AsyncClientSession]], Awaitable[T]]) -> T:
+        """
+        Run `callback(session)` in a transaction, committed when it returns and aborted when it raises. Transient
+        errors (e.g. a write conflict with a concurrent transaction) run the whole callback again, until the driver's
+        retry time limit: the callback must only write through the session and let those errors through, see
+        `is_transient_transaction_error`.
+        Calls `callback(None)` when transactions are disabled.
+        """
+        if not cls.use_transactions:
+            return await callback(None)
+        if cls.client is None:
+            raise Exception("Database not connected")
+        async with cls.client.start_session() as session:
+            return await session.with_transaction(callback)
@@ -1,3 +1,122 @@
-"""Database constants"""
+"""Settings, read from the environment"""
+import os
+from typing import Optional
 
-DB_NAME = "medapp" 
\ No newline at end of file
+def env_flag(name: str, default: Optional[bool]) -> Optional[bool]:
+    """Boolean setting: "1", "true" or "yes" (any case) is true, any other value false, `default` when unset"""
+    value = os.getenv(name)
+    return value.lower() in ("1", "true", "yes") if value else default
+
+# --- Database ---
+
+DB_NAME = os.getenv("MONGO_DB_NAME", "medapp")
+
+# MongoDB connection and pool settings, timeouts are in milliseconds
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# "majority" or a number of nodes, the server's default write concern is used when unset
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN")
+MONGO_JOURNAL = env_flag("MONGO_JOURNAL", None)
+MONGO_MONITORING = env_flag("MONGO_MONITORING", True)
+
+# Run multi-document writes (e.g. booking a slot and inserting the appointment) inside a
+# Mongo transaction. Requires a replica set or sharded cluster.
+USE_TRANSACTIONS = env_flag("MEDAPP_USE_TRANSACTIONS", False)
+
+# Documents read from the database are trusted and hydrated without validation. Turn this on while
+# debugging to validate them like any other input (much slower on large listings).
+VALIDATE_DB_READS = env_flag("MEDAPP_VALIDATE_DB_READS", False)
+
+# --- API server ---
+
+# Settings used when running `python main.py`. Every worker is a separate process with its own Mongo
+# client (and pool of MONGO_MAX_POOL_SIZE connections) and its own in-process caches.
+API_HOST = os.getenv("MEDAPP_API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("MEDAPP_API_PORT", "8000"))
+API_WORKERS = int(os.getenv("MEDAPP_API_WORKERS", "1"))
+
+# Slot listings are serialized straight to JSON by pydantic-core from the already valid response models,
+# instead of FastAPI validating them again against `response_model` and going through `jsonable_encoder`.
+# The OpenAPI schema is the same either way.
+FAST_JSON_RESPONSES = env_flag("MEDAPP_FAST_JSON_RESPONSES", True)
+
+# --- Slots and appointments ---
+
+# How free slots are found: "materialized" queries the stored slots, "lazy" computes them from each
+# professional's schedule minus the booked slots, which are the only ones stored (when they're booked).
+SLOT_MODE = os.getenv("MEDAPP_SLOT_MODE", "materialized")
+# In lazy mode, how far ahead slots are computed when a listing has no end date
+LAZY_SLOTS_HORIZON_DAYS = int(os.getenv("MEDAPP_LAZY_SLOTS_HORIZON_DAYS", "90"))
+
+# Slot listing page size: default when no `limit` is given and server-side cap for any `limit`.
+# Keep them small, the MCP tools feed every slot they return to the LLM.
+SLOTS_PAGE_SIZE = int(os.getenv("MEDAPP_SLOTS_PAGE_SIZE", "20"))
+MAX_SLOTS_PAGE_SIZE = int(os.getenv("MEDAPP_MAX_SLOTS_PAGE_SIZE", "100"))
+
+# Slot `start_time`/`end_time` used to be stored as ISO strings. While `scripts/migrate_slot_times.py`
+# hasn't run to completion, queries match both the legacy strings and native dates.
+SLOT_TIMES_DUAL_READ = env_flag("MEDAPP_SLOT_TIMES_DUAL_READ", False)
+# IANA timezone the legacy strings were written in, they hold the naive local time of the server that wrote them.
+# Required with MEDAPP_SLOT_TIMES_DUAL_READ.
+SLOT_TIMES_LEGACY_TIMEZONE = os.getenv("MEDAPP_SLOT_TIMES_LEGACY_TIMEZONE")
+
+# How long a slot stays held for a patient (e.g. while they confirm it) before it's offered to others again, in seconds
+SLOT_HOLD_TTL = float(os.getenv("MEDAPP_SLOT_HOLD_TTL", "300"))
+# Active holds a patient may have, holding one more slot releases their oldest hold
+MAX_SLOT_HOLDS_PER_PATIENT = int(os.getenv("MEDAPP_MAX_SLOT_HOLDS_PER_PATIENT", "1"))
+
+# Maximum number of appointments of a `POST /appointments/batch` request
+MAX_APPOINTMENTS_BATCH_SIZE = int(os.getenv("MEDAPP_MAX_APPOINTMENTS_BATCH_SIZE", "500"))
+
+# --- Caches ---
+
+# In-process cache of professionals, by id and by specialization. Entries are invalidated on `save`/`delete`;
+# with several API workers enable the change stream watcher (requires a replica set) to keep them coherent.
+PROFESSIONAL_CACHE_SIZE = int(os.getenv("MEDAPP_PROFESSIONAL_CACHE_SIZE", "1024"))
+PROFESSIONAL_CACHE_TTL = float(os.getenv("MEDAPP_PROFESSIONAL_CACHE_TTL", "300"))
+PROFESSIONAL_CACHE_WATCH = env_flag("MEDAPP_PROFESSIONAL_CACHE_WATCH", False)
+
+# Cache of the free slots of each specialization per day, invalidated by bookings and slot writes.
+# The in-memory backend is per process: with several API workers use the Redis backend, otherwise
+# a worker may offer a slot booked through another one until the entry expires.
+AVAILABILITY_CACHE_ENABLED = env_flag("MEDAPP_AVAILABILITY_CACHE_ENABLED", True)
+AVAILABILITY_CACHE_BACKEND = os.getenv("MEDAPP_AVAILABILITY_CACHE_BACKEND", "memory")  # "memory" or "redis"
+AVAILABILITY_CACHE_REDIS_URL = os.getenv("MEDAPP_AVAILABILITY_CACHE_REDIS_URL", "redis://localhost:6379/0")
+AVAILABILITY_CACHE_SIZE = int(os.getenv("MEDAPP_AVAILABILITY_CACHE_SIZE", "10000"))
+AVAILABILITY_CACHE_TTL = float(os.getenv("MEDAPP_AVAILABILITY_CACHE_TTL", "60"))
+
+# Free and total slots per professional and UTC day, kept up to date by bookings and slot writes. The API can
+# also rebuild the next MEDAPP_AVAILABILITY_SUMMARY_DAYS days on startup and every
+# MEDAPP_AVAILABILITY_SUMMARY_REBUILD_INTERVAL seconds to fix any drift (0 disables it, e.g. when
+# `scripts/rebuild_availability_summary.py` runs from cron). It's on by default in lazy mode, where nothing else
+# creates the summaries of the days entering the window.
+AVAILABILITY_SUMMARY_DAYS = int(os.getenv("MEDAPP_AVAILABILITY_SUMMARY_DAYS", "90"))
+AVAILABILITY_SUMMARY_REBUILD_INTERVAL = float(os.getenv("MEDAPP_AVAILABILITY_SUMMARY_REBUILD_INTERVAL", "3600" if SLOT_MODE == "lazy" else "0"))
+
+# --- Monitoring ---
+
+# Request tracing: spans and Mongo totals (queries, time, documents, hydration and serialization time) per request.
+# The last traces are served as OTLP JSON on `GET /traces`; with MEDAPP_TRACING_OTEL they're also exported
+# through the OpenTelemetry SDK when it's installed.
+TRACING_ENABLED = env_flag("MEDAPP_TRACING_ENABLED", True)
+TRACING_OTEL = env_flag("MEDAPP_TRACING_OTEL", False)
+TRACING_BUFFER_SIZE = int(os.getenv("MEDAPP_TRACING_BUFFER_SIZE", "100"))
+TRACING_MAX_SPANS = int(os.getenv("MEDAPP_TRACING_MAX_SPANS", "200"))
+# Mongo commands at least this slow are logged with their (redacted) query, in milliseconds, 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("MEDAPP_SLOW_QUERY_MS", "100"))
+
+# --- MCP sessions ---
+
+# Where MCP SSE sessions live. With "memory" a session only works on the worker that opened it: run one worker
+# per node and route each client to the same node (e.g. cookie based sticky sessions). With "redis" any
+# worker accepts a session's messages and forwards them to its owner.
+MCP_SESSION_STORE = os.getenv("MEDAPP_MCP_SESSION_STORE", "memory")  # "memory" or "redis"
+MCP_SESSION_REDIS_URL = os.getenv("MEDAPP_MCP_SESSION_REDIS_URL", "redis://localhost:6379/0")
+MCP_SESSION_TTL = float(os.getenv("MEDAPP_MCP_SESSION_TTL", "300"))
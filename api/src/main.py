@@ -1,87 +1,232 @@
-from fastapi_mcp import FastApiMCP
+import asyncio
+import logging
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from config import Database
-from models import Professional, Slot, Patient, Appointment
-from fastapi import HTTPException
+from availability import iter_specialization_slots, find_specialization_slots, find_next_specialization_slots, unavailable_slot_counts
+from availability import iter_professional_slots, find_professional_slots, claim_slot, claim_slots, get_slots, get_free_slot
+from cache import availability_cache
+from config import Database, is_transient_transaction_error
+from mcp_sessions import mcp_session_relay, McpSessionMiddleware, RelayedFastApiMCP
+from monitoring import registry, TracingMiddleware, TracedRoute, otlp_traces
+from models import Professional, Slot, Patient, Appointment, AvailabilitySummary, SlotHold
+from fastapi import HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 from typing import List, Optional
 from bson.objectid import ObjectId
-from datetime import datetime, timedelta
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.errors import PyMongoError
+from datetime import date, datetime, timedelta
 from models.specializations import MedicalSpecialization
+from models.datetime_utils import to_utc, utc_now
 
-from responses import SlotResponse, PatientResponse, CreateAppointmentDto, AppointmentResponse
+from constants import SLOTS_PAGE_SIZE, MAX_SLOTS_PAGE_SIZE, PROFESSIONAL_CACHE_WATCH, FAST_JSON_RESPONSES
+from constants import API_HOST, API_PORT, API_WORKERS, AVAILABILITY_CACHE_ENABLED, AVAILABILITY_CACHE_BACKEND
+from constants import AVAILABILITY_SUMMARY_DAYS, AVAILABILITY_SUMMARY_REBUILD_INTERVAL, SLOT_HOLD_TTL, MAX_SLOT_HOLDS_PER_PATIENT
+from responses import SlotResponse, PatientResponse, CreateAppointmentDto, AppointmentResponse, DayAvailabilityResponse, Page, encode_cursor, decode_cursor
+from responses import HoldSlotDto, SlotHoldResponse, CreateAppointmentsBatchDto, AppointmentBatchItemResponse
+from responses import NDJSON_MEDIA_TYPE, accepts_ndjson, ndjson_response, json_response
+
+logger = logging.getLogger(__name__)
+
+async def rebuild_availability_summary_periodically(interval: float):
+    """Rebuild the availability summary of the next days now and every `interval` seconds, see AVAILABILITY_SUMMARY_REBUILD_INTERVAL"""
+    while True:
+        start = utc_now().date()
+        try:
+            await AvailabilitySummary.rebuild(Database.get_db(), start, start + timedelta(days=AVAILABILITY_SUMMARY_DAYS - 1))
+        except Exception:
+            logger.exception("Availability summary rebuild failed")
+        await asyncio.sleep(interval)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Runs in every worker process: each one gets its own client, created after the fork
     await Database.connect_db()
+    await Database.ensure_indexes([Patient, Professional, Slot, Appointment, AvailabilitySummary, SlotHold])
+    watcher = asyncio.create_task(Professional.watch_changes(Database.get_db())) if PROFESSIONAL_CACHE_WATCH else None
+    rebuilder = (
+        asyncio.create_task(rebuild_availability_summary_periodically(AVAILABILITY_SUMMARY_REBUILD_INTERVAL))
+        if AVAILABILITY_SUMMARY_REBUILD_INTERVAL > 0 else None
+    )
+    if mcp_session_relay:
+        await mcp_session_relay.start(app)
     yield
+    if mcp_session_relay:
+        await mcp_session_relay.stop()
+    if watcher:
+        watcher.cancel()
+    if rebuilder:
+        rebuilder.cancel()
+    await availability_cache.close()
     await Database.close_db()
 
 app = FastAPI(lifespan=lifespan)
+app.router.route_class = TracedRoute
+app.add_middleware(TracingMiddleware)
+if mcp_session_relay:
+    app.add_middleware(McpSessionMiddleware, relay=mcp_session_relay)
+
+def page_limit(limit: Optional[int]) -> int:
+    """Apply the default page size and the server-side cap to a requested `limit`"""
+    return min(limit or SLOTS_PAGE_SIZE, MAX_SLOTS_PAGE_SIZE)
+
+def page_after(cursor: Optional[str]) -> Optional[tuple[datetime, ObjectId]]:
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@app.get("/slots/specialization/{specialization}", response_model=List[SlotResponse], operation_id="get_time_slots_by_specialization")
+# Slot listings stream every matching slot as NDJSON, in constant memory, when requested with `Accept: application/x-ndjson`.
+# In that mode `limit` is only applied when given and isn't capped.
+STREAMING_RESPONSES = {200: {"content": {NDJSON_MEDIA_TYPE: {}}}}
+
+@app.get("/slots/specialization/{specialization}", response_model=Page[SlotResponse], operation_id="get_time_slots_by_specialization", responses=STREAMING_RESPONSES)
 async def get_specialization_slots(
+    request: Request,
     specialization: MedicalSpecialization,
-    start: datetime = datetime.now(),
-    end: datetime = (datetime.now() + timedelta(days=30)), 
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = Query(default=None, ge=1, description=f"Maximum number of slots to return, defaults to {SLOTS_PAGE_SIZE} and is capped at {MAX_SLOTS_PAGE_SIZE}"),
+    cursor: Optional[str] = Query(default=None, description="The `next_cursor` of the previous page"),
 ):
     """
-    Get all slots for a given specialization.
-    By default, it will return all slots available for the next 30 days.
+    Get the available slots for a given specialization, sorted by start time.
+    By default, it will return the first slots available for the next 30 days,
+    use `next_cursor` to get the following ones.
     """
+    start = start or utc_now()
+    end = end or (utc_now() + timedelta(days=30))
     
-    if start > end:
+    if to_utc(start) > to_utc(end):
         raise HTTPException(status_code=400, detail="Start date cannot exceed end date")
 
     db = Database.get_db()
-    professionals = await Professional.get_many_by_query(db, {
-        "specialization": specialization.value
-    })
-    if not professionals:
+    if accepts_ndjson(request):
+        professionals = {}
+        return ndjson_response(
+            SlotResponse.create(slot, professional, professionals)
+            async for slot, professional in iter_specialization_slots(db, specialization, start, end, limit=limit, after=page_after(cursor))
+        )
+
+    limit = page_limit(limit)
+    after = page_after(cursor)
+    if availability_cache.enabled:
+        slots = await find_cached_specialization_slots(db, specialization, start, end, after, limit + 1)
+    else:
+        # Fetch one extra slot to know whether there is a next page
+        slots = SlotResponse.create_many(await find_specialization_slots(db, specialization, start, end, limit=limit + 1, after=after))
+    if not slots and not cursor and not await Professional.get_cached_by_specialization(db, specialization):
         raise HTTPException(status_code=404, detail="No professionals found for this specialization")
 
-    professionals_dict = {str(professional.id): professional for professional in professionals}
+    slots, has_more = slots[:limit], len(slots) > limit
+    page = Page[SlotResponse].model_construct(
+        items=slots,
+        next_cursor=encode_cursor(slots[-1].start_time, slots[-1].id) if has_more else None,
+    )
+    return json_response(page) if FAST_JSON_RESPONSES else page
 
-    slots = await Slot.get_many_by_query(db, {
-        "professional_id": {
-            "$in": [ObjectId(professional.id) for professional in professionals]
-        },
-        "start_time": {
-            "$gte": start.isoformat(),
-            "$lte": end.isoformat()
-        },
-        "is_booked": False
-    }, sort=[("start_time", 1)])
+async def find_cached_specialization_slots(
+    db,
+    specialization: MedicalSpecialization,
+    start: datetime,
+    end: datetime,
+    after: Optional[tuple[datetime, ObjectId]],
+    limit: int,
+) -> List[SlotResponse]:
+    """
+    The first `limit` free slots of the specialization in [start, end] after the cursor, through the availability cache.
+    Holds come and go faster than the cache is invalidated: they're cached with the free slots and left out on each read.
+    """
+    async def load(range_start: datetime, range_end: datetime) -> List[SlotResponse]:
+        return SlotResponse.create_many(await find_specialization_slots(db, specialization, range_start, range_end, exclude_held=False))
+
+    start = max(to_utc(start), to_utc(after[0])) if after else to_utc(start)
+    held = {str(slot_id) for slot_id in await SlotHold.held_slot_ids(db, start, end, specialization=specialization)}
+    after_key = (to_utc(after[0]), str(after[1])) if after else None
+    return await availability_cache.get_slots(
+        specialization.value,
+        start,
+        to_utc(end),
+        load,
+        SlotResponse,
+        limit=limit,
+        keep=lambda slot: slot.id not in held and (not after_key or (slot.start_time, slot.id) > after_key),
+    )
+
+
+
+@app.get("/slots/specialization/{specialization}/next", response_model=List[SlotResponse], operation_id="get_next_available_slots")
+async def get_next_specialization_slots(
+    specialization: MedicalSpecialization,
+    start: Optional[datetime] = Query(default=None, description="Only slots starting at or after this time, defaults to now"),
+    end: Optional[datetime] = Query(default=None, description="Only slots starting before this time"),
+    count: int = Query(default=3, ge=1, le=MAX_SLOTS_PAGE_SIZE, description="Number of slots to return"),
+    per_professional: Optional[int] = Query(default=None, ge=1, description="Maximum number of slots of the same professional"),
+):
+    """
+    Get the earliest available slots for a given specialization, sorted by start time.
+    Use it to suggest the next available slots, e.g. when none is free in the time frame the patient asked for.
+    """
+    start = start or utc_now()
+    if end and to_utc(start) > to_utc(end):
+        raise HTTPException(status_code=400, detail="Start date cannot exceed end date")
 
-    return [SlotResponse.create(slot, professionals_dict[str(slot.professional_id)]) for slot in slots]
+    db = Database.get_db()
+    slots = SlotResponse.create_many(await find_next_specialization_slots(db, specialization, start, count, per_professional, end))
+    if not slots and not await Professional.get_cached_by_specialization(db, specialization):
+        raise HTTPException(status_code=404, detail="No professionals found for this specialization")
+    return json_response(slots, List[SlotResponse]) if FAST_JSON_RESPONSES else slots
 
+@app.get("/availability/specialization/{specialization}", response_model=List[DayAvailabilityResponse], operation_id="get_availability_by_day")
+async def get_specialization_availability(
+    specialization: MedicalSpecialization,
+    start: Optional[date] = Query(default=None, description="First UTC day, defaults to today"),
+    end: Optional[date] = Query(default=None, description="Last UTC day, defaults to 30 days after the first one"),
+):
+    """
+    Get the number of free slots and of professionals with free slots of a specialization per day.
+    Days without any free slot are left out. Use it to find the days with availability before listing their slots.
+    """
+    start = start or utc_now().date()
+    end = end or (start + timedelta(days=30))
+    if start > end:
+        raise HTTPException(status_code=400, detail="Start date cannot exceed end date")
 
+    # Reads one precomputed summary per professional and day, and only the holds and today's past slots
+    db = Database.get_db()
+    unavailable = await unavailable_slot_counts(db, specialization, start, end)
+    days = [DayAvailabilityResponse.create(document) for document in await AvailabilitySummary.by_day(db, specialization, start, end, unavailable)]
+    return json_response(days, List[DayAvailabilityResponse]) if FAST_JSON_RESPONSES else days
 
-@app.get("/professionals/{professional_id}/slots", response_model=List[Slot], operation_id="get_time_slots")
+@app.get("/professionals/{professional_id}/slots", response_model=Page[Slot], operation_id="get_time_slots", responses=STREAMING_RESPONSES)
 async def get_professional_slots(
+    request: Request,
     professional_id: str,
-    end: Optional[str] = None, 
-    start: Optional[str] = None,
+    end: Optional[datetime] = None, 
+    start: Optional[datetime] = None,
+    limit: Optional[int] = Query(default=None, ge=1, description=f"Maximum number of slots to return, defaults to {SLOTS_PAGE_SIZE} and is capped at {MAX_SLOTS_PAGE_SIZE}"),
+    cursor: Optional[str] = Query(default=None, description="The `next_cursor` of the previous page"),
 ):
     db = Database.get_db()
-    professional = await Professional.get_by_id(db, professional_id)
+    professional = await Professional.get_cached_by_id(db, professional_id)
     if not professional:
         raise HTTPException(status_code=404, detail="Professional not found")
-    
-    
-    start = datetime.now().isoformat() if not start else start
-    time_filter = { "$gte": start }
-    if end:
-        time_filter["$lte"] = end
 
-    slots = await Slot.get_many_by_query(db, {
-        "professional_id": ObjectId(professional_id),
-        "start_time": time_filter,
-        "is_booked": False
-    }, sort=[("start_time", 1)])
+    if accepts_ndjson(request):
+        return ndjson_response(iter_professional_slots(db, professional, start or utc_now(), end, limit=limit, after=page_after(cursor)))
 
-    return slots
+    limit = page_limit(limit)
+    slots = await find_professional_slots(db, professional, start or utc_now(), end, limit=limit + 1, after=page_after(cursor))
+
+    slots, has_more = slots[:limit], len(slots) > limit
+    page = Page[Slot].model_construct(
+        items=slots,
+        next_cursor=encode_cursor(slots[-1].start_time, slots[-1].id) if has_more else None,
+    )
+    return json_response(page) if FAST_JSON_RESPONSES else page
 
 @app.get("/patients/{national_id}", response_model=PatientResponse, operation_id="get_patient_by_national_id")
 async def get_patient_by_national_id(national_id: str):
@@ -96,50 +241,272 @@ async def get_patient_by_national_id(national_id: str):
     
     return PatientResponse.create(patient)
 
-@app.post("/appointments", response_model=AppointmentResponse, operation_id="create_appointment")
-async def create_appointment(appointment: CreateAppointmentDto):
+@app.post("/slots/{slot_id}/hold", response_model=SlotHoldResponse, operation_id="hold_slot")
+async def hold_slot(slot_id: str, hold: HoldSlotDto):
     """
-    Create a new appointment.
+    Hold a free slot for a patient for a few minutes, e.g. while they confirm it.
+    Held slots aren't offered to anyone else and only that patient can book them, with `create_appointment`.
+    Holding it again extends the hold. A patient may hold a few slots at once (MEDAPP_MAX_SLOT_HOLDS_PER_PATIENT,
+    1 by default): beyond that, holding another slot releases their oldest hold.
     """
+    if not ObjectId.is_valid(slot_id):
+        raise HTTPException(status_code=404, detail="Slot not found")
     db = Database.get_db()
-    
-    patient = await Patient.get_by_id(db, appointment.patient_id)
+    slot, patient = await asyncio.gather(get_free_slot(db, slot_id), Patient.get_by_id(db, hold.patient_id))
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
-    
-    slot = await Slot.get_by_id(db, appointment.slot_id)
     if not slot:
-        raise HTTPException(status_code=404, detail="Slot not found")
-    
-    if slot.is_booked:
+        existing_slot = await Slot.get_by_id(db, slot_id)
+        if not existing_slot:
+            raise HTTPException(status_code=404, detail="Slot not found")
+        if existing_slot.is_booked:
+            raise HTTPException(status_code=400, detail="Slot is already booked")
+        raise HTTPException(status_code=400, detail="Slot is in the past")
+
+    slot_hold = await SlotHold.place(db, slot, hold.patient_id, SLOT_HOLD_TTL, MAX_SLOT_HOLDS_PER_PATIENT)
+    if not slot_hold:
+        raise HTTPException(status_code=400, detail="Slot is held for another patient")
+    return SlotHoldResponse.create(slot_hold)
+
+@app.delete("/slots/{slot_id}/hold", operation_id="release_slot_hold")
+async def release_slot_hold(slot_id: str, patient_id: str):
+    """
+    Release a patient's hold on a slot, e.g. when they choose another one.
+    """
+    if not ObjectId.is_valid(slot_id) or not ObjectId.is_valid(patient_id):
+        raise HTTPException(status_code=404, detail="Hold not found")
+    if not await SlotHold.release(Database.get_db(), slot_id, patient_id):
+        raise HTTPException(status_code=404, detail="Hold not found")
+    return {"released": True}
+
+@app.post("/appointments", response_model=AppointmentResponse, operation_id="create_appointment")
+async def create_appointment(appointment: CreateAppointmentDto):
+    """
+    Create a new appointment. A slot held by the patient is booked and its hold released.
+    """
+    db = Database.get_db()
+
+    async def book(session: Optional[AsyncClientSession]) -> Optional[tuple[Slot, Appointment]]:
+        """Run once per attempt of the transaction, None if the slot can't be claimed"""
+        # Holds are enforced here rather than in the claim: the claim stays the only atomic check against double
+        # bookings. The hold is read in the transaction, from the same snapshot as the claim.
+        hold = await SlotHold.get_active(db, appointment.slot_id, session=session)
+        if hold and str(hold.patient_id) != str(appointment.patient_id):
+            raise HTTPException(status_code=400, detail="Slot is held for another patient")
+
+        # Claim the slot first: the availability check and the booking are a single atomic write,
+        # so concurrent requests for the same slot can't both succeed.
+        slot = await claim_slot(db, appointment.slot_id, session=session)
+        if not slot:
+            return None
+
+        try:
+            patient, professional = await asyncio.gather(
+                Patient.get_by_id(db, appointment.patient_id),
+                Professional.get_cached_by_id(db, slot.professional_id),
+            )
+            if not patient:
+                raise HTTPException(status_code=404, detail="Patient not found")
+            if not professional:
+                raise HTTPException(status_code=404, detail="Professional not found")
+
+            new_appointment = Appointment.book(patient, slot, professional)
+            await new_appointment.save(db, session=session)
+            if hold:
+                await SlotHold.release(db, appointment.slot_id, appointment.patient_id, session=session)
+        except Exception as e:
+            # Inside a transaction the claim is rolled back on abort, otherwise undo it by hand
+            if session is None:
+                await Slot.release(db, appointment.slot_id)
+            if isinstance(e, HTTPException) or is_transient_transaction_error(e):
+                raise
+            raise HTTPException(status_code=500, detail=str(e))
+        return slot, new_appointment
+
+    try:
+        booked = await Database.run_transaction(book)
+    except PyMongoError as e:
+        if not is_transient_transaction_error(e):
+            raise
+        # Concurrent bookings of the slot kept winning the write conflicts until the retries ran out
         raise HTTPException(status_code=400, detail="Slot is already booked")
-    
-    if slot.start_time < datetime.now():
+
+    if not booked:
+        # Read outside of the transaction, it's over
+        existing_slot = await Slot.get_by_id(db, appointment.slot_id)
+        if not existing_slot:
+            raise HTTPException(status_code=404, detail="Slot not found")
+        if existing_slot.is_booked:
+            raise HTTPException(status_code=400, detail="Slot is already booked")
         raise HTTPException(status_code=400, detail="Slot is in the past")
 
-    professional = await Professional.get_by_id(db, slot.professional_id)
-    if not professional:
-        raise HTTPException(status_code=404, detail="Professional not found")
+    slot, new_appointment = booked
+    # With transactions the claim was only visible to other requests once the transaction committed
+    await slot.invalidate_availability()
+    return AppointmentResponse.create(new_appointment)
 
-    new_appointment = Appointment(
-        patient_id=appointment.patient_id,
-        slot_id=appointment.slot_id
+@app.post("/appointments/batch", response_model=List[AppointmentBatchItemResponse], operation_id="create_appointments_batch")
+async def create_appointments_batch(batch: CreateAppointmentsBatchDto):
+    """
+    Create many appointments at once, e.g. to rebook a cancelled day.
+    Each appointment succeeds or fails on its own: the results are in the order of the request, with the
+    status and error `create_appointment` would have answered.
+    """
+    db = Database.get_db()
+    items = batch.appointments
+    results: List[Optional[AppointmentBatchItemResponse]] = [None] * len(items)
+
+    # A few `$in` reads for the whole batch instead of several reads per appointment
+    slot_ids = list({ObjectId(item.slot_id) for item in items})
+    patients, slots, holds = await asyncio.gather(
+        Patient.get_many_by_query(db, {"_id": {"$in": list({ObjectId(item.patient_id) for item in items})}}),
+        get_slots(db, slot_ids),
+        SlotHold.get_active_many(db, slot_ids),
     )
+    patients = {patient.id: patient for patient in patients}
+    holds = {hold.id: hold for hold in holds}
+    professional_ids = list({slot.professional_id for slot in slots.values()})
+    professionals = dict(zip(professional_ids, await asyncio.gather(*[Professional.get_cached_by_id(db, id) for id in professional_ids])))
+
+    now = utc_now()
+    # Slot ID -> index of the appointment booking it
+    to_claim: dict[ObjectId, int] = {}
+    for index, item in enumerate(items):
+        slot_id = ObjectId(item.slot_id)
+        slot, hold = slots.get(slot_id), holds.get(slot_id)
+        if hold and hold.patient_id != ObjectId(item.patient_id):
+            error = (400, "Slot is held for another patient")
+        elif not slot:
+            error = (404, "Slot not found")
+        elif slot.is_booked or slot_id in to_claim:
+            error = (400, "Slot is already booked")
+        elif slot.start_time <= now:
+            error = (400, "Slot is in the past")
+        elif ObjectId(item.patient_id) not in patients:
+            error = (404, "Patient not found")
+        elif not professionals.get(slot.professional_id):
+            error = (404, "Professional not found")
+        else:
+            to_claim[slot_id] = index
+            continue
+        results[index] = AppointmentBatchItemResponse.failure(item, *error)
 
-    slot.is_booked = True
-    await slot.save(db)
+    async def book(session: Optional[AsyncClientSession]) -> tuple[List[Slot], List[Appointment]]:
+        """Run once per attempt of the transaction"""
+        # One bulk write of conditional updates: concurrent requests can still win some of the slots
+        claimed = await claim_slots(db, [slots[slot_id] for slot_id in to_claim], session=session)
+        appointments = [
+            Appointment.book(patients[ObjectId(items[to_claim[slot.id]].patient_id)], slot, professionals[slot.professional_id])
+            for slot in claimed
+        ]
+        try:
+            if appointments:
+                await Appointment.insert_many(db, appointments, session=session)
+                await SlotHold.release_many(db, [slot.id for slot in claimed if slot.id in holds], session=session)
+        except Exception as e:
+            # Inside a transaction the claims are rolled back on abort, otherwise undo them by hand
+            if session is None:
+                await asyncio.gather(*[Slot.release(db, slot.id) for slot in claimed])
+            if is_transient_transaction_error(e):
+                raise
+            raise HTTPException(status_code=500, detail=str(e))
+        return claimed, appointments
 
     try:
-        await new_appointment.save(db)
+        claimed, appointments = await Database.run_transaction(book)
+    except PyMongoError as e:
+        if not is_transient_transaction_error(e):
+            raise
+        # Concurrent bookings kept winning the write conflicts until the retries ran out
+        claimed, appointments = [], []
+
+    claimed_ids = {slot.id for slot in claimed}
+    for slot_id, index in to_claim.items():
+        if slot_id not in claimed_ids:
+            results[index] = AppointmentBatchItemResponse.failure(items[index], 400, "Slot is already booked")
+    # With transactions the claims were only visible to other requests once the transaction committed
+    await Slot.invalidate_availability_many(claimed)
+
+    for slot, appointment in zip(claimed, appointments):
+        index = to_claim[slot.id]
+        results[index] = AppointmentBatchItemResponse.success(items[index], AppointmentResponse.create(appointment))
+    return results
+
+@app.get("/appointments/patient/{patient_id}", response_model=Page[AppointmentResponse], operation_id="get_patient_appointments")
+async def get_patient_appointments(
+    patient_id: str,
+    limit: Optional[int] = Query(default=None, ge=1, description=f"Maximum number of appointments to return, defaults to {SLOTS_PAGE_SIZE} and is capped at {MAX_SLOTS_PAGE_SIZE}"),
+    cursor: Optional[str] = Query(default=None, description="The `next_cursor` of the previous page"),
+):
+    """
+    Get a patient's upcoming appointments, sorted by start time.
+    """
+    if not ObjectId.is_valid(patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return await upcoming_appointments_page({"patient_id": ObjectId(patient_id)}, limit, cursor)
+
+@app.get("/appointments/professional/{professional_id}", response_model=Page[AppointmentResponse], operation_id="get_professional_appointments")
+async def get_professional_appointments(
+    professional_id: str,
+    limit: Optional[int] = Query(default=None, ge=1, description=f"Maximum number of appointments to return, defaults to {SLOTS_PAGE_SIZE} and is capped at {MAX_SLOTS_PAGE_SIZE}"),
+    cursor: Optional[str] = Query(default=None, description="The `next_cursor` of the previous page"),
+):
+    """
+    Get a professional's upcoming appointments, sorted by start time.
+    """
+    if not ObjectId.is_valid(professional_id):
+        raise HTTPException(status_code=404, detail="Professional not found")
+    return await upcoming_appointments_page({"professional.id": ObjectId(professional_id)}, limit, cursor)
+
+async def upcoming_appointments_page(query: dict, limit: Optional[int], cursor: Optional[str]):
+    """
+    A page of upcoming appointments in a single indexed query: every appointment embeds the patient, slot and
+    professional snapshots its response needs.
+    """
+    limit = page_limit(limit)
+    appointments = await Appointment.find_upcoming(Database.get_db(), query, limit=limit + 1, after=page_after(cursor))
+
+    appointments, has_more = appointments[:limit], len(appointments) > limit
+    page = Page[AppointmentResponse].model_construct(
+        items=[AppointmentResponse.create(appointment) for appointment in appointments],
+        next_cursor=encode_cursor(appointments[-1].slot.start_time, appointments[-1].id) if has_more else None,
+    )
+    return json_response(page) if FAST_JSON_RESPONSES else page
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    """Liveness of the API and its database connection"""
+    try:
+        latency = await Database.ping()
     except Exception as e:
-        slot.is_booked = False
-        await slot.save(db)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+    return {"status": "ok", "database_ping_ms": latency * 1000}
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: Mongo connection pool and command latencies"""
+    return registry.render()
+
+@app.get("/traces", include_in_schema=False)
+async def get_traces():
+    """The last requests' spans, as OTLP JSON"""
+    return otlp_traces()
 
-    return AppointmentResponse.create(new_appointment, patient, slot, professional)
+@app.get("/metrics/cache", include_in_schema=False)
+async def get_cache_metrics():
+    """Hit/miss counters of the in-process caches"""
+    return [*Professional.cache_stats(), availability_cache.stats()]
 
-mcp = FastApiMCP(app, include_operations=["get_patient_by_national_id", "create_appointment", "get_time_slots_by_specialization"])
+mcp = RelayedFastApiMCP(app, relay=mcp_session_relay, include_operations=["get_patient_by_national_id", "create_appointment", "get_time_slots_by_specialization", "get_next_available_slots", "get_availability_by_day", "hold_slot", "release_slot_hold", "get_patient_appointments"])
 mcp.mount()
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if API_WORKERS > 1:
+        if not mcp_session_relay:
+            logger.warning("Running %d workers with in-memory MCP sessions: MCP clients may hit a worker that doesn't know their session, set MEDAPP_MCP_SESSION_STORE=redis", API_WORKERS)
+        if AVAILABILITY_CACHE_ENABLED and AVAILABILITY_CACHE_BACKEND == "memory":
+            logger.warning("Running %d workers with the in-memory availability cache: a worker may offer a slot booked through another one until its entry expires", API_WORKERS)
+        if not PROFESSIONAL_CACHE_WATCH:
+            logger.warning("Running %d workers without MEDAPP_PROFESSIONAL_CACHE_WATCH: professional changes only reach the worker that made them until the cache expires", API_WORKERS)
+    # Workers need the app as an import string, each one imports it in its own process
+    uvicorn.run("main:app" if API_WORKERS > 1 else app, host=API_HOST, port=API_PORT, workers=API_WORKERS)
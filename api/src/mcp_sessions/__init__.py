@@ -0,0 +1,28 @@
+"""
+MCP sessions package: shares MCP SSE sessions between API workers
+"""
+from typing import Optional
+
+from constants import MCP_SESSION_STORE, MCP_SESSION_REDIS_URL, MCP_SESSION_TTL
+from .store import SessionStore, RedisSessionStore
+from .relay import McpSessionRelay, McpSessionMiddleware
+from .transport import RelayedSseTransport, RelayedFastApiMCP
+
+def create_relay(kind: str) -> Optional[McpSessionRelay]:
+    if kind == "redis":
+        return McpSessionRelay(RedisSessionStore(MCP_SESSION_REDIS_URL, MCP_SESSION_TTL))
+    if kind == "memory":
+        return None
+    raise ValueError(f"Unknown MCP session store: {kind}")
+
+mcp_session_relay = create_relay(MCP_SESSION_STORE)
+
+__all__ = [
+    "SessionStore",
+    "RedisSessionStore",
+    "McpSessionRelay",
+    "McpSessionMiddleware",
+    "RelayedSseTransport",
+    "RelayedFastApiMCP",
+    "mcp_session_relay",
+]
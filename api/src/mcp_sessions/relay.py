@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import secrets
+import socket
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+class McpSessionRelay:
+    """
+    Lets MCP SSE sessions work with several API workers or nodes.
+
+    A session's SSE stream is held in memory by the worker that accepted its `GET /mcp` connection, but the
+    client's `POST /mcp/messages/` may reach any worker. Workers register the sessions they own in the store
+    (see `RelayedSseTransport`), and forward the messages of sessions they don't own to the owner, which
+    handles them as local requests.
+    """
+
+    def __init__(self, store: SessionStore, messages_path: str = "/mcp/messages/"):
+        self.store = store
+        self.messages_path = messages_path
+        self.sessions: set[str] = set()
+        self.worker_id: Optional[str] = None
+        self._app: Optional[ASGIApp] = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self.worker_id is not None
+
+    async def start(self, app: ASGIApp):
+        """Start relaying to this worker, call it from the app's lifespan: the worker id includes the process id"""
+        self._app = app
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._tasks = [asyncio.create_task(self._receive_forwarded()), asyncio.create_task(self._heartbeat())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for session_id in list(self.sessions):
+            await self.store.unregister(session_id)
+        self.sessions.clear()
+        self.worker_id = None
+        await self.store.close()
+
+    async def register(self, session_id: str):
+        """Own a session opened on this worker until it's unregistered"""
+        if not self.running:
+            return
+        self.sessions.add(session_id)
+        await self.store.register(session_id, self.worker_id)
+
+    async def unregister(self, session_id: str):
+        if session_id in self.sessions:
+            self.sessions.discard(session_id)
+            await self.store.unregister(session_id)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.store.ttl / 3)
+            try:
+                if self.sessions:
+                    await self.store.refresh(list(self.sessions), self.worker_id)
+            except Exception:
+                logger.exception("Could not refresh the MCP sessions of worker %s", self.worker_id)
+
+    async def _receive_forwarded(self):
+        while True:
+            try:
+                async for message in self.store.subscribe(self.worker_id):
+                    await self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("MCP session relay subscription failed, resubscribing")
+                await asyncio.sleep(1)
+
+    async def _deliver(self, message: dict):
+        """Replay a forwarded message as a local `POST` to the messages endpoint"""
+        body = message["body"].encode()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": self.messages_path,
+            "raw_path": self.messages_path.encode(),
+            "root_path": "",
+            "query_string": message["query_string"].encode(),
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            "client": None,
+            "server": None,
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status = None
+
+        async def send(event):
+            nonlocal status
+            if event["type"] == "http.response.start":
+                status = event["status"]
+
+        await self._app(scope, receive, send)
+        if status is None or status >= 400:
+            logger.warning("Forwarded message for MCP session %s was rejected with status %s", message["session_id"], status)
+
+    async def forward(self, scope: Scope, receive: Receive, send: Send) -> bool:
+        """Forward a message to the worker owning its session, False if it must be handled locally"""
+        session_id = parse_qs(scope["query_string"].decode()).get("session_id", [None])[0]
+        if not session_id or session_id in self.sessions:
+            return False
+        owner = await self.store.owner(session_id)
+        if owner is None or owner == self.worker_id:
+            # Unknown sessions get the transport's usual 404
+            return False
+
+        body = b""
+        more_body = True
+        while more_body:
+            event = await receive()
+            body += event.get("body", b"")
+            more_body = event.get("more_body", False)
+        delivered = await self.store.publish(owner, {"session_id": session_id, "query_string": scope["query_string"].decode(), "body": body.decode()})
+        response = Response("Accepted", status_code=202) if delivered else Response("Could not find session", status_code=404)
+        await response(scope, receive, send)
+        return True
+
+class McpSessionMiddleware:
+    """ASGI middleware routing MCP SSE traffic through a `McpSessionRelay`"""
+
+    def __init__(self, app: ASGIApp, relay: McpSessionRelay):
+        self.app = app
+        self.relay = relay
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.relay.running:
+            return await self.app(scope, receive, send)
+        if scope["method"] == "POST" and scope["path"] == self.relay.messages_path and await self.relay.forward(scope, receive, send):
+            return
+        await self.app(scope, receive, send)
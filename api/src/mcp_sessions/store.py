@@ -0,0 +1,88 @@
+import json
+from typing import AsyncIterator, Iterable, Optional, Protocol
+
+class SessionStore(Protocol):
+    """
+    Which worker owns each MCP SSE session, and a channel per worker to forward messages to it.
+    Sessions expire after `ttl` seconds unless refreshed, so sessions of a dead worker don't linger.
+    """
+    ttl: float
+
+    async def register(self, session_id: str, worker_id: str):
+        ...
+
+    async def refresh(self, session_ids: Iterable[str], worker_id: str):
+        ...
+
+    async def unregister(self, session_id: str):
+        ...
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        ...
+
+    async def publish(self, worker_id: str, message: dict) -> int:
+        """Send a message to a worker, returns the number of subscribers that got it (0 if the worker is gone)"""
+        ...
+
+    def subscribe(self, worker_id: str) -> AsyncIterator[dict]:
+        """The messages sent to a worker"""
+        ...
+
+    async def close(self):
+        ...
+
+class RedisSessionStore:
+    """
+    Session store shared by every API worker, with a pub/sub channel per worker.
+    Requires the `redis` extra.
+    """
+
+    def __init__(self, url: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError("The Redis MCP session store requires the `redis` extra: poetry install --extras redis") from e
+        self._client = redis.from_url(url)
+        self.ttl = ttl
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f"medapp:mcp:session:{session_id}"
+
+    @staticmethod
+    def _channel(worker_id: str) -> str:
+        return f"medapp:mcp:worker:{worker_id}"
+
+    async def register(self, session_id: str, worker_id: str):
+        await self._client.set(self._session_key(session_id), worker_id, ex=int(self.ttl))
+
+    async def refresh(self, session_ids: Iterable[str], worker_id: str):
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for session_id in session_ids:
+                pipeline.set(self._session_key(session_id), worker_id, ex=int(self.ttl))
+            await pipeline.execute()
+
+    async def unregister(self, session_id: str):
+        await self._client.delete(self._session_key(session_id))
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        worker_id = await self._client.get(self._session_key(session_id))
+        return worker_id.decode() if worker_id is not None else None
+
+    async def publish(self, worker_id: str, message: dict) -> int:
+        """Send a message to a worker, returns the number of subscribers that got it (0 if the worker is gone)"""
+        return await self._client.publish(self._channel(worker_id), json.dumps(message))
+
+    async def subscribe(self, worker_id: str) -> AsyncIterator[dict]:
+        """The messages sent to a worker"""
+        pubsub = self._client.pubsub()
+        await pubsub.subscribe(self._channel(worker_id))
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield json.loads(message["data"])
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        await self._client.aclose()
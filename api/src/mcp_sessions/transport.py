@@ -0,0 +1,87 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+from uuid import UUID
+
+from fastapi_mcp import FastApiMCP
+from fastapi_mcp.transport.sse import FastApiSseTransport
+from starlette.types import Receive, Scope, Send
+
+from .relay import McpSessionRelay
+
+# Session ids the transport routes to the connection being opened, see `_SessionTable`
+_opened_sessions: ContextVar[Optional[list[UUID]]] = ContextVar("opened_mcp_sessions", default=None)
+
+def check_fastapi_mcp():
+    """
+    The relay hooks into private parts of fastapi-mcp (pinned in pyproject.toml), fail at startup
+    rather than on the first connection if an upgrade changed them
+    """
+    transport = FastApiSseTransport("/")
+    missing = [
+        name for owner, name in (
+            (FastApiMCP, "_register_mcp_endpoints_sse"),
+            (transport, "_read_stream_writers"),
+            (transport, "_endpoint"),
+        )
+        if not hasattr(owner, name)
+    ]
+    if missing:
+        raise RuntimeError(
+            f"The installed fastapi-mcp is not supported by the MCP session relay, missing: {', '.join(missing)}. "
+            "Install the version pinned in pyproject.toml or set MEDAPP_MCP_SESSION_STORE=memory"
+        )
+
+class _SessionTable(dict):
+    """The transport's session id -> stream table, noting the sessions added while a connection is being opened"""
+
+    def __setitem__(self, session_id: UUID, writer):
+        super().__setitem__(session_id, writer)
+        if (opened := _opened_sessions.get()) is not None:
+            opened.append(session_id)
+
+class RelayedSseTransport(FastApiSseTransport):
+    """
+    fastapi-mcp's SSE transport, registering each session in the relay for as long as its connection is open.
+    The session id is the one the transport routes messages with, not parsed out of the stream.
+    """
+
+    def __init__(self, endpoint: str, relay: McpSessionRelay):
+        super().__init__(endpoint)
+        self.relay = relay
+        self._read_stream_writers = _SessionTable()
+
+    @asynccontextmanager
+    async def connect_sse(self, scope: Scope, receive: Receive, send: Send):
+        opened: list[UUID] = []
+        token = _opened_sessions.set(opened)
+        try:
+            async with super().connect_sse(scope, receive, send) as streams:
+                _opened_sessions.reset(token)
+                token = None
+                session_id = opened[0]
+                await self.relay.register(session_id.hex)
+                try:
+                    yield streams
+                finally:
+                    await self.relay.unregister(session_id.hex)
+                    # The base transport never forgets its sessions
+                    self._read_stream_writers.pop(session_id, None)
+        finally:
+            if token is not None:
+                _opened_sessions.reset(token)
+
+class RelayedFastApiMCP(FastApiMCP):
+    """`FastApiMCP` whose SSE sessions work from any worker when given a relay"""
+
+    def __init__(self, *args, relay: Optional[McpSessionRelay] = None, **kwargs):
+        if relay:
+            check_fastapi_mcp()
+        super().__init__(*args, **kwargs)
+        self.relay = relay
+
+    def _register_mcp_endpoints_sse(self, router, transport: FastApiSseTransport, mount_path: str, dependencies):
+        if self.relay:
+            transport = RelayedSseTransport(transport._endpoint, self.relay)
+            self.relay.messages_path = transport._endpoint
+        super()._register_mcp_endpoints_sse(router, transport, mount_path, dependencies)
@@ -1,7 +1,10 @@
 from .patient import Patient
 from .professional import Professional
 from .specializations import MedicalSpecialization
+from .schedule import Schedule, WeeklyHours, TimeRange, ScheduleException
 from .slot import Slot
-from .appointment import Appointment
+from .appointment import Appointment, PatientSummary, SlotSummary, ProfessionalSummary
+from .availability_summary import AvailabilitySummary
+from .slot_hold import SlotHold
 
-__all__ = ["Patient", "Professional", "MedicalSpecialization", "Slot", "Appointment"] 
\ No newline at end of file
+__all__ = ["Patient", "Professional", "MedicalSpecialization", "Schedule", "WeeklyHours", "TimeRange", "ScheduleException", "Slot", "Appointment", "PatientSummary", "SlotSummary", "ProfessionalSummary", "AvailabilitySummary", "SlotHold"] 
\ No newline at end of file
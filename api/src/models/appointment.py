@@ -1,16 +1,51 @@
-
 from datetime import datetime
-from pydantic import Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional
+from bson.objectid import ObjectId
 from pydantic_extra_types.mongo_object_id import MongoObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.client_session import AsyncClientSession
 from pymongo.asynchronous.database import AsyncDatabase
 
+from .datetime_utils import to_utc, utc_now
 from .mongo_base import MongoBase
+from .patient import Patient
+from .professional import Professional
+from .slot import Slot
+from .specializations import MedicalSpecialization
+
+class ProfessionalSummary(BaseModel):
+    id: MongoObjectId = Field(..., description="The ID of the professional")
+    name: str = Field(..., description="The name of the professional")
+    specialization: MedicalSpecialization = Field(..., description="The specialization of the professional")
+
+class PatientSummary(BaseModel):
+    id: MongoObjectId = Field(..., description="The ID of the patient")
+    name: str = Field(..., description="The name of the patient")
+    national_id: str = Field(..., description="The national ID of the patient")
+
+class SlotSummary(BaseModel):
+    id: MongoObjectId = Field(..., description="The ID of the slot")
+    start_time: datetime = Field(..., description="The start time of the slot")
+    end_time: datetime = Field(..., description="The end time of the slot")
 
 class Appointment(MongoBase):
     patient_id: MongoObjectId = Field(..., description="ID of the patient associated with this appointment")
     slot_id: MongoObjectId = Field(..., description="ID of the slot associated with this appointment")
-    
+    # Snapshots of the patient, slot and professional taken at booking time, so an appointment is read without
+    # any lookup. Kept in sync by `Patient.save`, `Professional.save` and `Slot.save`, appointments booked before
+    # they existed are filled in by `scripts/backfill_appointment_summaries.py`.
+    patient: Optional[PatientSummary] = Field(default=None, description="The patient associated with this appointment")
+    slot: Optional[SlotSummary] = Field(default=None, description="The slot associated with this appointment")
+    professional: Optional[ProfessionalSummary] = Field(default=None, description="The professional associated with the slot")
+
+    indexes = [
+        # Upcoming appointments of a patient or a professional, sorted by start time, `_id` breaks ties for keyset pagination
+        IndexModel([("patient_id", ASCENDING), ("slot.start_time", ASCENDING), ("_id", ASCENDING)], name="patient_id_start_time_id"),
+        IndexModel([("professional.id", ASCENDING), ("slot.start_time", ASCENDING), ("_id", ASCENDING)], name="professional_id_start_time_id"),
+        IndexModel([("slot_id", ASCENDING)], name="slot_id"),
+    ]
+
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
@@ -19,3 +54,108 @@ class Appointment(MongoBase):
             }
         }
     )
+
+    def to_mongo(self):
+        """Convert to MongoDB document with proper enum handling"""
+        data = super().to_mongo()
+        if self.professional:
+            data["professional"]["specialization"] = self.professional.specialization.value
+        return data
+
+    @classmethod
+    def from_trusted(cls, document: dict) -> "Appointment":
+        """Build the embedded summaries, converting the professional's specialization to its enum"""
+        document = dict(document)
+        if document.get("patient"):
+            document["patient"] = PatientSummary.model_construct(**document["patient"])
+        if document.get("slot"):
+            document["slot"] = SlotSummary.model_construct(**document["slot"])
+        if document.get("professional"):
+            document["professional"] = ProfessionalSummary.model_construct(**{
+                **document["professional"],
+                "specialization": MedicalSpecialization(document["professional"]["specialization"]),
+            })
+        return super().from_trusted(document)
+
+    @classmethod
+    def book(cls, patient: Patient, slot: Slot, professional: Professional) -> "Appointment":
+        """A new appointment of a patient on a slot, with the snapshots of the three of them"""
+        return cls(
+            patient_id=patient.id,
+            slot_id=slot.id,
+            patient=PatientSummary(id=patient.id, name=patient.name, national_id=patient.national_id),
+            slot=SlotSummary(id=slot.id, start_time=slot.start_time, end_time=slot.end_time),
+            professional=ProfessionalSummary(id=professional.id, name=professional.name, specialization=professional.specialization),
+        )
+
+    @classmethod
+    async def find_upcoming(
+        cls,
+        db: AsyncDatabase,
+        query: dict,
+        limit: int,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+    ) -> List["Appointment"]:
+        """
+        Get the appointments matching `query` that haven't started yet, sorted by start time, in a single query
+        on the embedded slot snapshot. `after` is the (start_time, _id) of the last appointment of the previous page.
+        """
+        query = {**query, "slot.start_time": {"$gte": utc_now()}}
+        if after:
+            after_time, after_id = to_utc(after[0]), after[1]
+            query["slot.start_time"]["$gte"] = max(utc_now(), after_time)
+            # Appointments starting at the same time as the last one are ordered by _id
+            query["$nor"] = [{"slot.start_time": after_time, "_id": {"$lte": after_id}}]
+        return await cls.get_many_by_query(db, query, sort=[("slot.start_time", 1), ("_id", 1)], limit=limit)
+
+    @classmethod
+    async def backfill_summaries(cls, db: AsyncDatabase):
+        """
+        Fill in the snapshots of the appointments that don't have them, e.g. booked before they existed or
+        inserted raw, in a single server-side pass.
+        """
+        await db[cls.get_collection_name()].aggregate([
+            {"$match": {"$or": [{"patient": None}, {"slot": None}, {"professional": None}]}},
+            {"$lookup": {"from": Patient.get_collection_name(), "localField": "patient_id", "foreignField": "_id", "as": "patient"}},
+            {"$lookup": {"from": Slot.get_collection_name(), "localField": "slot_id", "foreignField": "_id", "as": "slot"}},
+            {"$unwind": "$patient"},
+            {"$unwind": "$slot"},
+            {"$lookup": {"from": Professional.get_collection_name(), "localField": "slot.professional_id", "foreignField": "_id", "as": "professional"}},
+            {"$unwind": "$professional"},
+            {"$project": {
+                "patient": {"id": "$patient._id", "name": "$patient.name", "national_id": "$patient.national_id"},
+                "slot": {"id": "$slot._id", "start_time": "$slot.start_time", "end_time": "$slot.end_time"},
+                "professional": {"id": "$professional._id", "name": "$professional.name", "specialization": "$professional.specialization"},
+            }},
+            {"$merge": {"into": cls.get_collection_name(), "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+        ])
+
+    @classmethod
+    async def refresh_patient(cls, db: AsyncDatabase, patient: Patient, session: Optional[AsyncClientSession] = None):
+        """Copy a patient's changes onto the snapshots of their appointments"""
+        await db[cls.get_collection_name()].update_many(
+            {"patient_id": patient.id, "$or": [{"patient.name": {"$ne": patient.name}}, {"patient.national_id": {"$ne": patient.national_id}}]},
+            {"$set": {"patient": PatientSummary(id=patient.id, name=patient.name, national_id=patient.national_id).model_dump()}},
+            session=session,
+        )
+
+    @classmethod
+    async def refresh_professional(cls, db: AsyncDatabase, professional: Professional, session: Optional[AsyncClientSession] = None):
+        """Copy a professional's changes onto the snapshots of their appointments"""
+        await db[cls.get_collection_name()].update_many(
+            {"professional.id": professional.id, "$or": [
+                {"professional.name": {"$ne": professional.name}},
+                {"professional.specialization": {"$ne": professional.specialization.value}},
+            ]},
+            {"$set": {"professional.name": professional.name, "professional.specialization": professional.specialization.value}},
+            session=session,
+        )
+
+    @classmethod
+    async def refresh_slot(cls, db: AsyncDatabase, slot: Slot, session: Optional[AsyncClientSession] = None):
+        """Copy a slot's changes onto the snapshot of its appointments"""
+        await db[cls.get_collection_name()].update_many(
+            {"slot_id": slot.id, "$or": [{"slot.start_time": {"$ne": slot.start_time}}, {"slot.end_time": {"$ne": slot.end_time}}]},
+            {"$set": {"slot.start_time": slot.start_time, "slot.end_time": slot.end_time}},
+            session=session,
+        )
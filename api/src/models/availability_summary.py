@@ -0,0 +1,204 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta, UTC
+from typing import Iterable, List, Optional
+
+from bson.objectid import ObjectId
+from pydantic import Field
+from pydantic_extra_types.mongo_object_id import MongoObjectId
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+
+from constants import SLOT_MODE
+from .datetime_utils import utc_now
+from .mongo_base import MongoBase
+from .professional import Professional
+from .specializations import MedicalSpecialization
+
+def day_key(value: datetime) -> str:
+    """The UTC day of a time, as stored in `day`"""
+    return value.astimezone(UTC).date().isoformat()
+
+class AvailabilitySummary(MongoBase):
+    """
+    Number of slots, and of free ones, of a professional on a UTC day. Kept up to date incrementally by the
+    slot writes (`adjust`) and reconciled by `rebuild`, so availability per day is read without reading slots.
+    """
+    specialization: MedicalSpecialization = Field(..., description="Specialization of the professional")
+    professional_id: MongoObjectId = Field(..., description="ID of the professional")
+    day: str = Field(..., description="UTC day, as YYYY-MM-DD")
+    total_slots: int = Field(0, description="Slots of the professional that day")
+    free_slots: int = Field(0, description="Slots of the professional that day that aren't booked")
+
+    indexes = [
+        IndexModel([("professional_id", ASCENDING), ("day", ASCENDING)], name="professional_day_unique", unique=True),
+        IndexModel([("specialization", ASCENDING), ("day", ASCENDING)], name="specialization_day"),
+    ]
+
+    @classmethod
+    def get_collection_name(cls) -> str:
+        return "availability_summaries"
+
+    def to_mongo(self):
+        data = super().to_mongo()
+        data["specialization"] = self.specialization.value
+        return data
+
+    @classmethod
+    def from_trusted(cls, document: dict) -> "AvailabilitySummary":
+        return super().from_trusted({**document, "specialization": MedicalSpecialization(document["specialization"])})
+
+    @classmethod
+    async def adjust(cls, db: AsyncDatabase, slots: Iterable, free: int, total: int, session: Optional[AsyncClientSession] = None):
+        """
+        Add `free` and `total` to the counts of every slot's (professional, day), e.g. -1 free slot for a booking.
+        Missing summaries are only created when `total` changes: a booking on a day that was never counted
+        (e.g. in lazy mode before the first `rebuild`) is left to the next `rebuild`, as are slots without a specialization.
+        """
+        counts = Counter(
+            (slot.professional_id, slot.specialization.value, day_key(slot.start_time))
+            for slot in slots
+            if slot.specialization
+        )
+        if not counts:
+            return
+        timestamp = int(utc_now().timestamp())
+        await db[cls.get_collection_name()].bulk_write([
+            UpdateOne(
+                {"professional_id": ObjectId(professional_id), "day": day},
+                {
+                    "$inc": {"free_slots": free * count, "total_slots": total * count},
+                    "$set": {"specialization": specialization, "updated_at": timestamp},
+                    "$setOnInsert": {"created_at": timestamp},
+                },
+                upsert=bool(total),
+            )
+            for (professional_id, specialization, day), count in counts.items()
+        ], ordered=False, session=session)
+
+    @classmethod
+    async def rebuild(cls, db: AsyncDatabase, start: date, end: date, professional_ids: Optional[List[ObjectId]] = None) -> int:
+        """
+        Recount the days from `start` to `end` (both included) from the slots, or from the schedules in lazy mode,
+        optionally only for some professionals. Fixes any drift of the incremental counts.
+        Returns the number of summaries written.
+        """
+        stamp = int(utc_now().timestamp())
+        if SLOT_MODE == "lazy":
+            written = await cls._rebuild_from_schedules(db, start, end, professional_ids, stamp)
+        else:
+            written = await cls._rebuild_from_slots(db, start, end, professional_ids, stamp)
+
+        # Days left without slots weren't rewritten
+        stale = {"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}, "updated_at": {"$lt": stamp}}
+        if professional_ids is not None:
+            stale["professional_id"] = {"$in": professional_ids}
+        await db[cls.get_collection_name()].delete_many(stale)
+        return written
+
+    @classmethod
+    async def _rebuild_from_slots(cls, db: AsyncDatabase, start: date, end: date, professional_ids: Optional[List[ObjectId]], stamp: int) -> int:
+        from .slot import Slot
+
+        match = {"start_time": {"$gte": datetime.combine(start, time.min, UTC), "$lt": datetime.combine(end + timedelta(days=1), time.min, UTC)}}
+        if professional_ids is not None:
+            match["professional_id"] = {"$in": professional_ids}
+        # Grouped and written back by the server, slots never leave the database
+        await db[Slot.get_collection_name()].aggregate([
+            {"$match": {**match, "specialization": {"$ne": None}}},
+            {"$group": {
+                "_id": {"professional_id": "$professional_id", "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time"}}},
+                "specialization": {"$last": "$specialization"},
+                "total_slots": {"$sum": 1},
+                "free_slots": {"$sum": {"$cond": ["$is_booked", 0, 1]}},
+            }},
+            {"$project": {
+                "_id": 0,
+                "professional_id": "$_id.professional_id",
+                "day": "$_id.day",
+                "specialization": 1,
+                "total_slots": 1,
+                "free_slots": 1,
+                "updated_at": {"$literal": stamp},
+            }},
+            {"$merge": {
+                "into": cls.get_collection_name(),
+                "on": ["professional_id", "day"],
+                "whenMatched": "merge",
+                "whenNotMatched": "insert",
+            }},
+        ])
+        written = {"updated_at": stamp}
+        if professional_ids is not None:
+            written["professional_id"] = {"$in": professional_ids}
+        return await db[cls.get_collection_name()].count_documents(written)
+
+    @classmethod
+    async def _rebuild_from_schedules(cls, db: AsyncDatabase, start: date, end: date, professional_ids: Optional[List[ObjectId]], stamp: int) -> int:
+        """In lazy mode only booked slots are stored: free slots are the schedule's slots minus the booked ones"""
+        from .slot import Slot
+
+        query = {"schedule": {"$ne": None}}
+        if professional_ids is not None:
+            query["_id"] = {"$in": professional_ids}
+        professionals = await Professional.get_many_by_query(db, query)
+
+        booked = defaultdict(int)
+        async for document in await db[Slot.get_collection_name()].aggregate([
+            {"$match": {
+                "professional_id": {"$in": [ObjectId(professional.id) for professional in professionals]},
+                "is_booked": True,
+                "start_time": {"$gte": datetime.combine(start, time.min, UTC), "$lt": datetime.combine(end + timedelta(days=1), time.min, UTC)},
+            }},
+            {"$group": {"_id": {"professional_id": "$professional_id", "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time"}}}, "count": {"$sum": 1}}},
+        ]):
+            booked[(document["_id"]["professional_id"], document["_id"]["day"])] = document["count"]
+
+        operations = []
+        for professional in professionals:
+            totals = Counter(day_key(start_time) for start_time, _ in professional.schedule.expand(start - timedelta(days=1), end + timedelta(days=1)))
+            for day, total in totals.items():
+                if not start.isoformat() <= day <= end.isoformat():
+                    continue
+                operations.append(UpdateOne(
+                    {"professional_id": ObjectId(professional.id), "day": day},
+                    {
+                        "$set": {
+                            "specialization": professional.specialization.value,
+                            "total_slots": total,
+                            "free_slots": max(0, total - booked[(ObjectId(professional.id), day)]),
+                            "updated_at": stamp,
+                        },
+                        "$setOnInsert": {"created_at": stamp},
+                    },
+                    upsert=True,
+                ))
+        if operations:
+            await db[cls.get_collection_name()].bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @classmethod
+    async def by_day(
+        cls,
+        db: AsyncDatabase,
+        specialization: MedicalSpecialization,
+        start: date,
+        end: date,
+        unavailable: Optional[Counter] = None,
+    ) -> List[dict]:
+        """
+        Free slots and professionals with free slots of a specialization per day, days without any are left out.
+        `unavailable` counts, per (professional ID, day), slots the summaries count as free but that aren't offered,
+        e.g. held slots.
+        """
+        unavailable = unavailable or Counter()
+        days = defaultdict(lambda: {"free_slots": 0, "professionals": 0})
+        for summary in await cls.aggregate(db, [
+            {"$match": {"specialization": specialization.value, "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}, "free_slots": {"$gt": 0}}},
+            {"$project": {"_id": 0, "professional_id": 1, "day": 1, "free_slots": 1}},
+        ]):
+            free = summary["free_slots"] - unavailable[(summary["professional_id"], summary["day"])]
+            if free > 0:
+                days[summary["day"]]["free_slots"] += free
+                days[summary["day"]]["professionals"] += 1
+        return [{"day": day, **days[day]} for day in sorted(days)]
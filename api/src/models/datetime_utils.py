@@ -0,0 +1,28 @@
+from datetime import datetime, tzinfo, UTC
+
+def to_utc(value: datetime) -> datetime:
+    """
+    Normalize a datetime to timezone-aware UTC.
+    Naive datetimes are assumed to already be in UTC, which is how MongoDB stores every date.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+def utc_now() -> datetime:
+    """Current time as a timezone-aware UTC datetime"""
+    return datetime.now(UTC)
+
+def parse_legacy_time(value: str, timezone: tzinfo) -> datetime:
+    """
+    Parse a slot time stored as a legacy ISO string into UTC. Those were written with `isoformat()`, mostly from
+    the naive local time of the server that wrote them: naive strings are read in `timezone`.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone)
+    return parsed.astimezone(UTC)
+
+def to_legacy_time(value: datetime, timezone: tzinfo) -> str:
+    """A time as the naive ISO string a legacy slot written in `timezone` holds, to compare with them"""
+    return to_utc(value).astimezone(timezone).replace(tzinfo=None).isoformat()
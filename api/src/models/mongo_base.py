@@ -1,10 +1,17 @@
+import asyncio
+import time
 from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime, UTC
-from typing import Optional, TypeVar, Type, List
+from typing import AsyncIterator, ClassVar, Iterable, Optional, TypeVar, Type, List
 from pydantic_extra_types.mongo_object_id import MongoObjectId
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.asynchronous.client_session import AsyncClientSession
 from pymongo.asynchronous.database import AsyncDatabase
 from bson.objectid import ObjectId
 
+from constants import VALIDATE_DB_READS
+from monitoring.tracing import current_trace, traced
+
 # TODO: move
 class EmptyMongoObjectId(MongoObjectId):
     def __init__(self, *args, **kwargs):
@@ -22,11 +29,22 @@ class EmptyMongoObjectId(MongoObjectId):
 
 T = TypeVar('T', bound='MongoBase')
 
+# Documents fetched per round trip when iterating over a cursor
+DEFAULT_BATCH_SIZE = 500
+# Documents per bulk write and bulk writes in flight for bulk upserts
+DEFAULT_BULK_CHUNK_SIZE = 1000
+DEFAULT_BULK_CONCURRENCY = 4
+
 class MongoBase(BaseModel):
     id: MongoObjectId = Field(alias="_id", default_factory=lambda: EmptyMongoObjectId())
     created_at: int = Field(default_factory=lambda: int(datetime.now(UTC).timestamp()))
     updated_at: int = Field(default_factory=lambda: int(datetime.now(UTC).timestamp()))
 
+    # Indexes for the model's collection, created at startup by `ensure_indexes`.
+    # Any `IndexModel` option works: compound keys, `unique`, `partialFilterExpression`, `expireAfterSeconds` (TTL)...
+    # Always give indexes an explicit `name` so they stay stable across deployments.
+    indexes: ClassVar[List[IndexModel]] = []
+
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
@@ -43,77 +61,217 @@ class MongoBase(BaseModel):
             if v is not None
         }
     
+    @classmethod
+    def from_mongo(cls: Type[T], document: dict) -> T:
+        """Build a model from a document read from the database, see `VALIDATE_DB_READS`"""
+        start = time.perf_counter()
+        model = cls(**document) if VALIDATE_DB_READS else cls.from_trusted(document)
+        if trace := current_trace():
+            trace.hydration_seconds += time.perf_counter() - start
+        return model
+
+    @classmethod
+    def from_trusted(cls: Type[T], document: dict) -> T:
+        """Build a model from a trusted document without validating it.
+
+        The database already holds the types the models expect (ObjectIds, UTC datetimes...), so
+        `model_construct` only has to fill in the defaults. Override it to convert the fields
+        stored differently than they're declared (e.g. enums stored as their value).
+        """
+        return cls.model_construct(**document)
+
     @classmethod
     async def get_all(cls: Type[T], db) -> List[T]:
         """Get all documents from database"""
-        documents = []
+        return [document async for document in cls.iter_by_query(db, {})]
+
+    @classmethod
+    @traced
+    async def iter_by_query(
+        cls: Type[T],
+        db: AsyncDatabase,
+        query: dict,
+        sort: Optional[List[tuple[str, int]]] = None,
+        limit: Optional[int] = None,
+        skip: Optional[int] = None,
+        projection: Optional[dict] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> AsyncIterator[T]:
+        """Iterate over the documents matching a query, fetching `batch_size` documents per round trip.
+        Only one batch is held in memory at a time, use it instead of `get_many_by_query` for large results.
+
+        Takes the same arguments as `get_many_by_query`.
+        """
         collection_name = cls.get_collection_name()
-        cursor = db[collection_name].find()
+        cursor = db[collection_name].find(query, projection, batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
         async for document in cursor:
-            documents.append(cls(**document))
-        return documents
+            yield cls.from_mongo(document)
 
     @classmethod
-    async def get_many_by_query(cls: Type[T], db: AsyncDatabase, query: dict, sort: Optional[List[tuple[str, int]]] = None) -> List[T]:
-        """Get documents by query with optional sorting
+    async def get_many_by_query(
+        cls: Type[T],
+        db: AsyncDatabase,
+        query: dict,
+        sort: Optional[List[tuple[str, int]]] = None,
+        limit: Optional[int] = None,
+        skip: Optional[int] = None,
+        projection: Optional[dict] = None,
+    ) -> List[T]:
+        """Get documents by query with optional sorting, paging and projection
         
         Args:
             db: AsyncDatabase instance
             query: MongoDB query dict
             sort: Optional list of tuples with (field_name, direction), where direction is 1 for ascending or -1 for descending
                  Example: [("created_at", -1)] to sort by created_at in descending order
+            limit: Optional maximum number of documents to return
+            skip: Optional number of documents to skip, prefer range queries (keyset pagination) for deep pages
+            projection: Optional MongoDB projection, the projected documents must still be valid models
+                 (i.e. only leave out fields with defaults)
         """
+        return [
+            document async for document in cls.iter_by_query(db, query, sort=sort, limit=limit, skip=skip, projection=projection)
+        ]
+    
+    @classmethod
+    async def aggregate(cls, db: AsyncDatabase, pipeline: List[dict]) -> List[dict]:
+        """Run an aggregation pipeline on the collection and return the raw documents"""
+        return [document async for document in cls.iter_aggregate(db, pipeline)]
+
+    @classmethod
+    @traced
+    async def iter_aggregate(cls, db: AsyncDatabase, pipeline: List[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[dict]:
+        """Run an aggregation pipeline on the collection and iterate over the raw documents, `batch_size` at a time"""
         collection_name = cls.get_collection_name()
-        documents = []
-        cursor = db[collection_name].find(query)
-        if sort:
-            cursor = cursor.sort(sort)
+        cursor = await db[collection_name].aggregate(pipeline, batchSize=batch_size)
         async for document in cursor:
-            documents.append(cls(**document))
-        return documents
+            yield document
     
     @classmethod
-    async def get_one_by_query(cls: Type[T], db: AsyncDatabase, query: dict) -> T | None:
+    @traced
+    async def get_one_by_query(cls: Type[T], db: AsyncDatabase, query: dict, session: Optional[AsyncClientSession] = None) -> T | None:
         """Query a document by query"""
         collection_name = cls.get_collection_name()
-        if document := await db[collection_name].find_one(query):
-            return cls(**document)
+        if document := await db[collection_name].find_one(query, session=session):
+            return cls.from_mongo(document)
         return None
 
     @classmethod
-    async def get_by_id(cls: Type[T], db: AsyncDatabase, id: str) -> T | None:
+    @traced
+    async def get_by_id(cls: Type[T], db: AsyncDatabase, id: str, session: Optional[AsyncClientSession] = None) -> T | None:
         """Get a document by ID"""
         collection_name = cls.get_collection_name()
-        if document := await db[collection_name].find_one({"_id": ObjectId(id)}):
-            return cls(**document)
+        if document := await db[collection_name].find_one({"_id": ObjectId(id)}, session=session):
+            return cls.from_mongo(document)
+        return None
+
+    @classmethod
+    @traced
+    async def find_one_and_update(cls: Type[T], db: AsyncDatabase, query: dict, update: dict, session: Optional[AsyncClientSession] = None) -> T | None:
+        """Atomically update the first document matching the query and return it after the update
+
+        Args:
+            db: AsyncDatabase instance
+            query: MongoDB query dict, the update is only applied if a document matches it
+            update: MongoDB update dict, `updated_at` is always refreshed
+            session: Optional session to run the update in (e.g. inside a transaction)
+        """
+        collection_name = cls.get_collection_name()
+        update = {**update, "$set": {**update.get("$set", {}), "updated_at": int(datetime.now(UTC).timestamp())}}
+        document = await db[collection_name].find_one_and_update(
+            query,
+            update,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if document:
+            return cls.from_mongo(document)
         return None
     
     @classmethod
-    async def insert_many(cls: Type[T], db: AsyncDatabase, documents: List[T]):
+    @traced
+    async def insert_many(cls: Type[T], db: AsyncDatabase, documents: List[T], session: Optional[AsyncClientSession] = None):
         """Insert many documents into database, it updates the documents with the inserted ids"""
         collection_name = cls.get_collection_name()
         documents_dicts = [document.to_mongo() for document in documents]
-        result = await db[collection_name].insert_many(documents_dicts)
+        result = await db[collection_name].insert_many(documents_dicts, session=session)
         for i, document_id in enumerate(result.inserted_ids):
             documents[i].id = document_id
         return result
 
-    async def save(self, db: AsyncDatabase):
+    @classmethod
+    @traced
+    async def upsert_many(
+        cls,
+        db: AsyncDatabase,
+        documents: Iterable[dict],
+        keys: List[str],
+        chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+        concurrency: int = DEFAULT_BULK_CONCURRENCY,
+    ) -> int:
+        """Insert raw documents that don't exist yet, in chunked, unordered bulk writes
+
+        Documents are matched on their `keys` fields: existing ones are left untouched, so it's safe to re-run
+        with the same documents. The keys should be backed by a unique index.
+
+        Args:
+            db: AsyncDatabase instance
+            documents: Documents as stored in MongoDB (see `to_mongo`), it can be a lazy iterator
+            keys: Fields identifying a document
+            chunk_size: Number of documents per bulk write
+            concurrency: Number of bulk writes in flight at the same time
+
+        Returns the number of inserted documents.
+        """
+        collection = db[cls.get_collection_name()]
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = []
+
+        async def write(chunk: List[UpdateOne]) -> int:
+            try:
+                result = await collection.bulk_write(chunk, ordered=False)
+                return result.upserted_count
+            finally:
+                semaphore.release()
+
+        chunk: List[UpdateOne] = []
+        for document in documents:
+            chunk.append(UpdateOne({key: document[key] for key in keys}, {"$setOnInsert": document}, upsert=True))
+            if len(chunk) == chunk_size:
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(write(chunk)))
+                chunk = []
+        if chunk:
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(write(chunk)))
+
+        return sum(await asyncio.gather(*tasks))
+
+    @traced
+    async def save(self, db: AsyncDatabase, session: Optional[AsyncClientSession] = None):
         """Save document to database"""
         self.updated_at = int(datetime.now(UTC).timestamp())
         collection_name = self.get_collection_name()
         
         if isinstance(self.id, EmptyMongoObjectId):
             self.created_at = self.updated_at
-            result = await db[collection_name].insert_one(self.to_mongo())
+            result = await db[collection_name].insert_one(self.to_mongo(), session=session)
             self.id = result.inserted_id
         else:
             await db[collection_name].update_one(
                 {"_id": ObjectId(self.id)},
-                {"$set": self.to_mongo()}
+                {"$set": self.to_mongo()},
+                session=session
             )
         return self
 
+    @traced
     async def delete(self, db) -> bool:
         """Delete document from database"""
         collection_name = self.get_collection_name()
@@ -122,6 +280,14 @@ class MongoBase(BaseModel):
             return True
         return False
 
+    @classmethod
+    async def ensure_indexes(cls, db: AsyncDatabase) -> List[str]:
+        """Create the indexes declared in `indexes`, it's a no-op for the ones that already exist"""
+        if not cls.indexes:
+            return []
+        collection_name = cls.get_collection_name()
+        return await db[collection_name].create_indexes(cls.indexes)
+
     @classmethod
     def get_collection_name(cls) -> str:
         """Get the collection name for this model"""
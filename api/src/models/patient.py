@@ -1,12 +1,19 @@
+from typing import Optional
 from pydantic import Field, ConfigDict
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
 from .mongo_base import MongoBase
 
 class Patient(MongoBase):
     name: str = Field(..., description="Full name of the patient")
-    # TODO: make this a unique index
     national_id: str = Field(..., description="National identification number of the patient")
     phone_number: str = Field(..., description="Contact phone number of the patient")
     email: str = Field(..., description="Contact email of the patient")
+
+    indexes = [
+        IndexModel([("national_id", ASCENDING)], name="national_id_unique", unique=True),
+    ]
     
     model_config = ConfigDict(
         json_schema_extra={
@@ -18,3 +25,13 @@ class Patient(MongoBase):
             }
         }
     )
+
+    async def save(self, db: AsyncDatabase, session: Optional[AsyncClientSession] = None):
+        """Save the patient and refresh the patient snapshot of their appointments"""
+        from .appointment import Appointment
+
+        is_new = not self.id
+        await super().save(db, session=session)
+        if not is_new:
+            await Appointment.refresh_patient(db, self, session=session)
+        return self
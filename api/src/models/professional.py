@@ -1,11 +1,33 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from bson.objectid import ObjectId
 from pydantic import Field, ConfigDict
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
 
+from cache import TTLCache
+from constants import PROFESSIONAL_CACHE_SIZE, PROFESSIONAL_CACHE_TTL
 from .specializations import MedicalSpecialization
+from .schedule import Schedule
 from .mongo_base import MongoBase
 
+logger = logging.getLogger(__name__)
+
+# Professionals almost never change, cache them per process (see `Professional.get_cached_by_id`)
+_cache_by_id: TTLCache[str, "Professional"] = TTLCache("professionals_by_id", PROFESSIONAL_CACHE_SIZE, PROFESSIONAL_CACHE_TTL)
+_cache_by_specialization: TTLCache[str, List["Professional"]] = TTLCache("professionals_by_specialization", len(MedicalSpecialization), PROFESSIONAL_CACHE_TTL)
+_cache_ids_by_suffix: TTLCache[str, Dict[bytes, ObjectId]] = TTLCache("professional_ids_by_suffix", 1, PROFESSIONAL_CACHE_TTL)
+
 class Professional(MongoBase):
     name: str = Field(..., description="Full name of the professional")
     specialization: MedicalSpecialization = Field(..., description="Specialization of the professional")
+    schedule: Optional[Schedule] = Field(default=None, description="Recurring schedule the professional's slots are generated from")
+
+    indexes = [
+        IndexModel([("specialization", ASCENDING)], name="specialization"),
+    ]
     
     model_config = ConfigDict(
         json_schema_extra={
@@ -21,5 +43,118 @@ class Professional(MongoBase):
         data = super().to_mongo()
         if self.specialization:
             data["specialization"] = self.specialization.value
+        if self.schedule:
+            # BSON has no date/time types, store them as ISO strings
+            data["schedule"] = self.schedule.model_dump(mode="json")
         return data
 
+    @classmethod
+    def from_trusted(cls, document: dict) -> "Professional":
+        """Convert the specialization to its enum and parse the schedule"""
+        document = {**document, "specialization": MedicalSpecialization(document["specialization"])}
+        if document.get("schedule"):
+            document["schedule"] = Schedule.model_validate(document["schedule"])
+        return super().from_trusted(document)
+
+    async def save(self, db: AsyncDatabase, session: Optional[AsyncClientSession] = None):
+        """Save the professional, propagate its specialization to its slots and availability summaries and refresh its appointments' snapshot"""
+        from .appointment import Appointment
+        from .availability_summary import AvailabilitySummary
+        from .slot import Slot
+
+        is_new = not self.id
+        await super().save(db, session=session)
+        self.invalidate_cache(self.id)
+        if not is_new:
+            await db[Slot.get_collection_name()].update_many(
+                {"professional_id": self.id, "specialization": {"$ne": self.specialization.value}},
+                {"$set": {"specialization": self.specialization.value}},
+                session=session
+            )
+            await db[AvailabilitySummary.get_collection_name()].update_many(
+                {"professional_id": self.id, "specialization": {"$ne": self.specialization.value}},
+                {"$set": {"specialization": self.specialization.value}},
+                session=session
+            )
+            await Appointment.refresh_professional(db, self, session=session)
+        return self
+
+    async def delete(self, db) -> bool:
+        """Delete the professional and drop it from the cache"""
+        deleted = await super().delete(db)
+        if deleted:
+            self.invalidate_cache(self.id)
+        return deleted
+
+    @classmethod
+    async def get_cached_by_id(cls, db: AsyncDatabase, id: str) -> "Professional | None":
+        """Get a professional by ID through the in-process cache"""
+        return await _cache_by_id.get_or_load(str(id), lambda: cls.get_by_id(db, id))
+
+    @classmethod
+    async def get_cached_by_specialization(cls, db: AsyncDatabase, specialization: MedicalSpecialization) -> List["Professional"]:
+        """Get all professionals of a specialization through the in-process cache"""
+        async def load():
+            professionals = await cls.get_many_by_query(db, {"specialization": specialization.value})
+            for professional in professionals:
+                _cache_by_id.set(str(professional.id), professional)
+            return professionals
+
+        return await _cache_by_specialization.get_or_load(specialization.value, load)
+
+    @classmethod
+    async def get_cached_ids_by_suffix(cls, db: AsyncDatabase) -> Dict[bytes, ObjectId]:
+        """
+        IDs of the professionals with a schedule by their last 8 bytes, to decode virtual slot IDs.
+        Loaded with a single query and kept until a professional changes: unknown suffixes don't query the database.
+        """
+        async def load():
+            return {
+                document["_id"].binary[4:]: document["_id"]
+                async for document in db[cls.get_collection_name()].find({"schedule": {"$ne": None}}, {"_id": 1})
+            }
+
+        return await _cache_ids_by_suffix.get_or_load("all", load)
+
+    @classmethod
+    def invalidate_cache(cls, id: Optional[str] = None):
+        """Drop a professional from the cache, or every professional when no ID is given.
+        Specialization lists and IDs by suffix are always dropped: a change may move a professional between them."""
+        if id:
+            _cache_by_id.invalidate(str(id))
+        else:
+            _cache_by_id.clear()
+        _cache_by_specialization.clear()
+        _cache_ids_by_suffix.clear()
+
+    @classmethod
+    def cache_stats(cls) -> List[dict]:
+        return [_cache_by_id.stats(), _cache_by_specialization.stats(), _cache_ids_by_suffix.stats()]
+
+    @classmethod
+    async def watch_changes(cls, db: AsyncDatabase, retry_delay: float = 1, max_retry_delay: float = 60):
+        """
+        Invalidate cached professionals changed by any process, through a change stream on the collection.
+        Runs until cancelled, requires a replica set. The stream is reopened whenever it fails or ends,
+        after `retry_delay` seconds doubling up to `max_retry_delay` while it keeps failing.
+        """
+        collection = db[cls.get_collection_name()]
+        delay = retry_delay
+        while True:
+            try:
+                async with await collection.watch() as stream:
+                    # Changes made while the stream was down are lost, start from a clean cache
+                    cls.invalidate_cache()
+                    delay = retry_delay
+                    async for change in stream:
+                        if document_key := change.get("documentKey"):
+                            cls.invalidate_cache(document_key["_id"])
+                        else:
+                            # Drops, renames...
+                            logger.info("Professionals change stream event %s, clearing the cache", change.get("operationType"))
+                            cls.invalidate_cache()
+                logger.warning("Professionals change stream closed, reopening it in %.0f seconds", delay)
+            except Exception:
+                logger.exception("Professionals change stream failed, reopening it in %.0f seconds", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_retry_delay)
@@ -0,0 +1,83 @@
+from datetime import date, datetime, time, timedelta, UTC
+from typing import Dict, Iterator, List
+from zoneinfo import ZoneInfo
+
+from pydantic import BaseModel, Field, model_validator
+
+class TimeRange(BaseModel):
+    start: time = Field(..., description="Start of the range, local time")
+    end: time = Field(..., description="End of the range, local time")
+
+    @model_validator(mode="after")
+    def validate_range(self):
+        if self.start >= self.end:
+            raise ValueError("The start of a time range must be before its end")
+        return self
+
+class WeeklyHours(TimeRange):
+    weekday: int = Field(..., ge=0, le=6, description="Day of the week, 0 is Monday")
+
+class ScheduleException(BaseModel):
+    day: date = Field(..., description="Day the exception applies to")
+    hours: List[TimeRange] = Field(default_factory=list, description="Working hours replacing the weekly ones that day, empty for a day off")
+
+class Schedule(BaseModel):
+    """
+    A professional's recurring schedule: weekly working hours split in fixed-length slots,
+    with per-day exceptions and holidays.
+    """
+
+    timezone: str = Field("UTC", description="IANA timezone of the working hours, e.g. America/Argentina/Buenos_Aires")
+    slot_minutes: int = Field(30, ge=5, le=240, description="Length of each slot in minutes")
+    weekly_hours: List[WeeklyHours] = Field(default_factory=list, description="Working hours for each day of the week")
+    exceptions: List[ScheduleException] = Field(default_factory=list, description="Days with different working hours")
+    holidays: List[date] = Field(default_factory=list, description="Days off")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "timezone": "UTC",
+                "slot_minutes": 30,
+                "weekly_hours": [
+                    {"weekday": 0, "start": "09:00:00", "end": "13:00:00"},
+                    {"weekday": 2, "start": "14:00:00", "end": "18:00:00"}
+                ],
+                "exceptions": [{"day": "2024-03-20", "hours": [{"start": "09:00:00", "end": "11:00:00"}]}],
+                "holidays": ["2024-03-24"]
+            }
+        }
+    }
+
+    def _slot_offsets(self, hours: List[TimeRange]) -> List[timedelta]:
+        """Offsets from midnight of every slot that fits entirely in the working hours"""
+        offsets = []
+        for time_range in sorted(hours, key=lambda time_range: time_range.start):
+            start = time_range.start.hour * 60 + time_range.start.minute
+            end = time_range.end.hour * 60 + time_range.end.minute
+            offsets.extend(timedelta(minutes=minute) for minute in range(start, end - self.slot_minutes + 1, self.slot_minutes))
+        return offsets
+
+    def expand(self, start: date, end: date) -> Iterator[tuple[datetime, datetime]]:
+        """
+        Yield the (start_time, end_time) in UTC of every slot between the `start` and `end` days, both included.
+        The slot pattern of each weekday and exception is computed once, expanding a day only adds the offsets to its midnight.
+        """
+        timezone = ZoneInfo(self.timezone)
+        duration = timedelta(minutes=self.slot_minutes)
+        weekly: Dict[int, List[timedelta]] = {
+            weekday: self._slot_offsets([hours for hours in self.weekly_hours if hours.weekday == weekday])
+            for weekday in range(7)
+        }
+        exceptions = {exception.day: self._slot_offsets(exception.hours) for exception in self.exceptions}
+        holidays = set(self.holidays)
+
+        day = start
+        while day <= end:
+            if day not in holidays:
+                offsets = exceptions[day] if day in exceptions else weekly[day.weekday()]
+                midnight = datetime.combine(day, time.min, timezone)
+                for offset in offsets:
+                    # Aware arithmetic is wall-clock time, the UTC conversion applies the DST offset of each slot
+                    start_time = (midnight + offset).astimezone(UTC)
+                    yield start_time, start_time + duration
+            day += timedelta(days=1)
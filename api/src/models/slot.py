@@ -1,14 +1,77 @@
-from datetime import datetime
-from pydantic import Field, ConfigDict
+import asyncio
+import heapq
+import itertools
+from collections import defaultdict
+from datetime import date, datetime
+from typing import AbstractSet, AsyncIterator, Callable, Iterable, Iterator, List, Optional, TypeVar
+from zoneinfo import ZoneInfo
+from bson.objectid import ObjectId
+from pydantic import Field, ConfigDict, field_validator
 from pydantic_extra_types.mongo_object_id import MongoObjectId
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
 
-from .mongo_base import MongoBase
+from cache import availability_cache
+from constants import SLOT_TIMES_DUAL_READ, SLOT_TIMES_LEGACY_TIMEZONE
+from .availability_summary import AvailabilitySummary
+from .datetime_utils import parse_legacy_time, to_legacy_time, to_utc, utc_now
+from .mongo_base import MongoBase, DEFAULT_BULK_CHUNK_SIZE
+from .professional import Professional
+from .specializations import MedicalSpecialization
+
+if SLOT_TIMES_DUAL_READ and not SLOT_TIMES_LEGACY_TIMEZONE:
+    raise ValueError("MEDAPP_SLOT_TIMES_DUAL_READ requires MEDAPP_SLOT_TIMES_LEGACY_TIMEZONE, the timezone the legacy slot times were written in")
+LEGACY_TIMEZONE = ZoneInfo(SLOT_TIMES_LEGACY_TIMEZONE) if SLOT_TIMES_LEGACY_TIMEZONE else None
+
+T = TypeVar("T")
+
+async def merge_sorted(iterators: List[AsyncIterator[T]], key: Callable[[T], tuple], limit: Optional[int] = None) -> AsyncIterator[T]:
+    """Merge async iterators each sorted by `key` into one sorted iterator, stopping after `limit` items"""
+    heads = {}
+    for index, iterator in enumerate(iterators):
+        async for item in iterator:
+            heads[index] = item
+            break
+    count = 0
+    while heads and (not limit or count < limit):
+        index = min(heads, key=lambda index: key(heads[index]))
+        yield heads.pop(index)
+        count += 1
+        async for item in iterators[index]:
+            heads[index] = item
+            break
 
 class Slot(MongoBase):
     start_time: datetime = Field(..., description="Start time of the slot")
     end_time: datetime = Field(..., description="End time of the slot")
     professional_id: MongoObjectId = Field(..., description="ID of the professional associated with this slot")
     is_booked: bool = Field(default=False, description="Whether the slot is already booked")
+    # Denormalized from the professional so specialization searches are a single indexed query, filled in from
+    # the professional by `save` and `insert_many` when missing and kept in sync by `Professional.save`
+    specialization: Optional[MedicalSpecialization] = Field(default=None, description="Specialization of the professional associated with this slot")
+
+    indexes = [
+        # Availability queries: equality on professional/specialization, range + sort on start time,
+        # `_id` breaks ties for keyset pagination.
+        # Only free slots are indexed, every availability query filters on `is_booked: False`.
+        IndexModel(
+            [("professional_id", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+            name="available_by_professional_start_time_id",
+            partialFilterExpression={"is_booked": False},
+        ),
+        IndexModel(
+            [("specialization", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+            name="available_by_specialization_start_time_id",
+            partialFilterExpression={"is_booked": False},
+        ),
+        # A professional can't have two slots starting at the same time, generated slots are upserted on it
+        IndexModel(
+            [("professional_id", ASCENDING), ("start_time", ASCENDING)],
+            name="professional_start_time_unique",
+            unique=True,
+        ),
+    ]
     
     model_config = ConfigDict(
         json_schema_extra={
@@ -16,14 +79,399 @@ class Slot(MongoBase):
                 "start_time": "2024-03-20T09:00:00",
                 "end_time": "2024-03-20T10:00:00",
                 "professional_id": "507f1f77bcf86cd799439011",
-                "is_booked": False
+                "is_booked": False,
+                "specialization": MedicalSpecialization.CARDIOLOGY.value
             }
         }
     )
-    
+
     def to_mongo(self):
         """Convert to MongoDB document with proper enum handling"""
         data = super().to_mongo()
-        data["start_time"] = self.start_time.isoformat()
-        data["end_time"] = self.end_time.isoformat()
+        if self.specialization:
+            data["specialization"] = self.specialization.value
         return data
+    
+    @field_validator("start_time", "end_time")
+    @classmethod
+    def validate_utc(cls, value: datetime) -> datetime:
+        """Slot times are always stored and returned as UTC dates"""
+        return to_utc(value)
+
+    @classmethod
+    def from_trusted(cls, document: dict) -> "Slot":
+        """Convert the specialization to its enum, slots still holding legacy string times are parsed and validated"""
+        legacy_times = {
+            field: parse_legacy_time(document[field], LEGACY_TIMEZONE)
+            for field in ("start_time", "end_time")
+            if isinstance(document.get(field), str)
+        }
+        if legacy_times:
+            return cls(**{**document, **legacy_times})
+        if document.get("specialization"):
+            document = {**document, "specialization": MedicalSpecialization(document["specialization"])}
+        return super().from_trusted(document)
+
+    @staticmethod
+    def stored_time(value: datetime, legacy: bool = False) -> datetime | str:
+        """A time as stored in `start_time`: a UTC date, or with `legacy` a naive ISO string in the legacy timezone"""
+        return to_legacy_time(value, LEGACY_TIMEZONE) if legacy else to_utc(value)
+
+    @staticmethod
+    def time_representations() -> List[bool]:
+        """
+        Whether to query the legacy string times, the date ones or both (`legacy` of `available_query`).
+        Mongo sorts every string before any date: during the dual-read period each one is queried on its own
+        and the sorted results are merged.
+        """
+        return [False, True] if SLOT_TIMES_DUAL_READ else [False]
+
+    @classmethod
+    def start_time_filter(cls, **operators: datetime) -> dict:
+        """
+        Build a `start_time` range filter, e.g. `Slot.start_time_filter(gte=start, lte=end)`.
+        During the dual-read period it also matches slots still stored as legacy ISO strings.
+        """
+        date_filter = {f"${operator}": cls.stored_time(value) for operator, value in operators.items()}
+        if not SLOT_TIMES_DUAL_READ:
+            return {"start_time": date_filter}
+
+        legacy_filter = {f"${operator}": cls.stored_time(value, legacy=True) for operator, value in operators.items()}
+        return {"$or": [{"start_time": date_filter}, {"start_time": legacy_filter}]}
+
+    @classmethod
+    def available_query(
+        cls,
+        start: datetime,
+        end: Optional[datetime] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+        legacy: bool = False,
+    ) -> dict:
+        """
+        Build the filter for free slots starting in [start, end].
+        `after` is the (start_time, _id) of the last slot of the previous page, results are sorted by those
+        two fields so the next page starts right after it (keyset pagination).
+        `exclude` are IDs of slots to leave out, e.g. the held ones.
+        `legacy` matches the slots still stored with string times instead of the date ones, see `time_representations`.
+        """
+        time_filter = {"gte": start}
+        if end:
+            time_filter["lte"] = end
+        query = {"is_booked": False}
+        if exclude:
+            query["_id"] = {"$nin": list(exclude)}
+
+        if after:
+            after_time, after_id = after
+            time_filter["gte"] = max(to_utc(start), to_utc(after_time))
+            # Slots starting at the same time as the last one are ordered by _id
+            query["$nor"] = [{"start_time": cls.stored_time(after_time, legacy), "_id": {"$lte": after_id}}]
+
+        return {**query, "start_time": {f"${operator}": cls.stored_time(value, legacy) for operator, value in time_filter.items()}}
+
+    @classmethod
+    def iter_available(
+        cls,
+        db: AsyncDatabase,
+        professional_ids: List[ObjectId],
+        start: datetime,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> AsyncIterator["Slot"]:
+        """
+        Iterate over the free slots of the given professionals starting in [start, end], sorted by start time.
+        During the dual-read period the legacy string slots and the date ones are read by two queries and merged.
+        """
+        cursors = [
+            cls.iter_by_query(db, {
+                "professional_id": professional_ids[0] if len(professional_ids) == 1 else {"$in": professional_ids},
+                **cls.available_query(start, end, after, exclude, legacy)
+            }, sort=[("start_time", 1), ("_id", 1)], limit=limit)
+            for legacy in cls.time_representations()
+        ]
+        if len(cursors) == 1:
+            return cursors[0]
+        return merge_sorted(cursors, key=lambda slot: (slot.start_time, str(slot.id)), limit=limit)
+
+    @classmethod
+    async def find_available(
+        cls,
+        db: AsyncDatabase,
+        professional_ids: List[ObjectId],
+        start: datetime,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> List["Slot"]:
+        """Get the free slots of the given professionals starting in [start, end], sorted by start time"""
+        if not professional_ids:
+            return []
+
+        return [slot async for slot in cls.iter_available(db, professional_ids, start, end, limit, after, exclude)]
+
+    @classmethod
+    async def iter_available_by_specialization(
+        cls,
+        db: AsyncDatabase,
+        specialization: MedicalSpecialization,
+        start: datetime,
+        end: datetime,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> AsyncIterator[tuple["Slot", Professional]]:
+        """
+        Iterate over the free slots of a specialization starting in [start, end] with their professional, sorted by start time.
+        Runs as a single aggregation: an indexed match on the denormalized `specialization` plus a `$lookup` of the professional.
+        During the dual-read period the legacy string slots and the date ones are read by two aggregations and merged.
+        """
+        async def iter_results(legacy: bool) -> AsyncIterator[tuple["Slot", Professional]]:
+            pipeline = [
+                {"$match": {
+                    "specialization": specialization.value,
+                    **cls.available_query(start, end, after, exclude, legacy)
+                }},
+                {"$sort": {"start_time": 1, "_id": 1}},
+            ]
+            if limit:
+                pipeline.append({"$limit": limit})
+            pipeline += [
+                {"$lookup": {
+                    "from": Professional.get_collection_name(),
+                    "localField": "professional_id",
+                    "foreignField": "_id",
+                    "as": "professional"
+                }},
+                {"$unwind": "$professional"},
+            ]
+            async for document in cls.iter_aggregate(db, pipeline):
+                yield cls.from_mongo(document), Professional.from_mongo(document["professional"])
+
+        results = [iter_results(legacy) for legacy in cls.time_representations()]
+        if len(results) > 1:
+            results = [merge_sorted(results, key=lambda result: (result[0].start_time, str(result[0].id)), limit=limit)]
+        async for result in results[0]:
+            yield result
+
+    @classmethod
+    async def find_available_by_specialization(
+        cls,
+        db: AsyncDatabase,
+        specialization: MedicalSpecialization,
+        start: datetime,
+        end: datetime,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> List[tuple["Slot", Professional]]:
+        """Get the free slots of a specialization starting in [start, end] with their professional, sorted by start time"""
+        return [result async for result in cls.iter_available_by_specialization(db, specialization, start, end, limit, after, exclude)]
+
+    @classmethod
+    async def find_next_available(
+        cls,
+        db: AsyncDatabase,
+        professionals: List[Professional],
+        start: datetime,
+        count: int,
+        per_professional: int,
+        end: Optional[datetime] = None,
+        exclude: Optional[AbstractSet[ObjectId]] = None,
+    ) -> List[tuple["Slot", Professional]]:
+        """
+        Get the earliest `count` free slots of the professionals starting in [start, end], with at most
+        `per_professional` slots of each one, sorted by start time.
+
+        Merges one sorted cursor per professional, each one limited to `per_professional` slots and backed by
+        the (professional_id, start_time, _id) index: it reads at most that many slots per professional
+        however many free slots the window holds.
+        """
+        limit = min(per_professional, count)
+        heads = await asyncio.gather(*[
+            cls.find_available(db, [ObjectId(professional.id)], start, end, limit=limit, exclude=exclude)
+            for professional in professionals
+        ])
+        merged = heapq.merge(
+            *[[(slot, professional) for slot in slots] for slots, professional in zip(heads, professionals)],
+            key=lambda result: (result[0].start_time, str(result[0].id)),
+        )
+        return list(itertools.islice(merged, count))
+
+    @classmethod
+    async def claim(cls, db: AsyncDatabase, slot_id: str, session: Optional[AsyncClientSession] = None) -> "Slot | None":
+        """Atomically mark a free, future slot as booked.
+
+        The availability check and the write happen in a single `find_one_and_update`,
+        so only one of several concurrent callers can claim the same slot.
+        Returns the booked slot, or None if it does not exist, is already booked or is in the past.
+        """
+        slot = await cls.find_one_and_update(db, {
+            "_id": ObjectId(slot_id),
+            "is_booked": False,
+            **cls.start_time_filter(gt=utc_now())
+        }, {"$set": {"is_booked": True}}, session=session)
+        if slot:
+            await AvailabilitySummary.adjust(db, [slot], free=-1, total=0, session=session)
+            await slot.invalidate_availability()
+        return slot
+
+    @classmethod
+    async def release(cls, db: AsyncDatabase, slot_id: str, session: Optional[AsyncClientSession] = None) -> "Slot | None":
+        """Mark a booked slot as free again, used to undo a claim"""
+        slot = await cls.find_one_and_update(db, {
+            "_id": ObjectId(slot_id),
+            "is_booked": True
+        }, {"$set": {"is_booked": False}}, session=session)
+        if slot:
+            await AvailabilitySummary.adjust(db, [slot], free=1, total=0, session=session)
+            await slot.invalidate_availability()
+        return slot
+
+    @classmethod
+    async def claim_many(cls, db: AsyncDatabase, slots: List["Slot"], session: Optional[AsyncClientSession] = None) -> List["Slot"]:
+        """
+        Atomically mark free, future slots as booked with a single bulk write of conditional updates, like `claim`.
+        Returns the slots that were claimed, marked as booked, the others were booked, in the past or don't exist.
+        The client-level bulk write (MongoDB 8.0+) reports the result of each update, which tells the slots
+        claimed by this write apart from the ones booked by others.
+        """
+        if not slots:
+            return []
+        namespace = f"{db.name}.{cls.get_collection_name()}"
+        timestamp = int(utc_now().timestamp())
+        result = await db.client.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(slot.id), "is_booked": False, **cls.start_time_filter(gt=utc_now())},
+                {"$set": {"is_booked": True, "updated_at": timestamp}},
+                namespace=namespace,
+            )
+            for slot in slots
+        ], ordered=False, verbose_results=True, session=session)
+        claimed = [
+            slot for index, slot in enumerate(slots)
+            if index in result.update_results and result.update_results[index].modified_count
+        ]
+
+        for slot in claimed:
+            slot.is_booked = True
+        await AvailabilitySummary.adjust(db, claimed, free=-1, total=0, session=session)
+        await cls.invalidate_availability_many(claimed)
+        return claimed
+
+    @classmethod
+    async def invalidate_availability_many(cls, slots: List["Slot"]):
+        """Drop the cached availability of the slots' days"""
+        days_by_specialization = defaultdict(list)
+        for slot in slots:
+            days_by_specialization[slot.specialization.value if slot.specialization else None].append(slot.start_time)
+        for specialization, times in days_by_specialization.items():
+            await availability_cache.invalidate(specialization, times)
+
+    async def invalidate_availability(self):
+        """Drop the cached availability of the slot's day, call it after any write that changes whether it's free"""
+        await availability_cache.invalidate(self.specialization.value if self.specialization else None, [self.start_time])
+
+    @classmethod
+    async def fill_specialization(cls, db: AsyncDatabase, slots: List["Slot"]):
+        """Copy their professional's specialization onto the slots without one, specialization searches would never find them"""
+        missing = [slot for slot in slots if not slot.specialization]
+        if not missing:
+            return
+        professional_ids = list({str(slot.professional_id) for slot in missing})
+        professionals = dict(zip(professional_ids, await asyncio.gather(*[Professional.get_cached_by_id(db, id) for id in professional_ids])))
+        for slot in missing:
+            if not (professional := professionals[str(slot.professional_id)]):
+                raise ValueError(f"Professional {slot.professional_id} of the slot not found")
+            slot.specialization = professional.specialization
+
+    @classmethod
+    async def insert_many(cls, db: AsyncDatabase, documents: List["Slot"], session: Optional[AsyncClientSession] = None):
+        """Insert many slots, count them in the availability summary and drop the cached availability of their days"""
+        await cls.fill_specialization(db, documents)
+        result = await super().insert_many(db, documents, session=session)
+        await AvailabilitySummary.adjust(db, [slot for slot in documents if not slot.is_booked], free=1, total=1, session=session)
+        await AvailabilitySummary.adjust(db, [slot for slot in documents if slot.is_booked], free=0, total=1, session=session)
+        await cls.invalidate_availability_many(documents)
+        return result
+
+    @classmethod
+    async def upsert_many(cls, db: AsyncDatabase, documents: Iterable[dict], keys: List[str], **kwargs) -> int:
+        """Like `MongoBase.upsert_many`, raw slot documents must hold their professional's specialization"""
+        def checked() -> Iterator[dict]:
+            for document in documents:
+                if not document.get("specialization"):
+                    raise ValueError("Slot documents need the specialization of their professional")
+                yield document
+
+        return await super().upsert_many(db, checked(), keys, **kwargs)
+
+    @classmethod
+    async def generate_from_schedule(
+        cls,
+        db: AsyncDatabase,
+        professional: Professional,
+        start: date,
+        end: date,
+        chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+    ) -> int:
+        """
+        Create the slots of a professional's schedule between the `start` and `end` days, both included.
+        Slots that already exist are left untouched (booked or not), so it can be re-run over the same days.
+        The availability summary of those days is rebuilt afterwards.
+        Returns the number of slots created.
+        """
+        if not professional.schedule:
+            return 0
+
+        timestamp = int(utc_now().timestamp())
+        # One start time per UTC day, to invalidate the cached availability of those days
+        days: dict[date, datetime] = {}
+
+        def documents() -> Iterator[dict]:
+            for start_time, end_time in professional.schedule.expand(start, end):
+                days.setdefault(start_time.date(), start_time)
+                yield {
+                    "created_at": timestamp,
+                    "updated_at": timestamp,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "professional_id": professional.id,
+                    "specialization": professional.specialization.value,
+                    "is_booked": False,
+                }
+
+        created = await cls.upsert_many(db, documents(), keys=["professional_id", "start_time"], chunk_size=chunk_size)
+        if created:
+            await AvailabilitySummary.rebuild(db, start, end, [ObjectId(professional.id)])
+            await availability_cache.invalidate(professional.specialization.value, days.values())
+        return created
+
+    async def save(self, db: AsyncDatabase, session: Optional[AsyncClientSession] = None):
+        """
+        Save the slot, with its professional's specialization if it has none, and drop the cached availability of its day.
+        New slots are counted in the availability summary, changes to existing ones are left to its `rebuild`
+        and copied onto the snapshot of their appointments.
+        """
+        from .appointment import Appointment
+
+        is_new = not self.id
+        await self.fill_specialization(db, [self])
+        await super().save(db, session=session)
+        if is_new:
+            await AvailabilitySummary.adjust(db, [self], free=0 if self.is_booked else 1, total=1, session=session)
+        else:
+            await Appointment.refresh_slot(db, self, session=session)
+        await self.invalidate_availability()
+        return self
+
+    async def delete(self, db) -> bool:
+        """Delete the slot, uncount it from the availability summary and drop the cached availability of its day"""
+        deleted = await super().delete(db)
+        if deleted:
+            await AvailabilitySummary.adjust(db, [self], free=0 if self.is_booked else -1, total=-1)
+            await self.invalidate_availability()
+        return deleted
@@ -0,0 +1,152 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from bson.objectid import ObjectId
+from pydantic import Field
+from pydantic_extra_types.mongo_object_id import MongoObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError
+
+from .datetime_utils import to_utc, utc_now
+from .mongo_base import MongoBase
+from .specializations import MedicalSpecialization
+
+class SlotHold(MongoBase):
+    """
+    A free slot reserved for a patient for a short time, e.g. while they confirm it. Its `_id` is the slot's ID
+    so a slot has at most one hold. Held slots are left out of the listings and only the patient holding them
+    can book them.
+
+    Expired holds are ignored by every query and deleted by Mongo's TTL monitor, which runs about every minute.
+    """
+    patient_id: MongoObjectId = Field(..., description="ID of the patient holding the slot")
+    professional_id: MongoObjectId = Field(..., description="ID of the professional of the slot")
+    specialization: Optional[MedicalSpecialization] = Field(default=None, description="Specialization of the professional of the slot")
+    start_time: datetime = Field(..., description="Start time of the slot")
+    end_time: datetime = Field(..., description="End time of the slot")
+    expires_at: datetime = Field(..., description="When the hold is released")
+
+    indexes = [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("specialization", ASCENDING), ("start_time", ASCENDING)], name="specialization_start_time"),
+        IndexModel([("professional_id", ASCENDING), ("start_time", ASCENDING)], name="professional_start_time"),
+        IndexModel([("patient_id", ASCENDING), ("expires_at", ASCENDING)], name="patient_expires_at"),
+    ]
+
+    @classmethod
+    def get_collection_name(cls) -> str:
+        return "slot_holds"
+
+    def to_mongo(self):
+        data = super().to_mongo()
+        if self.specialization:
+            data["specialization"] = self.specialization.value
+        return data
+
+    @classmethod
+    def from_trusted(cls, document: dict) -> "SlotHold":
+        if document.get("specialization"):
+            document = {**document, "specialization": MedicalSpecialization(document["specialization"])}
+        return super().from_trusted(document)
+
+    @classmethod
+    async def place(cls, db: AsyncDatabase, slot, patient_id: str, ttl: float, max_holds: int = 1) -> "SlotHold | None":
+        """
+        Hold a slot for a patient for `ttl` seconds, or extend the patient's hold on it, and release the patient's
+        oldest holds beyond `max_holds`. Returns None if another patient holds it.
+        The slot must be free and the patient must exist, the caller checks them.
+        """
+        now = utc_now()
+        hold = cls(
+            id=slot.id,
+            patient_id=patient_id,
+            professional_id=slot.professional_id,
+            specialization=slot.specialization,
+            start_time=slot.start_time,
+            end_time=slot.end_time,
+            expires_at=now + timedelta(seconds=ttl),
+        )
+        document = hold.to_mongo()
+        document["created_at"] = document["updated_at"] = int(now.timestamp())
+        try:
+            # Matches a missing, expired or own hold. Any other hold makes the upsert collide on `_id`
+            await db[cls.get_collection_name()].replace_one(
+                {"_id": ObjectId(slot.id), "$or": [{"expires_at": {"$lte": now}}, {"patient_id": ObjectId(patient_id)}]},
+                document,
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return None
+
+        # Latest first: a hold's expiry moves forward every time it's extended
+        others = db[cls.get_collection_name()].find(
+            {"patient_id": ObjectId(patient_id), "_id": {"$ne": ObjectId(slot.id)}, "expires_at": {"$gt": now}},
+            {"_id": 1},
+        ).sort("expires_at", -1).skip(max(0, max_holds - 1))
+        if released := [document["_id"] async for document in others]:
+            await db[cls.get_collection_name()].delete_many({"_id": {"$in": released}, "patient_id": ObjectId(patient_id)})
+        return hold
+
+    @classmethod
+    async def get_active(cls, db: AsyncDatabase, slot_id: str, session: Optional[AsyncClientSession] = None) -> "SlotHold | None":
+        """The unexpired hold of a slot"""
+        return await cls.get_one_by_query(db, {"_id": ObjectId(slot_id), "expires_at": {"$gt": utc_now()}}, session=session)
+
+    @classmethod
+    async def release(cls, db: AsyncDatabase, slot_id: str, patient_id: str, session: Optional[AsyncClientSession] = None) -> bool:
+        """Drop a patient's hold on a slot, returns whether there was one"""
+        result = await db[cls.get_collection_name()].delete_one(
+            {"_id": ObjectId(slot_id), "patient_id": ObjectId(patient_id)},
+            session=session,
+        )
+        return result.deleted_count > 0
+
+    @classmethod
+    async def get_active_many(cls, db: AsyncDatabase, slot_ids: List[ObjectId]) -> List["SlotHold"]:
+        """The unexpired holds of some slots"""
+        return await cls.get_many_by_query(db, {"_id": {"$in": slot_ids}, "expires_at": {"$gt": utc_now()}})
+
+    @classmethod
+    async def release_many(cls, db: AsyncDatabase, slot_ids: List[ObjectId], session: Optional[AsyncClientSession] = None):
+        """Drop the holds of some slots, whoever holds them, e.g. once they're booked"""
+        if slot_ids:
+            await db[cls.get_collection_name()].delete_many({"_id": {"$in": slot_ids}}, session=session)
+
+    @classmethod
+    async def count_by_day(cls, db: AsyncDatabase, specialization: MedicalSpecialization, start: datetime, end: datetime) -> Counter:
+        """Unexpired holds of the slots of a specialization starting in [start, end), per (professional ID, UTC day)"""
+        cursor = db[cls.get_collection_name()].find(
+            {"specialization": specialization.value, "start_time": {"$gte": to_utc(start), "$lt": to_utc(end)}, "expires_at": {"$gt": utc_now()}},
+            {"professional_id": 1, "start_time": 1},
+        )
+        return Counter([(document["professional_id"], to_utc(document["start_time"]).date().isoformat()) async for document in cursor])
+
+    @classmethod
+    def active_query(cls, start: datetime, end: Optional[datetime] = None) -> dict:
+        """Filter for the unexpired holds of slots starting in [start, end]"""
+        # Slots are shorter than a day, a slot overlapping the window starts at most a day before it
+        start_filter = {"$gte": to_utc(start) - timedelta(days=1)}
+        if end:
+            start_filter["$lte"] = to_utc(end)
+        return {"start_time": start_filter, "expires_at": {"$gt": utc_now()}}
+
+    @classmethod
+    async def held_slot_ids(
+        cls,
+        db: AsyncDatabase,
+        start: datetime,
+        end: Optional[datetime] = None,
+        specialization: Optional[MedicalSpecialization] = None,
+        professional_ids: Optional[List[ObjectId]] = None,
+    ) -> Set[ObjectId]:
+        """IDs of the held slots of a specialization or of some professionals starting in [start, end]"""
+        query = cls.active_query(start, end)
+        if specialization:
+            query["specialization"] = specialization.value
+        if professional_ids is not None:
+            query["professional_id"] = {"$in": professional_ids}
+        cursor = db[cls.get_collection_name()].find(query, {"_id": 1})
+        return {document["_id"] async for document in cursor}
@@ -0,0 +1,24 @@
+"""
+Monitoring package
+"""
+from .metrics import Counter, Gauge, Histogram, Registry, registry
+from .mongo_listeners import CommandMetricsListener, PoolMetricsListener
+from .tracing import Span, RequestTrace, TracingMiddleware, TracedRoute, current_trace, span, traced, otlp_traces
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "registry",
+    "CommandMetricsListener",
+    "PoolMetricsListener",
+    "Span",
+    "RequestTrace",
+    "TracingMiddleware",
+    "TracedRoute",
+    "current_trace",
+    "span",
+    "traced",
+    "otlp_traces",
+]
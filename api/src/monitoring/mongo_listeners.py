@@ -0,0 +1,125 @@
+import logging
+from collections import OrderedDict
+from typing import Any, Optional
+
+from pymongo import monitoring
+
+from constants import SLOW_QUERY_MS
+from .metrics import registry
+from .tracing import record_command
+
+logger = logging.getLogger(__name__)
+
+command_duration = registry.histogram("medapp_mongo_command_duration_seconds", "Duration of MongoDB commands", ["command"])
+command_failures = registry.counter("medapp_mongo_command_failures_total", "Failed MongoDB commands", ["command"])
+checkout_wait = registry.histogram("medapp_mongo_pool_checkout_wait_seconds", "Time spent waiting to check out a connection from the pool", ["address"])
+checkout_failures = registry.counter("medapp_mongo_pool_checkout_failures_total", "Connection check outs that failed (e.g. wait queue timeout)", ["address", "reason"])
+connections_in_use = registry.gauge("medapp_mongo_pool_connections_in_use", "Connections currently checked out of the pool", ["address"])
+connections_open = registry.gauge("medapp_mongo_pool_connections_open", "Connections currently open in the pool", ["address"])
+in_flight_dropped = registry.counter("medapp_mongo_in_flight_commands_dropped_total", "Commands in flight forgotten past MAX_IN_FLIGHT_COMMANDS")
+slow_commands = registry.counter("medapp_mongo_slow_commands_total", "Commands slower than MEDAPP_SLOW_QUERY_MS", ["command", "collection"])
+
+# Far more than the connections of a pool. Commands whose outcome is never published (e.g. their connection
+# went away) would otherwise stay in flight forever, past this the oldest ones are dropped.
+MAX_IN_FLIGHT_COMMANDS = 10_000
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+def _collection(event: monitoring.CommandStartedEvent) -> Optional[str]:
+    if event.command_name == "getMore":
+        return event.command.get("collection")
+    collection = event.command.get(event.command_name)
+    return collection if isinstance(collection, str) else None
+
+def _shape(value: Any) -> Any:
+    """The query with its values replaced by "?", slow query logs shouldn't leak patient data"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape(item) for item in value]
+    return "?"
+
+def _returned_documents(reply: dict) -> int:
+    if cursor := reply.get("cursor"):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] else 0
+    return 0
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records the latency of every command, by command name, adds it to the current request trace and logs
+    the commands slower than `SLOW_QUERY_MS`"""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT_COMMANDS):
+        # Collection and query of the commands in flight, by connection and request id, oldest first
+        self.in_flight: OrderedDict[tuple, tuple[Optional[str], Any]] = OrderedDict()
+        self.max_in_flight = max_in_flight
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        query = event.command.get("filter", event.command.get("pipeline", event.command.get("query")))
+        self.in_flight[(event.connection_id, event.request_id)] = (_collection(event), query)
+        if len(self.in_flight) > self.max_in_flight:
+            self.in_flight.popitem(last=False)
+            in_flight_dropped.inc()
+
+    def finished(self, event, documents: int, error: Optional[str] = None):
+        duration = event.duration_micros / 1_000_000
+        collection, query = self.in_flight.pop((event.connection_id, event.request_id), (None, None))
+        command_duration.observe(duration, event.command_name)
+        record_command(event.command_name, collection, duration, documents, error)
+        if SLOW_QUERY_MS and duration * 1000 >= SLOW_QUERY_MS:
+            slow_commands.inc(event.command_name, collection or "")
+            logger.warning(
+                "Slow MongoDB command %s on %s: %.1fms, %d documents, query %s",
+                event.command_name, collection, duration * 1000, documents, _shape(query),
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.finished(event, _returned_documents(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        command_failures.inc(event.command_name)
+        self.finished(event, 0, str(event.failure))
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Records connection pool usage: open and checked out connections, check out wait times and failures"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        connections_open.inc(_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        connections_open.dec(_address(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent):
+        checkout_failures.inc(_address(event), str(event.reason))
+        if (duration := getattr(event, "duration", None)) is not None:
+            checkout_wait.observe(duration, _address(event))
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent):
+        connections_in_use.inc(_address(event))
+        # `duration` (seconds since the check out started) is available from PyMongo 4.7
+        if (duration := getattr(event, "duration", None)) is not None:
+            checkout_wait.observe(duration, _address(event))
+
+    def connection_checked_in(self, event):
+        connections_in_use.dec(_address(event))
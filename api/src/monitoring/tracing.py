@@ -0,0 +1,320 @@
+"""
+Request tracing: every request gets a trace with a root span, child spans for the model operations and
+the Mongo commands they run, and per-request totals (queries, time in Mongo, documents returned,
+hydration and serialization time) recorded as Prometheus metrics.
+
+Spans follow the OpenTelemetry data model: recent traces are served as OTLP JSON on `GET /traces`, and
+with `MEDAPP_TRACING_OTEL` they are also exported through the OpenTelemetry SDK when it's installed.
+"""
+import functools
+import inspect
+import logging
+import re
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+
+from constants import TRACING_ENABLED, TRACING_BUFFER_SIZE, TRACING_OTEL, TRACING_MAX_SPANS
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+request_duration = registry.histogram("medapp_http_request_duration_seconds", "Duration of HTTP requests", ["method", "route", "status"])
+request_queries = registry.histogram(
+    "medapp_http_request_mongo_queries", "MongoDB commands run per request", ["route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+request_query_time = registry.histogram("medapp_http_request_mongo_seconds", "Time spent in MongoDB commands per request", ["route"])
+request_documents = registry.histogram(
+    "medapp_http_request_mongo_documents", "Documents returned by MongoDB per request", ["route"],
+    buckets=(0, 1, 10, 20, 50, 100, 500, 1000, 5000, 10000),
+)
+request_hydration_time = registry.histogram("medapp_http_request_hydration_seconds", "Time spent building models from documents per request", ["route"])
+request_serialization_time = registry.histogram(
+    "medapp_http_request_serialization_seconds", "Time from the endpoint returning to the response starting (validation, encoding, rendering)", ["route"],
+)
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+SPAN_KINDS = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    kind: str = "INTERNAL"
+    attributes: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def end(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+
+    def to_otlp(self) -> dict:
+        """The span in the OTLP JSON encoding"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+@dataclass
+class RequestTrace:
+    """Spans and Mongo totals of one request"""
+    root: Span
+    spans: List[Span] = field(default_factory=list)
+    queries: int = 0
+    query_seconds: float = 0
+    documents: int = 0
+    hydration_seconds: float = 0
+    serialization_seconds: float = 0
+    # perf_counter() when the endpoint returned, see `TracedRoute`
+    endpoint_returned: Optional[float] = None
+
+    def start_span(self, name: str, parent: Optional[Span] = None, kind: str = "INTERNAL", start_ns: Optional[int] = None, **attributes) -> Span:
+        span = Span(
+            name=name,
+            trace_id=self.root.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_span_id=(parent or self.root).span_id,
+            start_ns=start_ns or time.time_ns(),
+            kind=kind,
+            attributes=attributes,
+        )
+        # Streaming responses can run thousands of commands, totals are still recorded past the limit
+        if len(self.spans) < TRACING_MAX_SPANS:
+            self.spans.append(span)
+        return span
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("medapp_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("medapp_span", default=None)
+recent_traces: Deque[RequestTrace] = deque(maxlen=TRACING_BUFFER_SIZE)
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str, activate: bool = True, **attributes) -> Iterator[Optional[Span]]:
+    """Child span of the current one, a no-op outside of a traced request.
+
+    With `activate` the spans started inside the block are its children. Don't activate spans held
+    across the `yield` of an async generator: the generator may be closed from another context.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, parent=_current_span.get(), **attributes)
+    token = _current_span.set(current) if activate else None
+    try:
+        yield current
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        if token is not None:
+            _current_span.reset(token)
+        current.end()
+
+def traced(function: Callable) -> Callable:
+    """Trace a `MongoBase` method as a span named after the model and the method, e.g. `Slot.iter_by_query`"""
+    def span_name(owner) -> str:
+        model = owner if isinstance(owner, type) else type(owner)
+        return f"{model.__name__}.{function.__name__}"
+
+    if inspect.isasyncgenfunction(function):
+        @functools.wraps(function)
+        async def generator(owner, *args, **kwargs):
+            if _current_trace.get() is None:
+                async for item in function(owner, *args, **kwargs):
+                    yield item
+                return
+            with span(span_name(owner), activate=False) as current:
+                count = 0
+                try:
+                    async for item in function(owner, *args, **kwargs):
+                        count += 1
+                        yield item
+                finally:
+                    current.attributes["medapp.documents"] = count
+        return generator
+
+    @functools.wraps(function)
+    async def coroutine(owner, *args, **kwargs):
+        if _current_trace.get() is None:
+            return await function(owner, *args, **kwargs)
+        with span(span_name(owner)):
+            return await function(owner, *args, **kwargs)
+    return coroutine
+
+def record_command(command_name: str, collection: Optional[str], duration: float, documents: int, error: Optional[str] = None):
+    """Add a finished Mongo command to the current request, called by the command listener"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.queries += 1
+    trace.query_seconds += duration
+    trace.documents += documents
+    end_ns = time.time_ns()
+    command = trace.start_span(
+        f"mongo.{command_name}", parent=_current_span.get(), kind="CLIENT", start_ns=end_ns - int(duration * 1e9),
+        **{"db.system": "mongodb", "db.operation.name": command_name, "db.collection.name": collection or "", "medapp.documents": documents},
+    )
+    command.error = error
+    command.end(end_ns)
+
+def start_trace(method: str, path: str, traceparent: Optional[str]) -> RequestTrace:
+    trace_id, parent_span_id = secrets.token_hex(16), None
+    if traceparent and (match := TRACEPARENT.match(traceparent)):
+        trace_id, parent_span_id = match.groups()
+    root = Span(
+        name=f"{method} {path}",
+        trace_id=trace_id,
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent_span_id,
+        start_ns=time.time_ns(),
+        kind="SERVER",
+        attributes={"http.request.method": method},
+    )
+    return RequestTrace(root=root)
+
+def finish_trace(trace: RequestTrace, route: str, status: int):
+    root = trace.root
+    root.end()
+    root.name = f"{root.attributes['http.request.method']} {route}"
+    root.attributes.update({
+        "http.route": route,
+        "http.response.status_code": status,
+        "medapp.mongo.queries": trace.queries,
+        "medapp.mongo.duration_ms": trace.query_seconds * 1000,
+        "medapp.mongo.documents": trace.documents,
+        "medapp.hydration_ms": trace.hydration_seconds * 1000,
+        "medapp.serialization_ms": trace.serialization_seconds * 1000,
+    })
+
+    request_duration.observe((root.end_ns - root.start_ns) / 1e9, root.attributes["http.request.method"], route, str(status))
+    request_queries.observe(trace.queries, route)
+    request_query_time.observe(trace.query_seconds, route)
+    request_documents.observe(trace.documents, route)
+    request_hydration_time.observe(trace.hydration_seconds, route)
+    request_serialization_time.observe(trace.serialization_seconds, route)
+
+    recent_traces.append(trace)
+    if TRACING_OTEL:
+        _export_otel(trace)
+
+def otlp_traces() -> dict:
+    """The recent traces as an OTLP JSON `ExportTraceServiceRequest`"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "medapp-api"}}]},
+        "scopeSpans": [{
+            "scope": {"name": __name__},
+            "spans": [span.to_otlp() for trace in list(recent_traces) for span in (trace.root, *trace.spans)],
+        }],
+    }]}
+
+_otel_missing = False
+
+def _export_otel(trace: RequestTrace):
+    """Replay the finished trace through the OpenTelemetry API, the configured SDK exports it"""
+    global _otel_missing
+    if _otel_missing:
+        return
+    try:
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+    except ImportError:
+        _otel_missing = True
+        logger.warning("MEDAPP_TRACING_OTEL is set but opentelemetry isn't installed, traces are only kept in memory")
+        return
+
+    tracer = otel_trace.get_tracer(__name__)
+    kinds = {"INTERNAL": SpanKind.INTERNAL, "SERVER": SpanKind.SERVER, "CLIENT": SpanKind.CLIENT}
+    contexts = {}
+    # Parents always start before their children
+    for recorded in sorted((trace.root, *trace.spans), key=lambda recorded: recorded.start_ns):
+        parent = contexts.get(recorded.parent_span_id)
+        exported = tracer.start_span(recorded.name, context=parent, kind=kinds[recorded.kind], attributes=recorded.attributes, start_time=recorded.start_ns)
+        if recorded.error:
+            exported.set_status(Status(StatusCode.ERROR, recorded.error))
+        exported.end(end_time=recorded.end_ns)
+        contexts[recorded.span_id] = otel_trace.set_span_in_context(exported)
+
+class TracingMiddleware:
+    """ASGI middleware tracing every HTTP request, except the paths starting with one of `exclude`"""
+
+    def __init__(self, app, exclude: tuple[str, ...] = ("/health", "/metrics", "/traces", "/mcp")):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED or scope["path"].startswith(self.exclude):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        trace = start_trace(scope["method"], scope["path"], traceparent)
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace.endpoint_returned is not None:
+                    trace.serialization_seconds += time.perf_counter() - trace.endpoint_returned
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            trace.root.error = repr(e)
+            raise
+        finally:
+            _current_trace.reset(token)
+            # Label by route template, not by path, to keep the metrics' cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            finish_trace(trace, route, status)
+
+class TracedRoute(APIRoute):
+    """Route recording when its endpoint returns: until the response starts, the time goes to
+    serializing the result (response model validation, encoding and rendering)"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            super().__init__(path, endpoint, **kwargs)
+            return
+
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if trace := _current_trace.get():
+                    trace.endpoint_returned = time.perf_counter()
+        super().__init__(path, timed_endpoint, **kwargs)
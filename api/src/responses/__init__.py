@@ -2,6 +2,14 @@ from .slot_response import SlotResponse
 from .professional_response import ProfessionalResponse
 from .patient_response import PatientResponse
 from .appointment_response import AppointmentResponse
+from .day_availability_response import DayAvailabilityResponse
+from .appointment_batch_item_response import AppointmentBatchItemResponse
 from .create_appointment_dto import CreateAppointmentDto
+from .create_appointments_batch_dto import CreateAppointmentsBatchDto
+from .hold_slot_dto import HoldSlotDto
+from .slot_hold_response import SlotHoldResponse
+from .page import Page, encode_cursor, decode_cursor
+from .ndjson import NDJSON_MEDIA_TYPE, accepts_ndjson, ndjson_response
+from .json_response import json_response
 
-__all__ = ["SlotResponse", "ProfessionalResponse", "PatientResponse", "AppointmentResponse", "CreateAppointmentDto"] 
+__all__ = ["SlotResponse", "ProfessionalResponse", "PatientResponse", "AppointmentResponse", "DayAvailabilityResponse", "AppointmentBatchItemResponse", "CreateAppointmentDto", "CreateAppointmentsBatchDto", "HoldSlotDto", "SlotHoldResponse", "Page", "encode_cursor", "decode_cursor", "NDJSON_MEDIA_TYPE", "accepts_ndjson", "ndjson_response", "json_response"] 
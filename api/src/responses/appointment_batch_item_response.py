@@ -0,0 +1,25 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from .appointment_response import AppointmentResponse
+from .create_appointment_dto import CreateAppointmentDto
+
+class AppointmentBatchItemResponse(BaseModel):
+    """
+    A response model for one appointment of a batch, created or not.
+    """
+
+    patient_id: str = Field(..., description="The ID of the patient of the requested appointment")
+    slot_id: str = Field(..., description="The ID of the slot of the requested appointment")
+    status_code: int = Field(..., description="The HTTP status `create_appointment` would have answered for this appointment")
+    appointment: Optional[AppointmentResponse] = Field(default=None, description="The created appointment, when it succeeded")
+    error: Optional[str] = Field(default=None, description="Why the appointment wasn't created, when it failed")
+
+    @classmethod
+    def success(cls, item: CreateAppointmentDto, appointment: AppointmentResponse):
+        return cls(patient_id=str(item.patient_id), slot_id=str(item.slot_id), status_code=200, appointment=appointment)
+
+    @classmethod
+    def failure(cls, item: CreateAppointmentDto, status_code: int, error: str):
+        return cls(patient_id=str(item.patient_id), slot_id=str(item.slot_id), status_code=status_code, error=error)
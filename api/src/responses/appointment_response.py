@@ -1,22 +1,6 @@
-from datetime import datetime
 from pydantic import BaseModel, Field
 from pydantic_extra_types.mongo_object_id import MongoObjectId
-from models import Appointment, Slot, Professional, Patient, MedicalSpecialization
-
-class ProfessionalSummary(BaseModel):
-    id: MongoObjectId = Field(..., description="The ID of the professional")
-    name: str = Field(..., description="The name of the professional")
-    specialization: MedicalSpecialization = Field(..., description="The specialization of the professional")
-
-class PatientSummary(BaseModel):
-    id: MongoObjectId = Field(..., description="The ID of the patient")
-    name: str = Field(..., description="The name of the patient")
-    national_id: str = Field(..., description="The national ID of the patient")
-
-class SlotSummary(BaseModel):
-    id: MongoObjectId = Field(..., description="The ID of the slot")
-    start_time: datetime = Field(..., description="The start time of the slot")
-    end_time: datetime = Field(..., description="The end time of the slot")
+from models import Appointment, PatientSummary, SlotSummary, ProfessionalSummary
 
 class AppointmentResponse(BaseModel):
     id: MongoObjectId = Field(..., description="The ID of the appointment")
@@ -36,22 +20,11 @@ class AppointmentResponse(BaseModel):
     }
     
     @classmethod
-    def create(cls, appointment: Appointment, patient: Patient, slot: Slot, professional: Professional):
-        return cls(
+    def create(cls, appointment: Appointment):
+        """Built from the snapshots embedded in the appointment, without any lookup"""
+        return cls.model_construct(
             id=appointment.id,
-            patient=PatientSummary(
-                id=appointment.patient_id,
-                name=patient.name,
-                national_id=patient.national_id
-            ),
-            slot=SlotSummary(
-                id=appointment.slot_id,
-                start_time=slot.start_time,
-                end_time=slot.end_time
-            ),
-            professional=ProfessionalSummary(
-                id=professional.id,
-                name=professional.name,
-                specialization=professional.specialization
-            )
+            patient=appointment.patient,
+            slot=appointment.slot,
+            professional=appointment.professional
         )
@@ -0,0 +1,25 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from constants import MAX_APPOINTMENTS_BATCH_SIZE
+from .create_appointment_dto import CreateAppointmentDto
+
+class CreateAppointmentsBatchDto(BaseModel):
+    appointments: List[CreateAppointmentDto] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_APPOINTMENTS_BATCH_SIZE,
+        description=f"The appointments to create, at most {MAX_APPOINTMENTS_BATCH_SIZE}",
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "appointments": [
+                    {"patient_id": "507f1f77bcf86cd799439011", "slot_id": "665656565656565656565656"},
+                    {"patient_id": "507f1f77bcf86cd799439012", "slot_id": "665656565656565656565657"}
+                ]
+            }
+        }
+    }
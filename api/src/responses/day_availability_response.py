@@ -0,0 +1,29 @@
+from datetime import date
+
+from pydantic import BaseModel, Field
+
+class DayAvailabilityResponse(BaseModel):
+    """
+    A response model for the availability of a specialization on a day.
+    """
+
+    day: date = Field(..., description="The UTC day")
+    free_slots: int = Field(..., description="The number of free slots of the specialization that day")
+    professionals: int = Field(..., description="The number of professionals with free slots that day")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "day": "2024-03-20",
+                "free_slots": 42,
+                "professionals": 5
+            }
+        }
+    }
+
+    @classmethod
+    def create(cls, document: dict):
+        return cls.model_construct(
+            day=date.fromisoformat(document["day"]),
+            free_slots=document["free_slots"],
+            professionals=document["professionals"])
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from pydantic_extra_types.mongo_object_id import MongoObjectId
+
+class HoldSlotDto(BaseModel):
+    patient_id: MongoObjectId = Field(..., description="The ID of the patient to hold the slot for")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "patient_id": "507f1f77bcf86cd799439011"
+            }
+        }
+    }
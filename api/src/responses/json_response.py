@@ -0,0 +1,26 @@
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from monitoring import current_trace
+
+@lru_cache(maxsize=None)
+def _adapter(type_: Any) -> TypeAdapter:
+    return TypeAdapter(type_)
+
+def json_response(content: Any, type_: Optional[Any] = None, by_alias: bool = True) -> Response:
+    """
+    Serialize `content` to JSON in a single pass with pydantic-core, as an instance of `type_` (by default its own type).
+
+    Returning it from an endpoint skips FastAPI's response model handling, which validates the result again
+    and goes through `jsonable_encoder`. The route's `response_model` still documents the schema, so `content`
+    must already match it: the output is the same as FastAPI's for the same model.
+    """
+    start = time.perf_counter()
+    body = _adapter(type_ or type(content)).dump_json(content, by_alias=by_alias)
+    if trace := current_trace():
+        trace.serialization_seconds += time.perf_counter() - start
+    return Response(body, media_type="application/json")
@@ -0,0 +1,22 @@
+from typing import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def accepts_ndjson(request: Request) -> bool:
+    """Whether the client asked for a streamed NDJSON response with `Accept: application/x-ndjson`"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def ndjson_response(items: AsyncIterator[BaseModel], by_alias: bool = True) -> StreamingResponse:
+    """
+    Stream models as newline-delimited JSON, one model per line.
+    Items are serialized as they come out of the iterator, so memory stays constant whatever the size of the result.
+    """
+    async def lines() -> AsyncIterator[str]:
+        async for item in items:
+            yield item.model_dump_json(by_alias=by_alias) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,30 @@
+import base64
+import json
+from datetime import datetime
+from typing import Generic, List, Optional, TypeVar
+
+from bson.objectid import ObjectId
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """
+    A page of results, sorted by start time.
+    """
+
+    items: List[T] = Field(..., description="The results in this page")
+    next_cursor: Optional[str] = Field(None, description="Pass it as `cursor` to get the next page, null when there are no more results")
+
+def encode_cursor(start_time: datetime, id: ObjectId) -> str:
+    """Encode the (start_time, _id) of the last item of a page as an opaque cursor token"""
+    payload = json.dumps({"start_time": start_time.isoformat(), "id": str(id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """Decode a cursor token, raises ValueError if it's malformed"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["start_time"]), ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
@@ -23,7 +23,9 @@ class ProfessionalResponse(BaseModel):
 
     @classmethod
     def from_professional(cls, professional: Professional):
-        return cls(
+        # Not validated: built from a valid model, and fast JSON responses (FAST_JSON_RESPONSES) are serialized
+        # without FastAPI validating them against `response_model`
+        return cls.model_construct(
             id=str(professional.id),
             name=professional.name,
             specialization=professional.specialization.value)
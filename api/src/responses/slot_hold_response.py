@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+from models.slot_hold import SlotHold
+
+class SlotHoldResponse(BaseModel):
+    """
+    A response model for a slot held for a patient.
+    """
+
+    slot_id: str = Field(..., description="The ID of the held slot")
+    patient_id: str = Field(..., description="The ID of the patient holding the slot")
+    expires_at: datetime = Field(..., description="When the hold is released, book the slot before it")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "slot_id": "665656565656565656565656",
+                "patient_id": "507f1f77bcf86cd799439011",
+                "expires_at": "2024-03-20T09:05:00Z"
+            }
+        }
+    }
+
+    @classmethod
+    def create(cls, hold: SlotHold):
+        return cls(
+            slot_id=str(hold.id),
+            patient_id=str(hold.patient_id),
+            expires_at=hold.expires_at)
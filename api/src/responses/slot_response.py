@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, List, Optional
 
 from models.professional import Professional
 from models.slot import Slot
@@ -35,11 +35,25 @@ class SlotResponse(BaseModel):
     }
     
     @classmethod
-    def create(cls, slot: Slot, professional: Professional):
-        return cls(
+    def create(cls, slot: Slot, professional: Professional, professionals: Optional[dict[str, ProfessionalResponse]] = None):
+        """
+        Build the response of a slot from models that are already valid, without validating them again.
+        Pass the same `professionals` dict to several calls to share one `ProfessionalResponse` per professional.
+        """
+        if professionals is None:
+            professional_response = ProfessionalResponse.from_professional(professional)
+        elif (professional_response := professionals.get(str(professional.id))) is None:
+            professional_response = professionals[str(professional.id)] = ProfessionalResponse.from_professional(professional)
+        return cls.model_construct(
             id=str(slot.id),
-            professional=ProfessionalResponse.from_professional(professional),
+            professional=professional_response,
             start_time=slot.start_time,
             end_time=slot.end_time,
             is_booked=slot.is_booked,
         )
+
+    @classmethod
+    def create_many(cls, results: Iterable[tuple[Slot, Professional]]) -> List["SlotResponse"]:
+        """Responses of (slot, professional) pairs, the slots of a professional share its `ProfessionalResponse`"""
+        professionals: dict[str, ProfessionalResponse] = {}
+        return [cls.create(slot, professional, professionals) for slot, professional in results]
@@ -0,0 +1,27 @@
+"""
+Fills in the patient, slot and professional snapshots of the appointments booked before they were embedded.
+Idempotent: it only touches appointments missing a snapshot.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.backfill_appointment_summaries
+"""
+import asyncio
+
+from ..config.database import Database
+from ..models import Appointment
+
+async def backfill_appointment_summaries():
+    await Database.connect_db()
+    try:
+        db = Database.get_db()
+        await Appointment.ensure_indexes(db)
+        missing = {"$or": [{"patient": None}, {"slot": None}, {"professional": None}]}
+        before = await db[Appointment.get_collection_name()].count_documents(missing)
+        await Appointment.backfill_summaries(db)
+        after = await db[Appointment.get_collection_name()].count_documents(missing)
+        print(f"Filled in the snapshots of {before - after} appointments, {after} left without (missing patient, slot or professional)")
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_appointment_summaries())
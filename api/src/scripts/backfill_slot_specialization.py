@@ -0,0 +1,30 @@
+"""
+Copies each professional's specialization onto their slots, for slots created before the
+`specialization` field was denormalized. Idempotent: it only touches slots that are out of sync.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.backfill_slot_specialization
+"""
+import asyncio
+
+from ..config.database import Database
+from ..models import Professional, Slot
+
+async def backfill_slot_specialization():
+    await Database.connect_db()
+    try:
+        db = Database.get_db()
+        slots = db[Slot.get_collection_name()]
+        updated = 0
+        for professional in await Professional.get_all(db):
+            result = await slots.update_many(
+                {"professional_id": professional.id, "specialization": {"$ne": professional.specialization.value}},
+                {"$set": {"specialization": professional.specialization.value}}
+            )
+            updated += result.modified_count
+        print(f"Updated the specialization of {updated} slots")
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_slot_specialization())
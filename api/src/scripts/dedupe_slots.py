@@ -0,0 +1,62 @@
+"""
+Deletes duplicated slots (same professional and start time) and creates the `professional_start_time_unique`
+index, which can't be built while duplicates exist. Of each group of duplicates it keeps the booked slot, or
+the oldest one when none is booked. Groups with several booked slots are reported and left alone: each of them
+has an appointment, fix them by hand and run the script again.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.dedupe_slots [--dry-run]
+
+Then rebuild the availability summary, which still counts the deleted free slots.
+"""
+import argparse
+import asyncio
+
+from ..config.database import Database
+from ..models import Slot
+
+async def dedupe_slots(dry_run: bool = False):
+    await Database.connect_db()
+    try:
+        db = Database.get_db()
+        slots = db[Slot.get_collection_name()]
+        duplicates = await slots.aggregate([
+            {"$sort": {"_id": 1}},
+            {"$group": {
+                "_id": {"professional_id": "$professional_id", "start_time": "$start_time"},
+                "slots": {"$push": {"_id": "$_id", "is_booked": "$is_booked"}},
+                "count": {"$sum": 1},
+            }},
+            {"$match": {"count": {"$gt": 1}}},
+        ], allowDiskUse=True)
+
+        to_delete, conflicts = [], 0
+        async for group in duplicates:
+            booked = [slot["_id"] for slot in group["slots"] if slot.get("is_booked")]
+            if len(booked) > 1:
+                conflicts += 1
+                print(f"Skipping {group['_id']}: {len(booked)} booked slots {booked}")
+                continue
+            keep = booked[0] if booked else group["slots"][0]["_id"]
+            to_delete += [slot["_id"] for slot in group["slots"] if slot["_id"] != keep]
+
+        if dry_run:
+            print(f"Would delete {len(to_delete)} duplicated slots, {conflicts} groups need fixing by hand")
+            return
+        if to_delete:
+            # Only free slots are deleted: a slot booked since the scan is kept
+            result = await slots.delete_many({"_id": {"$in": to_delete}, "is_booked": {"$ne": True}})
+            print(f"Deleted {result.deleted_count} duplicated slots")
+        if conflicts:
+            print(f"{conflicts} groups need fixing by hand, the unique index wasn't created")
+            return
+        await Slot.ensure_indexes(db)
+        print("Created the slot indexes")
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete duplicated slots and create the unique slot index")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the duplicated slots")
+    args = parser.parse_args()
+    asyncio.run(dedupe_slots(args.dry_run))
@@ -0,0 +1,89 @@
+"""
+Prints the `explain()` plan of the queries run by the API endpoints.
+Exits with status 1 if any of them falls back to a collection scan (COLLSCAN), so it can run in CI.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.explain_queries [--verbose]
+"""
+import asyncio
+from datetime import timedelta
+import json
+import sys
+from typing import Any, Iterator, List, Optional
+
+from ..config.database import Database
+from ..models import Patient, Professional, Slot, Appointment
+from ..models.datetime_utils import utc_now
+
+def iter_stages(plan: Any) -> Iterator[str]:
+    """Yield every stage name in an explain plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from iter_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from iter_stages(value)
+
+async def explain(db, name: str, model, query: dict, sort: Optional[List[tuple[str, int]]] = None, verbose: bool = False) -> bool:
+    cursor = db[model.get_collection_name()].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    plan = await cursor.explain()
+    winning_plan = plan["queryPlanner"]["winningPlan"]
+    stages = list(iter_stages(winning_plan))
+
+    ok = "COLLSCAN" not in stages
+    print(f"[{'OK' if ok else 'COLLSCAN'}] {name}: {' <- '.join(stages)}")
+    if verbose:
+        print(json.dumps(winning_plan, indent=2, default=str))
+    return ok
+
+async def explain_queries(verbose: bool = False) -> bool:
+    await Database.connect_db()
+    try:
+        await Database.ensure_indexes([Patient, Professional, Slot, Appointment])
+        db = Database.get_db()
+
+        professional = await Professional.get_one_by_query(db, {})
+        patient = await Patient.get_one_by_query(db, {})
+        if not professional or not patient:
+            print("The database is empty, seed it first")
+            return False
+
+        start = utc_now()
+        end = start + timedelta(days=30)
+
+        results = [
+            await explain(db, "get_time_slots_by_specialization", Slot, {
+                "specialization": professional.specialization.value,
+                "is_booked": False,
+                **Slot.start_time_filter(gte=start, lte=end)
+            }, sort=[("start_time", 1)], verbose=verbose),
+            await explain(db, "professionals by specialization", Professional, {
+                "specialization": professional.specialization.value
+            }, verbose=verbose),
+            await explain(db, "get_time_slots", Slot, {
+                "professional_id": professional.id,
+                "is_booked": False,
+                **Slot.start_time_filter(gte=start)
+            }, sort=[("start_time", 1)], verbose=verbose),
+            await explain(db, "get_patient_by_national_id", Patient, {
+                "national_id": patient.national_id
+            }, verbose=verbose),
+            await explain(db, "get_patient_appointments", Appointment, {
+                "patient_id": patient.id,
+                "slot.start_time": {"$gte": start}
+            }, sort=[("slot.start_time", 1), ("_id", 1)], verbose=verbose),
+            await explain(db, "get_professional_appointments", Appointment, {
+                "professional.id": professional.id,
+                "slot.start_time": {"$gte": start}
+            }, sort=[("slot.start_time", 1), ("_id", 1)], verbose=verbose),
+        ]
+        return all(results)
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(explain_queries(verbose="--verbose" in sys.argv)) else 1)
@@ -0,0 +1,56 @@
+"""
+Generates slots from the professionals' schedules, for the given number of days from a start day.
+Slots that already exist are left untouched, so it's safe to re-run over overlapping days.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.generate_slots [--start 2024-03-20] [--days 90] [--professional ID]
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from bson.objectid import ObjectId
+
+from ..config.database import Database
+from ..models import Professional, Slot
+from ..models.datetime_utils import utc_now
+
+DEFAULT_DAYS = 90
+# Professionals whose slots are generated at the same time
+CONCURRENCY = 8
+
+async def generate_slots(start: date, days: int, professional_id: str | None, chunk_size: int):
+    await Database.connect_db()
+    try:
+        db = Database.get_db()
+        await Slot.ensure_indexes(db)
+
+        query = {"schedule": {"$ne": None}}
+        if professional_id:
+            query = {"_id": ObjectId(professional_id)}
+        professionals = await Professional.get_many_by_query(db, query)
+        end = start + timedelta(days=days - 1)
+        print(f"Generating slots from {start} to {end} for {len(professionals)} professionals...")
+
+        began = time.perf_counter()
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def generate(professional: Professional) -> int:
+            async with semaphore:
+                return await Slot.generate_from_schedule(db, professional, start, end, chunk_size=chunk_size)
+
+        created = sum(await asyncio.gather(*[generate(professional) for professional in professionals]))
+        elapsed = time.perf_counter() - began
+        print(f"Created {created} slots in {elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f} slots/s)")
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, default=utc_now().date(), help="First day, defaults to today")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--professional", help="Only generate the slots of this professional")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Slots per bulk write")
+    args = parser.parse_args()
+    asyncio.run(generate_slots(args.start, args.days, args.professional, args.chunk_size))
@@ -0,0 +1,78 @@
+"""
+Migrates slot `start_time`/`end_time` from legacy ISO strings to native BSON dates (UTC).
+
+The legacy strings hold the naive local time of the server that wrote them: pass its IANA timezone with
+`--timezone`, the same as MEDAPP_SLOT_TIMES_LEGACY_TIMEZONE. Strings with an explicit offset keep it.
+
+It only selects documents that still hold a string, so it's safe to interrupt and re-run:
+each run resumes where the previous one stopped. Keep MEDAPP_SLOT_TIMES_DUAL_READ enabled on the API
+until this script reports nothing left to migrate.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.migrate_slot_times --timezone America/Argentina/Buenos_Aires [--batch-size N] [--dry-run]
+"""
+import argparse
+import asyncio
+from datetime import datetime, tzinfo
+from zoneinfo import ZoneInfo
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+from ..config.database import Database
+from ..models import Slot
+from ..models.datetime_utils import parse_legacy_time, to_utc
+
+DEFAULT_BATCH_SIZE = 1000
+
+LEGACY_QUERY = {"$or": [
+    {"start_time": {"$type": "string"}},
+    {"end_time": {"$type": "string"}},
+]}
+
+def to_date(value, timezone: tzinfo) -> datetime:
+    if isinstance(value, str):
+        return parse_legacy_time(value, timezone)
+    return to_utc(value)
+
+async def migrate_slot_times(timezone: tzinfo, batch_size: int, dry_run: bool = False):
+    await Database.connect_db()
+    try:
+        collection = Database.get_db()[Slot.get_collection_name()]
+        remaining = await collection.count_documents(LEGACY_QUERY)
+        print(f"{remaining} slots to migrate")
+        if dry_run or not remaining:
+            return
+
+        migrated = 0
+        last_id: ObjectId | None = None
+        while True:
+            query = LEGACY_QUERY if last_id is None else {"$and": [LEGACY_QUERY, {"_id": {"$gt": last_id}}]}
+            cursor = collection.find(query, {"start_time": 1, "end_time": 1}).sort("_id", 1).limit(batch_size)
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                break
+
+            await collection.bulk_write([
+                UpdateOne({"_id": document["_id"]}, {"$set": {
+                    "start_time": to_date(document["start_time"], timezone),
+                    "end_time": to_date(document["end_time"], timezone),
+                }})
+                for document in batch
+            ], ordered=False)
+
+            migrated += len(batch)
+            last_id = batch[-1]["_id"]
+            print(f"Migrated {migrated}/{remaining} slots (last _id: {last_id})")
+
+        print(f"Done, {await collection.count_documents(LEGACY_QUERY)} slots left with string times")
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timezone", type=ZoneInfo, required=True, help="IANA timezone the legacy strings were written in, e.g. UTC")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the slots left to migrate")
+    args = parser.parse_args()
+    asyncio.run(migrate_slot_times(args.timezone, args.batch_size, args.dry_run))
@@ -0,0 +1,41 @@
+"""
+Rebuilds the availability summary (free and total slots per professional and day) from the slots, or from the
+schedules in lazy mode. Bookings and slot writes keep it up to date, run it periodically to fix any drift,
+e.g. after slots were written to the database directly.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.rebuild_availability_summary [--start 2024-03-20] [--days 90] [--professional ID]
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from bson.objectid import ObjectId
+
+from ..config.database import Database
+from ..constants import AVAILABILITY_SUMMARY_DAYS
+from ..models import AvailabilitySummary
+from ..models.datetime_utils import utc_now
+
+async def rebuild_availability_summary(start: date, days: int, professional_id: str | None):
+    await Database.connect_db()
+    try:
+        db = Database.get_db()
+        await AvailabilitySummary.ensure_indexes(db)
+
+        end = start + timedelta(days=days - 1)
+        print(f"Rebuilding the availability summary from {start} to {end}...")
+        began = time.perf_counter()
+        written = await AvailabilitySummary.rebuild(db, start, end, [ObjectId(professional_id)] if professional_id else None)
+        print(f"Wrote {written} summaries in {time.perf_counter() - began:.1f}s")
+    finally:
+        await Database.close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, default=utc_now().date(), help="First day, defaults to today")
+    parser.add_argument("--days", type=int, default=AVAILABILITY_SUMMARY_DAYS)
+    parser.add_argument("--professional", help="Only rebuild the summary of this professional")
+    args = parser.parse_args()
+    asyncio.run(rebuild_availability_summary(args.start, args.days, args.professional))
@@ -1,123 +1,212 @@
+"""
+Seeds the database with random patients, professionals, slots and appointments.
+
+Data is generated in a process pool and streamed into MongoDB with batched, unordered bulk inserts.
+The same flags always produce the same dataset (IDs included), so benchmark runs are comparable.
+Slots start on a fixed date by default, pass `--start-date` to get slots closer to today.
+
+Usage:
+    PYTHONPATH=src poetry run python -m src.scripts.seed_database [--patients 50] [--professionals 10] [--slots 100] ...
+"""
+import argparse
 import asyncio
-from datetime import timedelta
-from faker import Faker
-import random
-from typing import List
-import sys
 import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, UTC
+from typing import Awaitable, Callable, Iterable, List
 
-from ..config.database import Database
-from ..models import Patient, Professional, MedicalSpecialization, Slot, Appointment
+from bson.objectid import ObjectId
+from faker import Faker
 
-Faker.seed(12345)
+from ..config.database import Database
+from ..models import Patient, Professional, MedicalSpecialization, Slot, Appointment, AvailabilitySummary
 
 NUM_PATIENTS = 50
 NUM_PROFESSIONALS = 10
 NUM_SLOTS = 100
-NUM_APPOINTMENTS = 10
+HORIZON_DAYS = 30
+BOOKING_RATIO = 0.1
+SEED = 12345
+START_DATE = date(2030, 1, 1)
 
-async def generate_random_patients(count: int) -> List[Patient]:
-    fake = Faker()
-    patients = []
-    
-    for _ in range(count):
-        patient = Patient(
-            name=fake.name(),
-            national_id=str(random.randint(100000000, 999999999)),  # 9-digit number
-            phone_number=fake.phone_number(),
-            email=fake.email()
-        )
-        patients.append(patient)
-    
-    return patients
-
-async def generate_random_professionals(count: int) -> List[Professional]:
+SLOT_MINUTES = 30
+PATIENTS_PER_TASK = 10_000
+PROFESSIONALS_PER_TASK = 50
+INSERT_BATCH_SIZE = 5_000
+
+# First byte after the timestamp of the generated IDs, so IDs of different collections never collide
+PATIENT_KIND, PROFESSIONAL_KIND, SLOT_KIND, APPOINTMENT_KIND = 1, 2, 3, 4
+
+def seed_object_id(epoch: int, kind: int, index: int) -> ObjectId:
+    """Deterministic ObjectId: a fixed timestamp, the kind of document and its index"""
+    return ObjectId(epoch.to_bytes(4, "big") + kind.to_bytes(1, "big") + index.to_bytes(7, "big"))
+
+def generate_patients(seed: int, epoch: int, start_index: int, count: int) -> List[dict]:
     fake = Faker()
-    professionals = []
-    
-    for _ in range(count):
-        professional = Professional(
-            name=fake.name(),
-            specialization=random.choice(list(MedicalSpecialization))
-        )
-        professionals.append(professional)
-    
-    return professionals
-
-async def generate_random_slots(count: int, professionals: List[Professional]) -> List[Slot]:
+    fake.seed_instance(seed * 1_000_003 + start_index)
+    return [{
+        "_id": seed_object_id(epoch, PATIENT_KIND, index),
+        "created_at": epoch,
+        "updated_at": epoch,
+        "name": fake.name(),
+        "national_id": str(100_000_000 + index),
+        "phone_number": fake.phone_number(),
+        "email": fake.email(),
+    } for index in range(start_index, start_index + count)]
+
+def generate_professionals(seed: int, epoch: int, count: int) -> List[dict]:
     fake = Faker()
-    slots = []
-        
-    for _ in range(count):
-        start_time = fake.date_time_between(start_date='+1d', end_date='+30d')
-        end_time = start_time + timedelta(minutes=30)
-
-        slot = Slot(
-            start_time=start_time,
-            end_time=end_time,
-            professional_id=random.choice(professionals).id,
-            is_booked=random.choice([True, False])
-        )
-        slots.append(slot)
-
-    return slots
-
-async def generate_random_appointments(db, count: int, slots: List[Slot], patients: List[Patient]) -> List[Appointment]:
-    appointments = []
-    
-    for _ in range(count):
-        slot = random.choice(slots)
-        while slot.is_booked:
-            slot = random.choice(slots)
-        
-        slot.is_booked = True
-        await slot.save(db)
-        
-        appointment = Appointment(
-            patient_id=random.choice(patients).id,
-            slot_id=random.choice(slots).id
-        )
-        appointments.append(appointment)
-    
-    return appointments
-
-async def seed_database():
-    print(f"Connecting to database...")
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    specializations = list(MedicalSpecialization)
+    return [{
+        "_id": seed_object_id(epoch, PROFESSIONAL_KIND, index),
+        "created_at": epoch,
+        "updated_at": epoch,
+        "name": fake.name(),
+        "specialization": rng.choice(specializations).value,
+    } for index in range(count)]
+
+def professional_slots(professional_index: int, total_slots: int, num_professionals: int) -> tuple[int, int]:
+    """
+    (index of the first slot, number of slots) of a professional when `total_slots` are spread between
+    `num_professionals`: the first `total_slots % num_professionals` professionals get one more slot.
+    """
+    per_professional, remainder = divmod(total_slots, num_professionals)
+    return professional_index * per_professional + min(professional_index, remainder), per_professional + (professional_index < remainder)
+
+def generate_slots_and_appointments(
+    seed: int,
+    epoch: int,
+    professionals: List[tuple[int, ObjectId, str]],
+    total_slots: int,
+    num_professionals: int,
+    start_date: date,
+    horizon_days: int,
+    booking_ratio: float,
+    num_patients: int,
+) -> tuple[List[dict], List[dict]]:
+    """
+    Slots of the given (index, id, specialization) professionals, their share of `total_slots` (see `professional_slots`),
+    on a 30-minute grid without duplicate start times per professional. A `booking_ratio` of them are booked, each with its appointment.
+    """
+    slots, appointments = [], []
+    first_start = datetime.combine(start_date, datetime.min.time(), UTC)
+    grid_size = horizon_days * 24 * 60 // SLOT_MINUTES
+    for professional_index, professional_id, specialization in professionals:
+        rng = random.Random(seed * 1_000_003 + professional_index)
+        first_index, count = professional_slots(professional_index, total_slots, num_professionals)
+        positions = sorted(rng.sample(range(grid_size), min(count, grid_size)))
+        for i, position in enumerate(positions):
+            index = first_index + i
+            start_time = first_start + timedelta(minutes=SLOT_MINUTES * position)
+            is_booked = rng.random() < booking_ratio
+            slot_id = seed_object_id(epoch, SLOT_KIND, index)
+            slots.append({
+                "_id": slot_id,
+                "created_at": epoch,
+                "updated_at": epoch,
+                "start_time": start_time,
+                "end_time": start_time + timedelta(minutes=SLOT_MINUTES),
+                "professional_id": professional_id,
+                "specialization": specialization,
+                "is_booked": is_booked,
+            })
+            if is_booked and num_patients:
+                appointments.append({
+                    "_id": seed_object_id(epoch, APPOINTMENT_KIND, index),
+                    "created_at": epoch,
+                    "updated_at": epoch,
+                    "patient_id": seed_object_id(epoch, PATIENT_KIND, rng.randrange(num_patients)),
+                    "slot_id": slot_id,
+                })
+    return slots, appointments
+
+async def insert_batches(collection, documents: List[dict]) -> int:
+    for offset in range(0, len(documents), INSERT_BATCH_SIZE):
+        await collection.insert_many(documents[offset:offset + INSERT_BATCH_SIZE], ordered=False)
+    return len(documents)
+
+async def run_in_pool(executor: ProcessPoolExecutor, window: int, tasks: Iterable[tuple], handle: Callable[[object], Awaitable[None]]):
+    """Run `(function, *args)` tasks in the pool with at most `window` pending, handling results in order"""
+    loop = asyncio.get_running_loop()
+    pending: List[asyncio.Future] = []
+    for function, *args in tasks:
+        pending.append(loop.run_in_executor(executor, function, *args))
+        if len(pending) >= window:
+            await handle(await pending.pop(0))
+    for future in pending:
+        await handle(await future)
+
+async def seed_database(args: argparse.Namespace):
+    epoch = int(datetime.combine(args.start_date, datetime.min.time(), UTC).timestamp())
+    print("Connecting to database...")
     await Database.connect_db()
-    
+    began = time.perf_counter()
+
     try:
         db = Database.get_db()
-        print(f"Generating {NUM_PATIENTS} random patients...")
-        patients = await generate_random_patients(NUM_PATIENTS)
-        
-        print("Inserting patients into database...")
-        result = await Patient.insert_many(db, patients)
-        print(f"Successfully inserted {len(result.inserted_ids)} patients!")
-
-        print(f"Generating {NUM_PROFESSIONALS} random professionals...")
-        professionals = await generate_random_professionals(NUM_PROFESSIONALS)
-        
-        print("Inserting professionals into database...")
-        result = await Professional.insert_many(db, professionals)
-        print(f"Successfully inserted {len(result.inserted_ids)} professionals!")
- 
-        print(f"Generating {NUM_SLOTS} random slots...")
-        slots = await generate_random_slots(NUM_SLOTS, professionals)
-        
-        print("Inserting slots into database...")
-        result = await Slot.insert_many(db, slots)
-        print(f"Successfully inserted {len(result.inserted_ids)} slots!")
-
-        print(f"Generating {NUM_APPOINTMENTS} random appointments...")
-        appointments = await generate_random_appointments(db, NUM_APPOINTMENTS, slots, patients)
-        
-        print("Inserting appointments into database...")
-        result = await Appointment.insert_many(db, appointments)
-        print(f"Successfully inserted {len(result.inserted_ids)} appointments!")
-    
+        models = [Patient, Professional, Slot, Appointment, AvailabilitySummary]
+        if args.drop:
+            for model in models:
+                await db[model.get_collection_name()].drop()
+        await Database.ensure_indexes(models)
+
+        counts = {model.__name__: 0 for model in [Patient, Professional, Slot, Appointment]}
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            window = args.workers * 2
+
+            print(f"Generating {args.patients} patients...")
+            async def insert_patients(patients: List[dict]):
+                counts["Patient"] += await insert_batches(db[Patient.get_collection_name()], patients)
+            await run_in_pool(executor, window, (
+                (generate_patients, args.seed, epoch, start, min(PATIENTS_PER_TASK, args.patients - start))
+                for start in range(0, args.patients, PATIENTS_PER_TASK)
+            ), insert_patients)
+
+            print(f"Generating {args.professionals} professionals...")
+            professionals = generate_professionals(args.seed, epoch, args.professionals)
+            counts["Professional"] += await insert_batches(db[Professional.get_collection_name()], professionals)
+
+            print(f"Generating {args.slots} slots over {args.days} days from {args.start_date}...")
+            async def insert_slots(result: tuple[List[dict], List[dict]]):
+                slots, appointments = result
+                counts["Slot"] += await insert_batches(db[Slot.get_collection_name()], slots)
+                if appointments:
+                    counts["Appointment"] += await insert_batches(db[Appointment.get_collection_name()], appointments)
+            indexed = [(index, professional["_id"], professional["specialization"]) for index, professional in enumerate(professionals)]
+            await run_in_pool(executor, window, (
+                (generate_slots_and_appointments, args.seed, epoch, indexed[start:start + PROFESSIONALS_PER_TASK],
+                 args.slots, args.professionals, args.start_date, args.days, args.booking_ratio, args.patients)
+                for start in range(0, len(indexed), PROFESSIONALS_PER_TASK)
+            ), insert_slots)
+
+        # Raw inserts skip the model hooks: embed the appointments' snapshots and count the seeded slots in one pass each
+        print("Embedding the appointment snapshots...")
+        await Appointment.backfill_summaries(db)
+        print("Building the availability summary...")
+        summaries = await AvailabilitySummary.rebuild(db, args.start_date, args.start_date + timedelta(days=args.days - 1))
+
+        elapsed = time.perf_counter() - began
+        for name, count in counts.items():
+            print(f"Successfully inserted {count} {name.lower()}s")
+        print(f"Built {summaries} availability summaries")
+        print(f"Done in {elapsed:.1f}s")
     finally:
         print("Closing database connection...")
         await Database.close_db()
 
 if __name__ == "__main__":
-    asyncio.run(seed_database()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=NUM_PATIENTS)
+    parser.add_argument("--professionals", type=int, default=NUM_PROFESSIONALS)
+    parser.add_argument("--slots", type=int, default=NUM_SLOTS, help="Total number of slots, spread evenly between professionals")
+    parser.add_argument("--days", type=int, default=HORIZON_DAYS, help="Slots are spread over this many days")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=START_DATE, help=f"First day of slots, defaults to {START_DATE}")
+    parser.add_argument("--booking-ratio", type=float, default=BOOKING_RATIO, help="Ratio of booked slots, each one gets an appointment")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes generating data")
+    parser.add_argument("--drop", action="store_true", help="Drop the collections first")
+    asyncio.run(seed_database(parser.parse_args()))
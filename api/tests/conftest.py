@@ -0,0 +1,202 @@
+"""
+Fixtures shared by the API tests.
+
+Tests run against an in-process mongomock database by default. Set MEDAPP_TEST_MONGO_URI to run them against
+a real MongoDB server instead, on a throwaway database dropped after each test.
+"""
+import asyncio
+import os
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("MONGO_DB_NAME", f"medapp_test_{uuid.uuid4().hex[:8]}")
+
+import httpx
+import mongomock
+import pytest
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from cache import availability_cache, InMemoryBackend
+from config import Database
+from constants import AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_TTL, DB_NAME
+from models import Appointment, AvailabilitySummary, MedicalSpecialization, Patient, Professional, Slot, SlotHold
+from models.datetime_utils import utc_now
+
+TEST_MONGO_URI = os.getenv("MEDAPP_TEST_MONGO_URI")
+MODELS = [Patient, Professional, Slot, Appointment, AvailabilitySummary, SlotHold]
+
+class MockCursor:
+    """Async iteration over a mongomock cursor, with the chainable methods of pymongo's async cursors"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, skip: int):
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return [document async for document in self]
+
+class MockCollection:
+    """
+    A mongomock collection behind pymongo's async collection API. Every operation yields to the event loop
+    first, like a round trip to the server, so concurrent requests interleave between their operations.
+    Mongomock has no transactions: sessions are ignored.
+    """
+
+    def __init__(self, collection: mongomock.Collection):
+        self._collection = collection
+
+    def find(self, *args, session=None, **kwargs) -> MockCursor:
+        return MockCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline, session=None, **kwargs) -> MockCursor:
+        await asyncio.sleep(0)
+        return MockCursor(iter(self._collection.aggregate(pipeline)))
+
+    async def bulk_write(self, requests, ordered: bool = True, session=None) -> SimpleNamespace:
+        """One operation at a time: mongomock's own bulk writes don't accept the arguments of recent pymongo operations"""
+        await asyncio.sleep(0)
+        result = SimpleNamespace(inserted_count=0, matched_count=0, modified_count=0, deleted_count=0, upserted_count=0)
+        errors = []
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._collection.insert_one(request._doc)
+                    result.inserted_count += 1
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    method = {UpdateOne: "update_one", UpdateMany: "update_many", ReplaceOne: "replace_one"}[type(request)]
+                    update = getattr(self._collection, method)(request._filter, request._doc, upsert=bool(request._upsert))
+                    result.matched_count += update.matched_count
+                    result.modified_count += update.modified_count
+                    result.upserted_count += update.upserted_id is not None
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    method = "delete_one" if isinstance(request, DeleteOne) else "delete_many"
+                    result.deleted_count += getattr(self._collection, method)(request._filter).deleted_count
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": result.inserted_count, "nModified": result.modified_count})
+        return result
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, session=None, **kwargs):
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+
+        return call
+
+class MockDatabase:
+    def __init__(self, database: mongomock.Database, client: "MockClient"):
+        self._database = database
+        self.name = database.name
+        self.client = client
+
+    def __getitem__(self, name: str) -> MockCollection:
+        return MockCollection(self._database[name])
+
+    async def command(self, *args, **kwargs):
+        return {"ok": 1}
+
+class MockClient:
+    """Stands in for `AsyncMongoClient` in `Database.client`"""
+
+    def __init__(self):
+        self._client = mongomock.MongoClient(tz_aware=True)
+        self.admin = MockDatabase(self._client.admin, self)
+
+    def __getitem__(self, name: str) -> MockDatabase:
+        return MockDatabase(self._client[name], self)
+
+    async def bulk_write(self, models, session=None, ordered: bool = True, verbose_results: bool = False) -> SimpleNamespace:
+        """Client-level bulk write, one operation at a time through `MockCollection.bulk_write`"""
+        result = SimpleNamespace(modified_count=0, update_results={})
+        for index, model in enumerate(models):
+            database, collection = model._namespace.split(".", 1)
+            update = await self[database][collection].bulk_write([model], ordered=ordered)
+            result.modified_count += update.modified_count
+            if isinstance(model, (UpdateOne, UpdateMany, ReplaceOne)):
+                result.update_results[index] = update
+        return result
+
+    async def close(self):
+        self._client.close()
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Every test starts with empty in-process caches"""
+    Professional.invalidate_cache()
+    availability_cache.backend = InMemoryBackend("availability", AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_TTL)
+
+@pytest.fixture
+async def db():
+    if TEST_MONGO_URI:
+        from pymongo import AsyncMongoClient
+        Database.client = AsyncMongoClient(TEST_MONGO_URI, tz_aware=True)
+    else:
+        Database.client = MockClient()
+    await Database.ensure_indexes(MODELS)
+    yield Database.get_db()
+    if TEST_MONGO_URI:
+        await Database.client.drop_database(DB_NAME)
+    await Database.close_db()
+    Database.client = None
+
+@pytest.fixture
+async def client(db):
+    """HTTP client of the API, the lifespan isn't run: the `db` fixture stands in for it"""
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+async def professional(db) -> Professional:
+    return await Professional(name="Test Professional", specialization=MedicalSpecialization.CARDIOLOGY).save(db)
+
+@pytest.fixture
+async def patients(db) -> list[Patient]:
+    patients = [
+        Patient(name=f"Test Patient {i}", national_id=f"test-{i}", phone_number="+0000000000", email=f"test-{i}@example.com")
+        for i in range(20)
+    ]
+    await Patient.insert_many(db, patients)
+    return patients
+
+@pytest.fixture
+def new_slot(db):
+    """Create a free slot of a professional starting `days` from now"""
+    async def create(professional: Professional, days: float = 1) -> Slot:
+        start_time = (utc_now() + timedelta(days=days)).replace(second=0, microsecond=0)
+        return await Slot(
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=30),
+            professional_id=professional.id,
+            specialization=professional.specialization,
+        ).save(db)
+
+    return create
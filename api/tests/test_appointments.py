@@ -0,0 +1,168 @@
+import asyncio
+from collections import Counter
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from config import Database
+from models import Appointment, Slot, SlotHold
+
+async def test_concurrent_bookings_of_a_slot_book_it_once(client, db, professional, patients, new_slot):
+    slot = await new_slot(professional)
+
+    responses = await asyncio.gather(*[
+        client.post("/appointments", json={"patient_id": str(patient.id), "slot_id": str(slot.id)})
+        for patient in patients
+    ])
+
+    assert Counter(response.status_code for response in responses) == {200: 1, 400: len(patients) - 1}
+    assert await db[Appointment.get_collection_name()].count_documents({"slot_id": slot.id}) == 1
+    assert (await Slot.get_by_id(db, slot.id)).is_booked
+
+async def test_booking_a_booked_slot_fails(client, professional, patients, new_slot):
+    slot = await new_slot(professional)
+    first = await client.post("/appointments", json={"patient_id": str(patients[0].id), "slot_id": str(slot.id)})
+    second = await client.post("/appointments", json={"patient_id": str(patients[1].id), "slot_id": str(slot.id)})
+
+    assert first.status_code == 200
+    assert first.json()["slot"]["id"] == str(slot.id)
+    assert second.status_code == 400
+    assert second.json()["detail"] == "Slot is already booked"
+
+async def test_failed_booking_releases_the_slot(client, db, professional, new_slot):
+    slot = await new_slot(professional)
+    response = await client.post("/appointments", json={"patient_id": "507f1f77bcf86cd799439011", "slot_id": str(slot.id)})
+
+    assert response.status_code == 404
+    assert not (await Slot.get_by_id(db, slot.id)).is_booked
+
+async def test_holding_a_slot_for_an_unknown_patient_fails(client, professional, new_slot):
+    slot = await new_slot(professional)
+    response = await client.post(f"/slots/{slot.id}/hold", json={"patient_id": "507f1f77bcf86cd799439011"})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Patient not found"
+
+async def test_holding_another_slot_releases_the_previous_hold(client, db, professional, patients, new_slot):
+    first, second = await new_slot(professional, days=1), await new_slot(professional, days=2)
+    patient_id = str(patients[0].id)
+
+    assert (await client.post(f"/slots/{first.id}/hold", json={"patient_id": patient_id})).status_code == 200
+    assert (await client.post(f"/slots/{second.id}/hold", json={"patient_id": patient_id})).status_code == 200
+
+    assert await SlotHold.get_active(db, str(first.id)) is None
+    assert (await SlotHold.get_active(db, str(second.id))).patient_id == patients[0].id
+    booked = await client.post("/appointments", json={"patient_id": str(patients[1].id), "slot_id": str(first.id)})
+    assert booked.status_code == 200
+
+async def test_slots_held_by_another_patient_cannot_be_booked(client, professional, patients, new_slot):
+    slot = await new_slot(professional)
+    await client.post(f"/slots/{slot.id}/hold", json={"patient_id": str(patients[0].id)})
+
+    response = await client.post("/appointments", json={"patient_id": str(patients[1].id), "slot_id": str(slot.id)})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Slot is held for another patient"
+
+async def test_batch_reports_a_status_per_appointment(client, db, professional, patients, new_slot, monkeypatch):
+    import main
+
+    free, lost, booked = [await new_slot(professional, days=days) for days in (1, 2, 3)]
+    await db[Slot.get_collection_name()].update_one({"_id": booked.id}, {"$set": {"is_booked": True}})
+    get_slots = main.get_slots
+
+    async def get_slots_then_lose_one(db, slot_ids):
+        # Another request books `lost` between the batch's reads and its claims
+        slots = await get_slots(db, slot_ids)
+        await db[Slot.get_collection_name()].update_one({"_id": lost.id}, {"$set": {"is_booked": True}})
+        return slots
+
+    monkeypatch.setattr(main, "get_slots", get_slots_then_lose_one)
+    appointments = [
+        {"patient_id": str(patients[0].id), "slot_id": str(free.id)},
+        {"patient_id": str(patients[1].id), "slot_id": str(lost.id)},
+        {"patient_id": str(patients[2].id), "slot_id": str(booked.id)},
+        {"patient_id": str(patients[3].id), "slot_id": str(free.id)},
+        {"patient_id": str(patients[4].id), "slot_id": "507f1f77bcf86cd799439011"},
+    ]
+
+    response = await client.post("/appointments/batch", json={"appointments": appointments})
+
+    assert response.status_code == 200
+    assert [(item["status_code"], item["error"]) for item in response.json()] == [
+        (200, None),
+        (400, "Slot is already booked"),
+        (400, "Slot is already booked"),
+        (400, "Slot is already booked"),
+        (404, "Slot not found"),
+    ]
+    assert response.json()[0]["appointment"]["slot"]["id"] == str(free.id)
+    assert await db[Appointment.get_collection_name()].count_documents({}) == 1
+    assert await db[Slot.get_collection_name()].count_documents({"claim_id": {"$exists": True}}) == 0
+
+class TransactionSession:
+    """
+    Stands in for a session running `with_transaction`. With `conflict`, a concurrent transaction books the slot and
+    wins the write conflict: the driver runs the callback again, or gives up when it's out of retries.
+    """
+
+    def __init__(self, db, slot: Slot, conflict: bool = False, out_of_retries: bool = False):
+        self.db = db
+        self.slot = slot
+        self.conflict = conflict
+        self.out_of_retries = out_of_retries
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def with_transaction(self, callback):
+        if self.conflict:
+            await self.db[Slot.get_collection_name()].update_one({"_id": self.slot.id}, {"$set": {"is_booked": True}})
+            if self.out_of_retries:
+                raise OperationFailure("WriteConflict", code=112, details={"errorLabels": ["TransientTransactionError"]})
+        return await callback(self)
+
+@pytest.fixture
+def transactions(monkeypatch):
+    """Enable transactions, run with the given session"""
+    monkeypatch.setattr(Database, "use_transactions", True)
+
+    def use_session(session: TransactionSession):
+        monkeypatch.setattr(Database.client, "start_session", lambda: session, raising=False)
+
+    return use_session
+
+async def test_bookings_losing_a_write_conflict_fail_as_already_booked(client, db, professional, patients, new_slot, transactions):
+    slot = await new_slot(professional)
+    transactions(TransactionSession(db, slot, conflict=True))
+
+    response = await client.post("/appointments", json={"patient_id": str(patients[0].id), "slot_id": str(slot.id)})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Slot is already booked"
+    assert await db[Appointment.get_collection_name()].count_documents({}) == 0
+
+async def test_bookings_out_of_transaction_retries_fail_as_already_booked(client, db, professional, patients, new_slot, transactions):
+    first, second = await new_slot(professional, days=1), await new_slot(professional, days=2)
+
+    transactions(TransactionSession(db, first, conflict=True, out_of_retries=True))
+    response = await client.post("/appointments", json={"patient_id": str(patients[0].id), "slot_id": str(first.id)})
+    transactions(TransactionSession(db, second, conflict=True, out_of_retries=True))
+    batch = await client.post("/appointments/batch", json={"appointments": [{"patient_id": str(patients[1].id), "slot_id": str(second.id)}]})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Slot is already booked"
+    assert [(item["status_code"], item["error"]) for item in batch.json()] == [(400, "Slot is already booked")]
+    assert await db[Appointment.get_collection_name()].count_documents({}) == 0
+
+async def test_bookings_commit_in_a_transaction(client, db, professional, patients, new_slot, transactions):
+    slot = await new_slot(professional)
+    transactions(TransactionSession(db, slot))
+
+    response = await client.post("/appointments", json={"patient_id": str(patients[0].id), "slot_id": str(slot.id)})
+
+    assert response.status_code == 200
+    assert (await Slot.get_by_id(db, slot.id)).is_booked
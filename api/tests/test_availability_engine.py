@@ -0,0 +1,104 @@
+from datetime import date, datetime, timedelta, UTC
+
+from bson.objectid import ObjectId
+
+from availability import AvailabilityEngine, virtual_slot_id
+from availability.interval_set import IntervalSet
+from models import MedicalSpecialization, Professional
+from models.datetime_utils import utc_now
+from models.schedule import Schedule
+
+DAY = datetime(2030, 1, 7, tzinfo=UTC)  # a Monday
+
+def hours(start: int, end: int) -> tuple[datetime, datetime]:
+    return DAY + timedelta(hours=start), DAY + timedelta(hours=end)
+
+def test_virtual_slot_ids_encode_the_start_time_and_professional():
+    professional_id = ObjectId()
+    slot_id = virtual_slot_id(professional_id, DAY)
+
+    assert slot_id == virtual_slot_id(professional_id, DAY)
+    assert slot_id != virtual_slot_id(professional_id, DAY + timedelta(minutes=30))
+    assert slot_id.generation_time == DAY
+    assert slot_id.binary[4:] == professional_id.binary[4:]
+
+def test_interval_set_merges_overlapping_and_touching_intervals():
+    intervals = IntervalSet([hours(9, 10), hours(12, 13), hours(9, 11), hours(11, 12)])
+    assert list(intervals) == [hours(9, 13)]
+
+    intervals.add(*hours(15, 16))
+    intervals.add(*hours(13, 14))
+    assert list(intervals) == [hours(9, 14), hours(15, 16)]
+
+def test_interval_set_overlaps_half_open_intervals():
+    intervals = IntervalSet([hours(9, 10), hours(12, 13)])
+
+    assert intervals.overlaps(*hours(8, 10))
+    assert not intervals.overlaps(*hours(10, 12))
+    assert list(intervals.subtract_from([hours(8, 9), hours(9, 10), hours(10, 11), hours(12, 14)])) == [hours(8, 9), hours(10, 11)]
+
+def test_schedule_expands_weekly_hours_exceptions_and_holidays():
+    schedule = Schedule(
+        slot_minutes=45,
+        weekly_hours=[{"weekday": 0, "start": "09:00", "end": "11:00"}, {"weekday": 1, "start": "14:00", "end": "15:00"}],
+        exceptions=[{"day": "2030-01-14", "hours": [{"start": "10:00", "end": "11:00"}]}],
+        holidays=["2030-01-08"],
+    )
+
+    slots = list(schedule.expand(date(2030, 1, 7), date(2030, 1, 14)))
+
+    assert slots == [
+        (DAY + timedelta(hours=9), DAY + timedelta(hours=9, minutes=45)),
+        (DAY + timedelta(hours=9, minutes=45), DAY + timedelta(hours=10, minutes=30)),
+        (DAY + timedelta(days=7, hours=10), DAY + timedelta(days=7, hours=10, minutes=45)),
+    ]
+
+def test_schedule_keeps_local_hours_across_dst_changes():
+    schedule = Schedule(timezone="America/New_York", weekly_hours=[{"weekday": weekday, "start": "09:00", "end": "09:30"} for weekday in range(7)])
+
+    # DST starts on 2030-03-10 in New York
+    slots = list(schedule.expand(date(2030, 3, 9), date(2030, 3, 10)))
+
+    assert [start_time for start_time, _ in slots] == [datetime(2030, 3, 9, 14, tzinfo=UTC), datetime(2030, 3, 10, 13, tzinfo=UTC)]
+
+async def scheduled_professional(db) -> Professional:
+    schedule = Schedule(weekly_hours=[{"weekday": weekday, "start": "09:00", "end": "17:00"} for weekday in range(7)])
+    return await Professional(name="Scheduled Professional", specialization=MedicalSpecialization.CARDIOLOGY, schedule=schedule).save(db)
+
+def next_slot_time() -> datetime:
+    return (utc_now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+def ids_by_suffix_misses() -> int:
+    return next(stats["misses"] for stats in Professional.cache_stats() if stats["name"] == "professional_ids_by_suffix")
+
+async def test_unknown_slot_ids_do_not_scan_professionals_again(db):
+    professional = await scheduled_professional(db)
+    misses = ids_by_suffix_misses()
+    slot = await AvailabilityEngine.compute_slot(db, str(virtual_slot_id(professional.id, next_slot_time())))
+    assert slot.professional_id == professional.id
+
+    for _ in range(5):
+        assert await AvailabilityEngine.compute_slot(db, str(virtual_slot_id(ObjectId(), next_slot_time()))) is None
+
+    assert ids_by_suffix_misses() == misses + 1
+
+async def test_new_professionals_are_found_after_they_are_saved(db):
+    first = await scheduled_professional(db)
+    assert await AvailabilityEngine.compute_slot(db, str(virtual_slot_id(first.id, next_slot_time())))
+
+    second = await scheduled_professional(db)
+    slot = await AvailabilityEngine.compute_slot(db, str(virtual_slot_id(second.id, next_slot_time())))
+
+    assert slot.professional_id == second.id
+
+async def test_computed_slots_are_resolved_in_one_batch(db):
+    professional = await scheduled_professional(db)
+    start_time = next_slot_time()
+    slot_ids = [virtual_slot_id(professional.id, start_time + timedelta(days=days)) for days in (0, 1)]
+    unknown = virtual_slot_id(ObjectId(), start_time)
+    off_schedule = virtual_slot_id(professional.id, start_time.replace(hour=20))
+
+    slots = await AvailabilityEngine.compute_slots(db, [*slot_ids, unknown, off_schedule])
+
+    assert list(slots) == slot_ids
+    assert all(slot.professional_id == professional.id and not slot.is_booked for slot in slots.values())
@@ -0,0 +1,26 @@
+from datetime import datetime, time, timedelta, UTC
+
+from models import Patient, Slot, SlotHold
+from models.datetime_utils import utc_now
+
+async def slot_at(db, professional, start_time: datetime) -> Slot:
+    return await Slot(
+        start_time=start_time,
+        end_time=start_time + timedelta(minutes=30),
+        professional_id=professional.id,
+        specialization=professional.specialization,
+    ).save(db)
+
+async def test_availability_by_day_leaves_out_held_and_started_slots(client, db, professional):
+    today = datetime.combine(utc_now().date(), time.min, UTC)
+    tomorrow = today + timedelta(days=1)
+    await slot_at(db, professional, today)
+    held = await slot_at(db, professional, tomorrow + timedelta(hours=10))
+    await slot_at(db, professional, tomorrow + timedelta(hours=11))
+    patient = await Patient(name="Holding Patient", national_id="holding", phone_number="+0000000000", email="holding@example.com").save(db)
+    assert await SlotHold.place(db, held, str(patient.id), ttl=300)
+
+    response = await client.get(f"/availability/specialization/{professional.specialization.value}", params={"start": today.date().isoformat()})
+
+    assert response.status_code == 200
+    assert response.json() == [{"day": tomorrow.date().isoformat(), "free_slots": 1, "professionals": 1}]
@@ -0,0 +1,162 @@
+import json
+from datetime import datetime, timedelta, UTC
+
+import fakeredis
+import pytest
+import redis.asyncio
+from pydantic import BaseModel
+
+from cache import AvailabilityCache, InMemoryBackend, RedisBackend, TTLCache
+from cache import ttl_cache
+
+class Row(BaseModel):
+    id: str
+    start_time: datetime
+
+FIRST_DAY = datetime(2030, 1, 1, tzinfo=UTC)
+# Two rows a day for ten days, at 09:00 and 15:00
+ROWS = [
+    Row(id=f"{day}-{hour}", start_time=FIRST_DAY + timedelta(days=day, hours=hour))
+    for day in range(10)
+    for hour in (9, 15)
+]
+
+class Loader:
+    """Loads ROWS, recording the ranges it's called with"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, start: datetime, end: datetime) -> list[Row]:
+        self.calls.append((start, end))
+        return [row for row in ROWS if start <= row.start_time <= end]
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache("test", max_size=10, ttl=5)
+    cache.set("a", 1)
+    clock[0] += 4
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert (cache.stats()["hits"], cache.stats()["misses"], cache.stats()["size"]) == (1, 1, 0)
+
+def test_ttl_cache_evicts_the_least_recently_used_entry(clock):
+    cache = TTLCache("test", max_size=2, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+async def test_ttl_cache_loads_once_and_does_not_cache_missing_values(clock):
+    cache = TTLCache("test", max_size=10, ttl=5)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return None if len(loads) == 1 else "value"
+
+    assert await cache.get_or_load("a", load) is None
+    assert await cache.get_or_load("a", load) == "value"
+    assert await cache.get_or_load("a", load) == "value"
+    assert len(loads) == 2
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, monkeypatch):
+    if request.param == "memory":
+        return InMemoryBackend("test", 100, 60)
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: fakeredis.FakeAsyncRedis())
+    return RedisBackend("redis://test")
+
+async def test_availability_cache_serves_cached_days(backend):
+    cache, loader = AvailabilityCache(backend, ttl=60), Loader()
+    end = FIRST_DAY + timedelta(days=3) - timedelta(seconds=1)
+
+    first = await cache.get_slots("cardiology", FIRST_DAY, end, loader, Row)
+    second = await cache.get_slots("cardiology", FIRST_DAY, end, loader, Row)
+
+    assert first == second == ROWS[:6]
+    assert len(loader.calls) == 2  # one day, then the next two
+    assert (cache.hits, cache.misses) == (3, 3)
+
+async def test_availability_cache_invalidates_a_day(backend):
+    cache, loader = AvailabilityCache(backend, ttl=60), Loader()
+    end = FIRST_DAY + timedelta(days=3) - timedelta(seconds=1)
+    await cache.get_slots("cardiology", FIRST_DAY, end, loader, Row)
+    loader.calls.clear()
+
+    await cache.invalidate("cardiology", [ROWS[2].start_time])
+    assert await cache.get_slots("cardiology", FIRST_DAY, end, loader, Row) == ROWS[:6]
+    assert loader.calls == [(FIRST_DAY + timedelta(days=1), FIRST_DAY + timedelta(days=2) - timedelta(microseconds=1))]
+
+async def test_availability_cache_only_loads_the_days_of_a_page(backend):
+    cache, loader = AvailabilityCache(backend, ttl=60), Loader()
+
+    page = await cache.get_slots("cardiology", FIRST_DAY, FIRST_DAY + timedelta(days=10), loader, Row, limit=3)
+
+    assert page == ROWS[:3]
+    assert loader.calls[-1][1] < FIRST_DAY + timedelta(days=3)
+    assert cache.misses == 3
+
+async def test_availability_cache_filters_rows_before_the_limit(backend):
+    cache, loader = AvailabilityCache(backend, ttl=60), Loader()
+    held = {ROWS[0].id, ROWS[1].id, ROWS[3].id}
+
+    page = await cache.get_slots(
+        "cardiology", FIRST_DAY, FIRST_DAY + timedelta(days=10), loader, Row, limit=2, keep=lambda row: row.id not in held,
+    )
+
+    assert page == [ROWS[2], ROWS[4]]
+
+async def test_in_memory_counters_expire(clock):
+    backend = InMemoryBackend("test", 100, 60)
+    assert await backend.incr("a", 10) == 1
+    assert await backend.incr("a", 10) == 2
+    await backend.incr("b", 10)
+    clock[0] += 8
+    await backend.expire(["a", "missing"], 10)
+    clock[0] += 4
+    assert await backend.get_counters(["a", "b", "missing"]) == [2, 0, 0]
+
+    clock[0] += 60
+    assert await backend.incr("c", 10) == 1
+    assert set(backend._counters) == {"c"}
+
+async def test_availability_versions_outlive_the_entries_stored_under_them(clock):
+    cache, loader = AvailabilityCache(InMemoryBackend("test", 100, 60), ttl=60), Loader()
+    end = FIRST_DAY + timedelta(days=1) - timedelta(seconds=1)
+    await cache.invalidate("cardiology", [FIRST_DAY])
+    clock[0] += cache.version_ttl - 1
+    await cache.get_slots("cardiology", FIRST_DAY, end, loader, Row)
+
+    clock[0] += 2
+    await cache.invalidate("cardiology", [FIRST_DAY])
+    await cache.get_slots("cardiology", FIRST_DAY, end, loader, Row)
+    assert len(loader.calls) == 2
+
+async def test_redis_counters_expire(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: client)
+    backend = RedisBackend("redis://test")
+
+    assert await backend.incr("a", 10) == 1
+    assert 9000 < await client.pttl("a") <= 10000
+    await backend.expire(["a", "missing"], 20)
+    assert 19000 < await client.pttl("a") <= 20000
+    assert await client.exists("missing") == 0
+
+async def test_redis_backend_stores_json(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: client)
+    backend = RedisBackend("redis://test")
+
+    await backend.set("key", ROWS[:2], 60, list[Row])
+
+    assert json.loads(await client.get("key")) == [row.model_dump(mode="json") for row in ROWS[:2]]
+    assert await backend.get_many(["key", "missing"], list[Row]) == [ROWS[:2], None]
@@ -0,0 +1,173 @@
+import asyncio
+from collections import defaultdict
+from typing import AsyncIterator, Iterable, Optional
+from uuid import uuid4
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi_mcp import FastApiMCP
+
+from mcp_sessions import McpSessionMiddleware, McpSessionRelay, RelayedFastApiMCP, RelayedSseTransport
+
+MESSAGES_PATH = "/mcp/messages/"
+
+class FakeSessionStore:
+    """In-memory `SessionStore` shared by the relays of a test"""
+    ttl = 300
+
+    def __init__(self):
+        self.owners: dict[str, str] = {}
+        self.channels: dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.subscribers: set[str] = set()
+
+    async def register(self, session_id: str, worker_id: str):
+        self.owners[session_id] = worker_id
+
+    async def refresh(self, session_ids: Iterable[str], worker_id: str):
+        pass
+
+    async def unregister(self, session_id: str):
+        self.owners.pop(session_id, None)
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        return self.owners.get(session_id)
+
+    async def publish(self, worker_id: str, message: dict) -> int:
+        if worker_id not in self.subscribers:
+            return 0
+        self.channels[worker_id].put_nowait(message)
+        return 1
+
+    async def subscribe(self, worker_id: str) -> AsyncIterator[dict]:
+        self.subscribers.add(worker_id)
+        try:
+            while True:
+                yield await self.channels[worker_id].get()
+        finally:
+            self.subscribers.discard(worker_id)
+
+    async def close(self):
+        pass
+
+class MessagesApp:
+    """Stands in for the API: accepts the messages of `sessions` and records them, 404 for any other session"""
+
+    def __init__(self):
+        self.sessions: set[str] = set()
+        self.received: list[tuple[str, bytes]] = []
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        more_body = True
+        while more_body:
+            event = await receive()
+            body += event.get("body", b"")
+            more_body = event.get("more_body", False)
+        session_id = scope["query_string"].decode().removeprefix("session_id=")
+        status = 202 if session_id in self.sessions else 404
+        if status == 202:
+            self.received.append((session_id, body))
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+async def started_worker(store: FakeSessionStore) -> tuple[McpSessionRelay, MessagesApp, httpx.AsyncClient]:
+    app = MessagesApp()
+    relay = McpSessionRelay(store, MESSAGES_PATH)
+    await relay.start(app)
+    await asyncio.sleep(0)  # let it subscribe
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=McpSessionMiddleware(app, relay)), base_url="http://test")
+    return relay, app, client
+
+async def until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Condition never met")
+
+async def test_messages_are_forwarded_to_the_worker_owning_the_session():
+    store = FakeSessionStore()
+    owner, owner_app, _ = await started_worker(store)
+    other, other_app, client = await started_worker(store)
+    session_id = uuid4().hex
+    owner_app.sessions.add(session_id)
+    await owner.register(session_id)
+
+    response = await client.post(MESSAGES_PATH, params={"session_id": session_id}, content=b'{"jsonrpc": "2.0"}')
+
+    assert response.status_code == 202
+    await until(lambda: owner_app.received)
+    assert owner_app.received == [(session_id, b'{"jsonrpc": "2.0"}')]
+    assert other_app.received == []
+    await owner.stop()
+    await other.stop()
+
+async def test_messages_of_the_own_sessions_are_handled_locally():
+    store = FakeSessionStore()
+    relay, app, client = await started_worker(store)
+    session_id = uuid4().hex
+    app.sessions.add(session_id)
+    await relay.register(session_id)
+
+    response = await client.post(MESSAGES_PATH, params={"session_id": session_id}, content=b"{}")
+
+    assert response.status_code == 202
+    assert app.received == [(session_id, b"{}")]
+    await relay.stop()
+
+async def test_unknown_sessions_get_the_local_404():
+    store = FakeSessionStore()
+    relay, app, client = await started_worker(store)
+
+    response = await client.post(MESSAGES_PATH, params={"session_id": uuid4().hex}, content=b"{}")
+
+    assert response.status_code == 404
+    await relay.stop()
+
+async def test_sessions_of_a_gone_worker_are_not_found():
+    store = FakeSessionStore()
+    relay, _, client = await started_worker(store)
+    session_id = uuid4().hex
+    store.owners[session_id] = "gone:1:0"
+
+    response = await client.post(MESSAGES_PATH, params={"session_id": session_id}, content=b"{}")
+
+    assert response.status_code == 404
+    await relay.stop()
+
+async def test_the_transport_registers_its_sessions_while_connected():
+    store = FakeSessionStore()
+    relay = McpSessionRelay(store, MESSAGES_PATH)
+    await relay.start(MessagesApp())
+    transport = RelayedSseTransport(MESSAGES_PATH, relay)
+    disconnect = asyncio.Event()
+    endpoint_events: list[bytes] = []
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(event):
+        if event["type"] == "http.response.body" and b"session_id=" in event.get("body", b""):
+            endpoint_events.append(event["body"])
+
+    scope = {"type": "http", "method": "GET", "path": "/mcp", "root_path": "", "query_string": b"", "headers": []}
+    async with transport.connect_sse(scope, receive, send):
+        (session_id,) = transport._read_stream_writers
+        assert relay.sessions == {session_id.hex}
+        assert store.owners == {session_id.hex: relay.worker_id}
+        await until(lambda: endpoint_events)
+        assert f"session_id={session_id.hex}".encode() in endpoint_events[0]
+        disconnect.set()
+
+    assert relay.sessions == set()
+    assert store.owners == {}
+    assert transport._read_stream_writers == {}
+    await relay.stop()
+
+def test_an_unsupported_fastapi_mcp_fails_at_startup(monkeypatch):
+    monkeypatch.delattr(FastApiMCP, "_register_mcp_endpoints_sse")
+
+    with pytest.raises(RuntimeError, match="_register_mcp_endpoints_sse"):
+        RelayedFastApiMCP(FastAPI(), relay=McpSessionRelay(FakeSessionStore(), MESSAGES_PATH))
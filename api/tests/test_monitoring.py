@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+from monitoring import CommandMetricsListener, Registry, span, traced
+from monitoring import tracing
+
+@pytest.fixture
+def trace():
+    trace = tracing.start_trace("GET", "/slots/1", "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01")
+    token = tracing._current_trace.set(trace)
+    yield trace
+    tracing._current_trace.reset(token)
+
+class Model:
+    @traced
+    async def load(self):
+        with span("inner"):
+            tracing.record_command("find", "slots", 0.002, 3)
+        return "loaded"
+
+async def test_spans_nest_under_the_active_span(trace):
+    assert trace.root.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert trace.root.parent_span_id == "b7ad6b7169203331"
+
+    with span("outer") as outer:
+        assert await Model().load() == "loaded"
+    tracing.record_command("count", "slots", 0.001, 0)
+
+    spans = {recorded.name: recorded for recorded in trace.spans}
+    assert spans["outer"].parent_span_id == trace.root.span_id
+    assert spans["Model.load"].parent_span_id == outer.span_id
+    assert spans["inner"].parent_span_id == spans["Model.load"].span_id
+    assert spans["mongo.find"].parent_span_id == spans["inner"].span_id
+    assert spans["mongo.count"].parent_span_id == trace.root.span_id
+    assert all(recorded.end_ns for recorded in trace.spans)
+    assert (trace.queries, trace.documents) == (2, 3)
+
+async def test_span_errors_are_recorded(trace):
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("boom")
+
+    assert trace.spans[0].to_otlp()["status"] == {"code": 2, "message": "ValueError('boom')"}
+
+def test_spans_are_no_ops_outside_of_a_trace():
+    with span("untraced") as untraced:
+        assert untraced is None
+
+def command_event(request_id: int, **kwargs) -> SimpleNamespace:
+    return SimpleNamespace(
+        connection_id=("localhost", 27017), request_id=request_id, command_name="find", command={"find": "slots", "filter": {}},
+        duration_micros=1000, reply={"cursor": {"firstBatch": [{}]}}, **kwargs,
+    )
+
+def test_commands_in_flight_are_bounded():
+    listener = CommandMetricsListener(max_in_flight=2)
+    for request_id in range(5):
+        listener.started(command_event(request_id))
+    assert list(listener.in_flight) == [(("localhost", 27017), 3), (("localhost", 27017), 4)]
+
+    listener.succeeded(command_event(4))
+    listener.succeeded(command_event(0))
+    assert list(listener.in_flight) == [(("localhost", 27017), 3)]
+
+def test_metrics_render_in_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    in_use = registry.gauge("connections_in_use", "Connections")
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1))
+    requests.inc('/slots/"x"')
+    requests.inc('/slots/"x"', amount=2)
+    in_use.inc()
+    in_use.dec(amount=3)
+    latency.observe(0.05, "/slots")
+    latency.observe(0.5, "/slots")
+    latency.observe(5, "/slots")
+
+    assert registry.render() == "\n".join([
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/slots/\\"x\\""} 3.0',
+        "# HELP connections_in_use Connections",
+        "# TYPE connections_in_use gauge",
+        "connections_in_use -2.0",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/slots",le="0.1"} 1',
+        'latency_seconds_bucket{route="/slots",le="1"} 2',
+        'latency_seconds_bucket{route="/slots",le="+Inf"} 3',
+        'latency_seconds_sum{route="/slots"} 5.55',
+        'latency_seconds_count{route="/slots"} 3',
+    ]) + "\n"
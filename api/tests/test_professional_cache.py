@@ -0,0 +1,57 @@
+import asyncio
+
+from bson.objectid import ObjectId
+from pymongo.errors import PyMongoError
+
+from models import MedicalSpecialization, Professional
+from models.professional import _cache_by_id
+
+class FakeStream:
+    """A change stream delivering the events put in a queue"""
+
+    def __init__(self, events: asyncio.Queue):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.events.get()
+
+class FlakyCollection:
+    """Fails to open the stream `failures` times, then delivers the events put in `events`"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.events = asyncio.Queue()
+        self.opened = 0
+
+    async def watch(self):
+        self.opened += 1
+        if self.opened <= self.failures:
+            raise PyMongoError("Connection lost")
+        return FakeStream(self.events)
+
+async def test_the_change_stream_watcher_survives_failures():
+    professional = Professional(id=ObjectId(), name="Test Professional", specialization=MedicalSpecialization.CARDIOLOGY)
+    collection = FlakyCollection(failures=2)
+    watcher = asyncio.create_task(Professional.watch_changes({Professional.get_collection_name(): collection}, retry_delay=0))
+    try:
+        while collection.opened < 3:
+            await asyncio.sleep(0)
+        _cache_by_id.set(str(professional.id), professional)
+        collection.events.put_nowait({"operationType": "update", "documentKey": {"_id": professional.id}})
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+        assert collection.opened == 3
+        assert _cache_by_id.get(str(professional.id)) is None
+        assert not watcher.done()
+    finally:
+        watcher.cancel()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, UTC
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from models import Slot
+from models import slot as slot_module
+from models.datetime_utils import parse_legacy_time, to_legacy_time, utc_now
+
+BUENOS_AIRES = ZoneInfo("America/Argentina/Buenos_Aires")
+
+def test_naive_legacy_times_are_read_in_their_timezone():
+    assert parse_legacy_time("2024-03-20T09:00:00", BUENOS_AIRES) == datetime(2024, 3, 20, 12, tzinfo=UTC)
+    assert parse_legacy_time("2024-03-20T09:00:00+00:00", BUENOS_AIRES) == datetime(2024, 3, 20, 9, tzinfo=UTC)
+    assert to_legacy_time(datetime(2024, 3, 20, 12, tzinfo=UTC), BUENOS_AIRES) == "2024-03-20T09:00:00"
+
+@pytest.fixture
+def dual_read(monkeypatch):
+    monkeypatch.setattr(slot_module, "SLOT_TIMES_DUAL_READ", True)
+    monkeypatch.setattr(slot_module, "LEGACY_TIMEZONE", BUENOS_AIRES)
+
+@pytest.fixture
+async def mixed_slots(db, professional) -> list[datetime]:
+    """Slots every hour from tomorrow, alternately stored as legacy local strings and as dates, returns their start times"""
+    first = (utc_now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    start_times = [first + timedelta(hours=hour) for hour in range(7)]
+    await db[Slot.get_collection_name()].insert_many([
+        {
+            "professional_id": professional.id,
+            "specialization": professional.specialization.value,
+            "is_booked": False,
+            "start_time": to_legacy_time(start_time, BUENOS_AIRES) if index % 2 else start_time,
+            "end_time": to_legacy_time(start_time + timedelta(minutes=30), BUENOS_AIRES) if index % 2 else start_time + timedelta(minutes=30),
+        }
+        for index, start_time in enumerate(start_times)
+    ])
+    return start_times
+
+async def test_dual_read_pages_merge_legacy_and_date_slots(db, professional, dual_read, mixed_slots):
+    pages, after = [], None
+    while True:
+        page = await Slot.find_available(db, [professional.id], utc_now(), limit=2, after=after)
+        if not page:
+            break
+        pages.append(page)
+        after = (page[-1].start_time, page[-1].id)
+
+    assert [slot.start_time for page in pages for slot in page] == mixed_slots
+    assert all(len(page) == 2 for page in pages[:-1])
+
+async def test_dual_read_specialization_search_merges_before_the_limit(db, professional, dual_read, mixed_slots):
+    results = await Slot.find_available_by_specialization(db, professional.specialization, utc_now(), utc_now() + timedelta(days=2), limit=3)
+
+    assert [slot.start_time for slot, _ in results] == mixed_slots[:3]
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pytest
+
+from availability import find_specialization_slots
+from config import Database
+from models import Slot
+from models.datetime_utils import utc_now
+
+async def test_slots_saved_without_specialization_get_their_professional_specialization(db, professional):
+    start_time = utc_now() + timedelta(days=1)
+    saved = await Slot(start_time=start_time, end_time=start_time + timedelta(minutes=30), professional_id=professional.id).save(db)
+    inserted = [Slot(start_time=start_time + timedelta(hours=1), end_time=start_time + timedelta(hours=1, minutes=30), professional_id=professional.id)]
+    await Slot.insert_many(db, inserted)
+
+    found = await find_specialization_slots(db, professional.specialization, utc_now(), utc_now() + timedelta(days=2))
+
+    assert [slot.id for slot, _ in found] == [saved.id, inserted[0].id]
+    assert (await Slot.get_by_id(db, saved.id)).specialization == professional.specialization
+
+async def test_slots_of_an_unknown_professional_are_rejected(db):
+    start_time = utc_now() + timedelta(days=1)
+    slot = Slot(start_time=start_time, end_time=start_time + timedelta(minutes=30), professional_id="507f1f77bcf86cd799439011")
+
+    with pytest.raises(ValueError):
+        await slot.save(db)
+
+async def test_duplicated_slots_do_not_stop_the_other_indexes(db, professional, caplog):
+    collection = db[Slot.get_collection_name()]
+    await collection.drop_indexes()
+    start_time = utc_now() + timedelta(days=1)
+    duplicate = {"professional_id": professional.id, "specialization": professional.specialization.value, "is_booked": False,
+                 "start_time": start_time, "end_time": start_time + timedelta(minutes=30)}
+    await collection.insert_many([dict(duplicate), dict(duplicate)])
+
+    await Database.ensure_indexes([Slot])
+
+    indexes = await collection.index_information()
+    assert "professional_start_time_unique" not in indexes
+    assert "available_by_specialization_start_time_id" in indexes
+    assert "professional_start_time_unique" in caplog.text